@@ -16,21 +16,24 @@ V1 only offers the following bundles: (Device_A, Instrument_A), (Device_B, Instr
 This program will deliver several outputs based on user-selection of vendors and products:
 - total projected cost based on user-input
 - several percentile calculations of user-input cost compared to similar procurement scenarios
+- the scenarios of other vendors closest in expense to the user-input cost, and the cheapest scenarios with the same numbers of devices and instruments
 - four histograms that compare the user-input procurement expense forecast with distributions for different procurement scenarios
-- one histogram that compares all vendor proposals
+- one chart that compares all vendor proposals, as smooth cost densities of every vendor
 
 """
 
-import pandas as pd
+import argparse
+
 import numpy as np
-from scipy import stats
-import matplotlib.pyplot as plt
-import math
 
-ALL_POSSIBLE_OUTCOMES = {'V1': 'v1.csv',
-'V2': 'v2.csv',
-'V3': 'v3.csv',
-'V4': 'v4.csv'} # dictionary to contain one .csv file for each vendor, corresponding to all possible product acquisition scenarios (permutations)
+from scenario_catalog import ALL_POSSIBLE_OUTCOMES, CATALOG_COLUMNS, load_catalog, vendor_columns
+from cost_index import percentile_weak
+from forecast_core import user_input_cost, filter_cost_list, filter_vendor_cost_list, get_sorted_costs # pricing and filtering live in the plot-free core
+from cost_density import vendor_densities
+from histogram_bins import compute_bins
+from nearest_alternatives import print_alternatives
+import stage_profiler
+from stage_profiler import stage
 
 def introduction():
     a = "This program draws on randomized data gathered through a fictitious RFP process for procurement of new capital equipment.\n"
@@ -356,61 +359,15 @@ def get_variables(vendor, num_d, num_i):
         print('Something unexpected happened! Please try again.')
     return D1, D2, D3, I1, I2, I3
 
-def user_input_cost(D1, D2, D3, I1, I2, I3, vendor):
-    """
-    Assigns a forecast-expense value for each product purchase variable and calculates the total forecasted expense.
-    Include V1 bundling discounts where applicable 
-    """   
-    product2cost = {'Device_A': 0,
-	'Device_B': 0,
-	'Instrument_A': 734056,
-	'Instrument_B': 1014836,
-    'Instrument_C': 1155106,
-    'Device_C': 680128,
-	'Device_D': 151903,
-	'Instrument_D': 323563,
-	'Device_E': 652534,
-	'Device_F':416411,
-	'Instrument_E': 984185,
-	'Device_G': 440423,
-	'Device_H': 244368,
-    'Instrument_F': 418311,
-	'0': 0} # the value for each key corresponds to each product's acquisition cost in USD
-
-    discount1 = {'Instrument_A': product2cost.get('Instrument_A')*.9639,
-    'Instrument_B': product2cost.get('Instrument_B')*.95886,
-    'Instrument_C': product2cost.get('Instrument_C')*.95555,
-    '0': 0} # the discounted values of V1 I2 instruments
-
-    discount2 = {'Instrument_A': product2cost.get('Instrument_A')*.9278,
-    'Instrument_B': product2cost.get('Instrument_B')*.91772,
-    'Instrument_C': product2cost.get('Instrument_C')*.91109} # the discounted values of V1 I3 instruments
-
-    Cost_D1 = product2cost.get(D1)
-    Cost_D2 = product2cost.get(D2)
-    Cost_D3 = product2cost.get(D3)
-    Cost_I1 = product2cost.get(I1)
-    if vendor == 'V1':
-        if I3 == '0': # if I3 = 0, then I2 = 0, Instrument_A, Instrument_B, or Instrument_C. The costs corresponding to each value of I2 should be discounted.
-            Cost_I2 = discount1.get(I2)
-            Cost_I3 = 0
-        else: # if vendor = V1 and I3 != 0, then neither I1 = 0, I2 = 0, nor I3 = 0, meaning I2 and I3 acquisition costs are discounted  
-            Cost_I2 = discount1.get(I2)
-            Cost_I3 = discount2.get(I3)
-    else:
-        Cost_I2 = product2cost.get(I2)
-        Cost_I3 = product2cost.get(I3)
-    sum_cost = Cost_D1 + Cost_D2 + Cost_D3 + Cost_I1 + Cost_I2 + Cost_I3
-    return sum_cost
-
-def get_dfs(vendor):
-    # creates a dataframe of procurement cost-scenarios corresponding to each vendor, which are each contained in a .csv contained in the dictionary ALL_POSSIBLE_OUTCOMES
-    df_vendor = pd.read_csv(ALL_POSSIBLE_OUTCOMES[vendor]) #df_vendor selects the .csv that corresponds to user-input value of vendor
-    df_v1 = pd.read_csv(ALL_POSSIBLE_OUTCOMES['V1'])
-    df_v2 = pd.read_csv(ALL_POSSIBLE_OUTCOMES['V2'])
-    df_v3 = pd.read_csv(ALL_POSSIBLE_OUTCOMES['V3'])
-    df_v4 = pd.read_csv(ALL_POSSIBLE_OUTCOMES['V3'])
-    return df_vendor, df_v1, df_v2, df_v3, df_v4
+def get_dfs(vendor, catalog=None):
+    # creates a dataframe of procurement cost-scenarios corresponding to each vendor from the shared scenario catalog, which parses each .csv in the dictionary ALL_POSSIBLE_OUTCOMES only once
+    # another catalog in the same layout (e.g. a synthetic one, see benchmarks.py) may be passed instead
+    import pandas as pd # loaded on first use, so that runs without dataframes do not pay for it
+    if catalog is None:
+        catalog = load_catalog()
+    dfs = {name: pd.DataFrame(vendor_columns(catalog, name), columns=CATALOG_COLUMNS) for name in ALL_POSSIBLE_OUTCOMES}
+    df_vendor = dfs[vendor] #df_vendor selects the scenarios that correspond to user-input value of vendor
+    return df_vendor, dfs['V1'], dfs['V2'], dfs['V3'], dfs['V4']
 
 def get_costs(df_vendor, df_v1, df_v2, df_v3, df_v4):
     """"
@@ -439,361 +396,172 @@ def get_codes(df_vendor, df_v1, df_v2, df_v3, df_v4):
     code_list = code_v1 + code_v2 + code_v3 + code_v4
     return code_vendor, code_list
 
-def filter_cost_list(code_list, cost_list, num_d, num_i): 
-    tuple_list_1 = zip(code_list, cost_list) #create a list of tuples with code_list as the first tuple value and cost_list as second tuple value
-    filtered_tuple_list = list(filter(lambda x: x[0] == str(num_i) + "_" + str(num_d), tuple_list_1)) # filter the tuple list to match user-input values of num_i and num_d
-    filtered_cost_list = [x[1] for x in filtered_tuple_list] #unzip the filtered list of tuples
-    return filtered_cost_list
-
-def filter_vendor_cost_list(code_vendor, cost_vendor, num_d, num_i): 
-    tuple_list_2 = zip(code_vendor, cost_vendor) #create a list of tuples with code_vendor as the first tuple value and cost_vendor as second tuple value
-    filtered_tuple_list_2 = list(filter(lambda x: x[0] == str(num_i) + "_" + str(num_d), tuple_list_2)) # filter the tuple list to match user-input values of num_i and num_d
-    filtered_vendor_cost_list = [x[1] for x in filtered_tuple_list_2] #unzip the filtered list of tuples
-    return filtered_vendor_cost_list
-
 def data_report(cost_list, sum_cost, cost_vendor, filtered_cost_list, filtered_vendor_cost_list, vendor, num_d, num_i, code_list, code_vendor, D1, D2, D3, I1, I2, I3):
+    # cost_list, cost_vendor, filtered_cost_list and filtered_vendor_cost_list must be sorted (see get_sorted_costs), so that each percentile is one binary search
     a = [D1, D2, D3, I1, I2, I3]
     product_list = [x for x in a if x != '0']
-    percentile1 = int(stats.percentileofscore(cost_list, sum_cost, kind = 'weak')) #Percentile position of user-input value relative to all possible vendor/product scenarios (permutation) 
-    percentile2 = int(stats.percentileofscore(cost_vendor, sum_cost, kind = 'weak')) #Percentile position of user-input value relative to all possible product scenarios (permutation), given vendor selection
-    percentile3 = int(stats.percentileofscore(filtered_cost_list, sum_cost, kind = 'weak')) #Percentile position of user-input value relative to all possible vendor/product scenarios (permutation), given num_d and num_i
-    percentile4 = int(stats.percentileofscore(filtered_vendor_cost_list, sum_cost, kind = 'weak')) #Percentile position of user-input value relative to all possible product scenarios (permutation), given vendor selection, num_d, and num_i
+    percentile1 = int(percentile_weak(cost_list, sum_cost)) #Percentile position of user-input value relative to all possible vendor/product scenarios (permutation) 
+    percentile2 = int(percentile_weak(cost_vendor, sum_cost)) #Percentile position of user-input value relative to all possible product scenarios (permutation), given vendor selection
+    percentile3 = int(percentile_weak(filtered_cost_list, sum_cost)) #Percentile position of user-input value relative to all possible vendor/product scenarios (permutation), given num_d and num_i
+    percentile4 = int(percentile_weak(filtered_vendor_cost_list, sum_cost)) #Percentile position of user-input value relative to all possible product scenarios (permutation), given vendor selection, num_d, and num_i
+    print_report(sum_cost, vendor, num_d, num_i, product_list, [percentile1, percentile2, percentile3, percentile4], len(code_list), len(code_vendor))
+    return percentile1, percentile2, percentile3, percentile4, product_list
+
+def print_report(sum_cost, vendor, num_d, num_i, product_list, percentiles, num_scenarios, num_vendor_scenarios):
+    # prints the five data_report statements; also used for reports answered from the report cache (see report_cache.py)
+    percentile1, percentile2, percentile3, percentile4 = percentiles
     data_1 = "1. You have elected to forecast the expense of procuring {} device(s) and {} instrument(s) from {}, as follows: {}"
     data_2 = "2. Out of all four vendors, there exist {} possible product-procurement scenarios.\n   The forecasted expense for procuring {} is {} USD, which is in the {} percentile of all scenarios."
     data_3 = "3. For {}, there exist {} possible product-procurement scenarios.\n   The forecasted expense of {} USD is in the {} percentile of all possible product-procurement scenarios for {}."
     data_4 = "4. {} USD is in the {} percentile of all possible product procurement scenarios across the four vendors, given selection of {} device(s) and {} instrument(s)."
     data_5 = "5. {} USD is in the {} percentile of all possible product procurement scenarios for {}, given selection of {} device(s) and {} instrument(s)."
     print("\n", data_1.format(num_d, num_i, vendor, product_list), "\n")
-    print(data_2.format(len(code_list), product_list, sum_cost, percentile1), "\n")
-    print(data_3.format(vendor, len(code_vendor), sum_cost, percentile2, vendor), "\n")
+    print(data_2.format(num_scenarios, product_list, sum_cost, percentile1), "\n")
+    print(data_3.format(vendor, num_vendor_scenarios, sum_cost, percentile2, vendor), "\n")
     print(data_4.format(sum_cost, percentile3, num_d, num_i), "\n")
     print(data_5.format(sum_cost, percentile4, vendor, num_d, num_i), "\n")
-    return percentile1, percentile2, percentile3, percentile4, product_list
+    return
 
-def hist_1(sum_cost, cost_list, percentile1, product_list): #histogram of costs for all possible instrument-acquisition scenarios, given V1 user-input for vendor  
-    text = str(product_list) + ': \n' + str(sum_cost) + ' USD, ' + str(percentile1) + ' percentile'
-    cost_list.sort()
-    num_samples = len(cost_list)
-    cost_list_min = cost_list[0]
-    cost_list_max = cost_list[-1]
-    span = cost_list_max - cost_list_min
-    cost_array = np.array(cost_list)
-    num_bins = int(span * ((num_samples) ** (1/3)) / stats.tstd(cost_array) / 3.49) #Scott 1979 rule of thumb for number of bins
-    if num_bins % 2 == 0:
-        num_bins + 1
-    if num_bins <= 4:
-        num_bins = 5
-    bin_size = span / num_bins
-    if sum_cost == cost_list_max:
-        lower_bound_bin = sum_cost - bin_size
-        upper_bound_bin = sum_cost
-    else:
-        if sum_cost == cost_list_min:
-            lower_bound_bin = sum_cost
-            upper_bound_bin = sum_cost + bin_size
-        else:
-            lower_bound_bin = (math.trunc((sum_cost - cost_list_min) / bin_size) * bin_size) + cost_list_min
-            upper_bound_bin = lower_bound_bin + bin_size
-    count = len([i for i in cost_list if i > lower_bound_bin and i <= upper_bound_bin])
-    b = [x for x in cost_list if x > lower_bound_bin and x <= upper_bound_bin]
-    c = [y for y in cost_list if y <= lower_bound_bin]
-    d = [z for z in cost_list if z > upper_bound_bin]
-    highlight_values = [round(num) for num in b]
-    other_values_lower = [round(num) for num in c]
-    other_values_upper = [round(num) for num in d]
-    num_bins_lower = round((lower_bound_bin - cost_list_min) / bin_size)
-    num_bins_upper = round((cost_list_max - upper_bound_bin) / bin_size)
-    mid_cost_list = len(cost_list) // 2
-    med_cost_list = (cost_list[mid_cost_list] + cost_list[~mid_cost_list]) / 2
-    label_y_pos = count * 1.1
-    if sum_cost < med_cost_list:
-        label_x_pos = sum_cost - (bin_size * 2)
-    else:
-        label_x_pos = sum_cost
-    if sum_cost >= cost_list_min + bin_size:
-        a = [cost_list_min + (bin_size * n) for n in range(0, num_bins_lower + 1)]
-        plt.hist(other_values_lower, bins=a, color='#607c8e', edgecolor='black')
-    else:
-        a = []
-    plt.hist(highlight_values, bins=[lower_bound_bin, upper_bound_bin], label='bin containing:\n' + str(product_list), color='royalblue', edgecolor='black')
-    if sum_cost <= cost_list_max - bin_size:
-        f = [upper_bound_bin + (bin_size * n) for n in range(0, num_bins_upper + 1)]
-        plt.hist(other_values_upper, bins=f, color='#607c8e', edgecolor='black')
-    else:
-        f = []
-    bins_list = a + f
-    start_list = [bins_list[n] for n in range(0,len(bins_list)-1)]
-    end_list = [bins_list[n] for n in range(1,len(bins_list))]
-    count_list = []
-    for i in range(0, len(start_list)):
-        counts = len([x for x in cost_list if start_list[i] <= x <= end_list[i]])
-        count_list.append(counts)
-    count_list.sort()
-    max_count = count_list[-1]
-    plt.title('Distribution of all procurement scenarios- all vendors and products')
-    plt.xlabel('Procurement Cost (USD)')
-    plt.ylabel('Counts')
-    plt.text(label_x_pos, label_y_pos, text, backgroundcolor='lightgray')
-    plt.legend()
-    plt.ylim((None, max_count*1.2))
-    plt.xlim((None, cost_list_max * 1.1))
-    plt.show()
+def plot_bins(bins, sum_cost, percentile, product_list, title, ax=None):
+    # draws the bins computed by compute_bins: the bin containing sum_cost in blue, all other bins in grey
+    # with ax=None the chart goes to the current figure and is shown; otherwise it is drawn on ax and left for the caller to save
+    show = ax is None
+    if show:
+        import matplotlib.pyplot as plt # loaded on the first histogram, not when the module is imported
+        ax = plt.gca()
+    text = str(product_list) + ': \n' + str(sum_cost) + ' USD, ' + str(percentile) + ' percentile'
+    edges = bins['edges']
+    counts = bins['counts']
+    widths = np.diff(edges)
+    highlight = bins['highlight']
+    ax.bar(edges[:highlight], counts[:highlight], width=widths[:highlight], align='edge', color='#607c8e', edgecolor='black')
+    ax.bar(edges[highlight], counts[highlight], width=widths[highlight], align='edge', label='bin containing:\n' + str(product_list), color='royalblue', edgecolor='black')
+    ax.bar(edges[highlight + 1:-1], counts[highlight + 1:], width=widths[highlight + 1:], align='edge', color='#607c8e', edgecolor='black')
+    ax.set_title(title)
+    ax.set_xlabel('Procurement Cost (USD)')
+    ax.set_ylabel('Counts')
+    ax.text(bins['label_x'], bins['label_y'], text, backgroundcolor='lightgray')
+    ax.legend()
+    ax.set_ylim((None, bins['max_count']*1.2))
+    ax.set_xlim((None, bins['max'] * 1.1))
+    if show:
+        plt.show()
     return
 
-def hist_2(cost_vendor, vendor, sum_cost, percentile2, product_list): #histogram of costs for all possible instrument-acquisition scenarios, given V2 user-input for vendor
-    text = str(product_list) + ': \n' + str(sum_cost) + ' USD, ' + str(percentile2) + ' percentile'
-    cost_vendor.sort()
-    num_samples = len(cost_vendor)
-    cost_vendor_min = cost_vendor[0]
-    cost_vendor_max = cost_vendor[-1]
-    span = cost_vendor_max - cost_vendor_min
-    cost_vendor_array = np.array(cost_vendor)
-    num_bins = int(span * ((num_samples) ** (1/3)) / stats.tstd(cost_vendor_array) / 3.49) #Scott 1979 rule of thumb for number of bins
-    if num_bins % 2 == 0:
-        num_bins + 1
-    if num_bins <= 4:
-        num_bins = 5
-    bin_size = span / num_bins
-    if sum_cost == cost_vendor_max:
-        lower_bound_bin = sum_cost - bin_size
-        upper_bound_bin = sum_cost
-    else:
-        if sum_cost == cost_vendor_min:
-            lower_bound_bin = sum_cost
-            upper_bound_bin = sum_cost + bin_size
-        else:
-            lower_bound_bin = (math.trunc((sum_cost - cost_vendor_min) / bin_size) * bin_size) + cost_vendor_min
-            upper_bound_bin = lower_bound_bin + bin_size
-    count = len([i for i in cost_vendor if i > lower_bound_bin and i <= upper_bound_bin])
-    b = [x for x in cost_vendor if x > lower_bound_bin and x <= upper_bound_bin]
-    c = [y for y in cost_vendor if y <= lower_bound_bin]
-    d = [z for z in cost_vendor if z > upper_bound_bin]
-    highlight_values = [round(num) for num in b]
-    other_values_lower = [round(num) for num in c]
-    other_values_upper = [round(num) for num in d]
-    num_bins_lower = round((lower_bound_bin - cost_vendor_min) / bin_size)
-    num_bins_upper = round((cost_vendor_max - upper_bound_bin) / bin_size)
-    mid_cost_list = len(cost_vendor) // 2
-    med_cost_list = (cost_vendor[mid_cost_list] + cost_vendor[~mid_cost_list]) / 2
-    label_y_pos = count * 1.1
-    if sum_cost < med_cost_list:
-        label_x_pos = sum_cost - (bin_size * 2)
-    else:
-        label_x_pos = sum_cost
-    if sum_cost >= cost_vendor_min + bin_size:
-        a = [cost_vendor_min + (bin_size * n) for n in range(0, num_bins_lower + 1)]
-        plt.hist(other_values_lower, bins=a, color='#607c8e', edgecolor='black')
-    else:
-        a = []
-    plt.hist(highlight_values, bins=[lower_bound_bin, upper_bound_bin], label='bin containing:\n' + str(product_list), color='royalblue', edgecolor='black')
-    if sum_cost <= cost_vendor_max - bin_size:
-        f = [upper_bound_bin + (bin_size * n) for n in range(0, num_bins_upper + 1)]
-        plt.hist(other_values_upper, bins=f, color='#607c8e', edgecolor='black')
-    else:
-        f = []
-    bins_list = a + f
-    start_list = [bins_list[n] for n in range(0,len(bins_list)-1)]
-    end_list = [bins_list[n] for n in range(1,len(bins_list))]
-    count_list = []
-    for i in range(0, len(start_list)):
-        counts = len([x for x in cost_vendor if start_list[i] <= x <= end_list[i]])
-        count_list.append(counts)
-    count_list.sort()
-    max_count = count_list[-1]
+def hist_1(sum_cost, cost_list, percentile1, product_list, ax=None): #histogram of costs for all possible procurement scenarios across all vendors
+    bins = compute_bins(cost_list, sum_cost)
+    plot_bins(bins, sum_cost, percentile1, product_list, 'Distribution of all procurement scenarios- all vendors and products', ax)
+    return
+
+def hist_2(cost_vendor, vendor, sum_cost, percentile2, product_list, ax=None): #histogram of costs for all possible procurement scenarios, given user-input for vendor
+    bins = compute_bins(cost_vendor, sum_cost)
     x = "Distribution of procurement scenarios given vendor selection: {}"
-    plt.title(x.format(vendor))
-    plt.xlabel('Procurement Cost (USD)')
-    plt.ylabel('Counts')
-    plt.text(label_x_pos, label_y_pos, text, backgroundcolor='lightgray')
-    plt.legend()
-    plt.ylim((None, max_count*1.2))
-    plt.xlim((None, cost_vendor_max * 1.1))
-    plt.show()
+    plot_bins(bins, sum_cost, percentile2, product_list, x.format(vendor), ax)
     return
 
-def hist_3(filtered_cost_list, num_d, num_i, sum_cost, percentile3, product_list): #histogram of costs for all possible instrument-acquisition scenarios, given V3 user-input for vendor
-    text = str(product_list) + ': \n' + str(sum_cost) + ' USD, ' + str(percentile3) + ' percentile'
-    filtered_cost_list.sort()
-    num_samples = len(filtered_cost_list)
-    filtered_cost_min = filtered_cost_list[0]
-    filtered_cost_max = filtered_cost_list[-1]
-    span = filtered_cost_max - filtered_cost_min
-    filtered_cost_array = np.array(filtered_cost_list)
-    num_bins = int(span * ((num_samples) ** (1/3)) / stats.tstd(filtered_cost_array) / 3.49) #Scott 1979 rule of thumb for number of bins
-    if num_bins % 2 == 0:
-        num_bins + 1
-    if num_bins <= 4:
-        num_bins = 5
-    bin_size = span / num_bins
-    if sum_cost == filtered_cost_max:
-        lower_bound_bin = sum_cost - bin_size
-        upper_bound_bin = sum_cost
-    else:
-        if sum_cost == filtered_cost_min:
-            lower_bound_bin = sum_cost
-            upper_bound_bin = sum_cost + bin_size
-        else:
-            lower_bound_bin = (math.trunc((sum_cost - filtered_cost_min) / bin_size) * bin_size) + filtered_cost_min
-            upper_bound_bin = lower_bound_bin + bin_size
-    count = len([i for i in filtered_cost_list if i > lower_bound_bin and i <= upper_bound_bin])
-    highlight_values = [round(x) for x in filtered_cost_list if x > lower_bound_bin and x <= upper_bound_bin]
-    other_values_lower = [round(y) for y in filtered_cost_list if y <= lower_bound_bin]
-    other_values_upper = [round(z) for z in filtered_cost_list if z > upper_bound_bin]
-    mid_cost_list = len(filtered_cost_list) // 2
-    med_cost_list = (filtered_cost_list[mid_cost_list] + filtered_cost_list[~mid_cost_list]) / 2
-    label_y_pos = count * 1.1
-    if sum_cost < med_cost_list:
-        label_x_pos = sum_cost - (bin_size * 2)
-    else:
-        label_x_pos = sum_cost
-    if sum_cost >= filtered_cost_min + bin_size:
-        num_bins_lower = round((lower_bound_bin - filtered_cost_min) / bin_size)
-        a = [filtered_cost_min + (bin_size * n) for n in range(0, num_bins_lower + 1)]
-        plt.hist(other_values_lower, bins=a, color='#607c8e', edgecolor='black')
-    else:
-        a = []
-    plt.hist(highlight_values, bins=[lower_bound_bin, upper_bound_bin], label='bin containing:\n' + str(product_list), color='royalblue', edgecolor='black')
-    if sum_cost <= filtered_cost_max - bin_size:
-        num_bins_upper = round((filtered_cost_max - upper_bound_bin) / bin_size)
-        f = [upper_bound_bin + (bin_size * n) for n in range(0, num_bins_upper + 1)]
-        plt.hist(other_values_upper, bins=f, color='#607c8e', edgecolor='black')
-    else:
-        f = []
-    if sum_cost >= filtered_cost_max - bin_size:
-        bins_list = a + [upper_bound_bin]
-    else:
-        if sum_cost <= filtered_cost_min + bin_size:
-            bins_list = f + [lower_bound_bin]
-        else:
-            bins_list = a + f
-    start_list = [bins_list[n] for n in range(0,len(bins_list)-1)]
-    end_list = [bins_list[n] for n in range(1,len(bins_list))]
-    count_list = []
-    for i in range(0, len(start_list)):
-        counts = len([x for x in filtered_cost_list if start_list[i] <= x <= end_list[i]])
-        count_list.append(counts)
-    count_list.sort()
-    max_count = count_list[-1]
+def hist_3(filtered_cost_list, num_d, num_i, sum_cost, percentile3, product_list, ax=None): #histogram of costs for all possible procurement scenarios, given user-input for num_d and num_i
+    bins = compute_bins(filtered_cost_list, sum_cost)
     x = "Distribution of procurement scenarios given {} device(s) and {} instrument(s)"
-    plt.title(x.format(num_d, num_i))
-    plt.xlabel('Procurement Cost (USD)')
-    plt.ylabel('Counts')
-    plt.text(label_x_pos, label_y_pos, text, backgroundcolor='lightgray')
-    plt.legend()
-    plt.ylim((None, max_count*1.2))
-    plt.xlim((None, filtered_cost_max * 1.1))
-    plt.show()
+    plot_bins(bins, sum_cost, percentile3, product_list, x.format(num_d, num_i), ax)
     return
 
-def hist_4(filtered_vendor_cost_list, vendor, sum_cost, percentile4, num_d, num_i, product_list): #histogram of costs for all possible instrument-acquisition scenarios, given V4 user-input for vendor
-    text = str(product_list) + ': \n' + str(sum_cost) + ' USD, ' + str(percentile4) + ' percentile'
-    filtered_vendor_cost_list.sort()
-    num_samples = len(filtered_vendor_cost_list)
-    filtered_vendor_cost_min = filtered_vendor_cost_list[0]
-    filtered_vendor_cost_max = filtered_vendor_cost_list[-1]
-    span = filtered_vendor_cost_max - filtered_vendor_cost_min
-    filtered_cost_array = np.array(filtered_vendor_cost_list)
-    num_bins = int(span * ((num_samples) ** (1/3)) / stats.tstd(filtered_cost_array) / 3.49) #Scott 1979 rule of thumb for number of bins
-    if num_bins % 2 == 0:
-        num_bins + 1
-    if num_bins <= 4:
-        num_bins = 5
-    bin_size = span / num_bins
-    if sum_cost == filtered_vendor_cost_max:
-        lower_bound_bin = sum_cost - bin_size
-        upper_bound_bin = sum_cost
-    else:
-        if sum_cost == filtered_vendor_cost_min:
-            lower_bound_bin = sum_cost
-            upper_bound_bin = sum_cost + bin_size
-        else:
-            lower_bound_bin = (math.trunc((sum_cost - filtered_vendor_cost_min) / bin_size) * bin_size) + filtered_vendor_cost_min
-            upper_bound_bin = lower_bound_bin + bin_size
-    count = len([i for i in filtered_vendor_cost_list if i > lower_bound_bin and i <= upper_bound_bin])
-    highlight_values = [round(x) for x in filtered_vendor_cost_list if x > lower_bound_bin and x <= upper_bound_bin]
-    other_values_lower = [round(y) for y in filtered_vendor_cost_list if y <= lower_bound_bin]
-    other_values_upper = [round(z) for z in filtered_vendor_cost_list if z > upper_bound_bin]
-    mid_cost_list = len(filtered_vendor_cost_list) // 2
-    med_cost_list = (filtered_vendor_cost_list[mid_cost_list] + filtered_vendor_cost_list[~mid_cost_list]) / 2
-    label_y_pos = count * 1.1
-    if sum_cost < med_cost_list:
-        label_x_pos = sum_cost - (bin_size * 2)
-    else:
-        label_x_pos = sum_cost
-    if sum_cost >= filtered_vendor_cost_min + bin_size:
-        num_bins_lower = round((lower_bound_bin - filtered_vendor_cost_min) / bin_size)
-        a = [filtered_vendor_cost_min + (bin_size * n) for n in range(0, num_bins_lower + 1)]
-        plt.hist(other_values_lower, bins=a, color='#607c8e', edgecolor='black')
-    else:
-        a = []
-    plt.hist(highlight_values, bins=[lower_bound_bin, upper_bound_bin], label='bin containing:\n' + str(product_list), color='royalblue', edgecolor='black')
-    if sum_cost <= filtered_vendor_cost_max - bin_size:
-        num_bins_upper = round((filtered_vendor_cost_max - upper_bound_bin) / bin_size)
-        f = [upper_bound_bin + (bin_size * n) for n in range(0, num_bins_upper + 1)]
-        plt.hist(other_values_upper, bins=f, color='#607c8e', edgecolor='black')
-    else:
-        f = []
-    if sum_cost >= filtered_vendor_cost_max - bin_size:
-        bins_list = a + [upper_bound_bin]
-    else:
-        if sum_cost <= filtered_vendor_cost_min + bin_size:
-            bins_list = f + [lower_bound_bin]
-        else:
-            bins_list = a + f
-    start_list = [bins_list[n] for n in range(0,len(bins_list)-1)]
-    end_list = [bins_list[n] for n in range(1,len(bins_list))]
-    count_list = []
-    for i in range(0, len(start_list)):
-        counts = len([x for x in filtered_vendor_cost_list if start_list[i] <= x <= end_list[i]])
-        count_list.append(counts)
-    count_list.sort()
-    max_count = count_list[-1]
+def hist_4(filtered_vendor_cost_list, vendor, sum_cost, percentile4, num_d, num_i, product_list, ax=None): #histogram of costs for all possible procurement scenarios, given user-input for vendor, num_d and num_i
+    bins = compute_bins(filtered_vendor_cost_list, sum_cost)
     x = "Distribution of procurement scenarios given vendor section {}, {} device(s) and {} instrument(s)"
-    plt.title(x.format(vendor, num_d, num_i))
-    plt.xlabel('Procurement Cost (USD)')
-    plt.ylabel('Counts')
-    plt.text(label_x_pos, label_y_pos, text, backgroundcolor='lightgray')
-    plt.legend()
-    plt.ylim((None, max_count*1.2))
-    plt.xlim((None, filtered_vendor_cost_max * 1.1))
-    plt.show()
+    plot_bins(bins, sum_cost, percentile4, product_list, x.format(vendor, num_d, num_i), ax)
     return
 
-def hist_5(cost_v1, cost_v2, cost_v3, cost_v4): #histogram of all vendor pricing options / procurement scenarios
-    plt.hist(cost_v1, histtype='stepfilled', bins = 13, alpha = 0.25, label = 'V1', edgecolor='black', color='royalblue')
-    plt.hist(cost_v2, histtype='stepfilled', bins = 12, alpha = 0.25, label = 'V2', edgecolor='black', color='lightcoral')
-    plt.hist(cost_v3, histtype='stepfilled', bins = 20, alpha = 0.25, label = 'V3', edgecolor='black', color='forestgreen')
-    plt.hist(cost_v4, histtype='stepfilled', bins = 10, alpha = 0.25, label = 'V4', edgecolor='black', color='dimgrey')
-    plt.legend(loc = 'upper right')
-    plt.title('Comparison of all vendor price options')
-    plt.xlabel('Procurement Cost (USD)')
-    plt.ylabel('Counts')
-    plt.grid(axis = 'y')
-    plt.show()
+def hist_5(cost_v1, cost_v2, cost_v3, cost_v4, ax=None, bins='kde'): #histogram of all vendor pricing options / procurement scenarios
+    # bins='kde' overlays smooth cost densities on one shared grid (see cost_density.py), which do not depend on a choice of bins
+    # and compare vendors with different numbers of scenarios; bins='fixed' draws the original histograms with fixed bin counts
+    show = ax is None
+    if show:
+        import matplotlib.pyplot as plt # loaded on the first histogram, not when the module is imported
+        ax = plt.gca()
+    colors = {'V1': 'royalblue', 'V2': 'lightcoral', 'V3': 'forestgreen', 'V4': 'dimgrey'}
+    if bins == 'kde':
+        result = vendor_densities({'V1': cost_v1, 'V2': cost_v2, 'V3': cost_v3, 'V4': cost_v4})
+        for vendor, density in result['densities'].items():
+            ax.fill_between(result['grid'], density, alpha = 0.25, label = vendor, edgecolor='black', color=colors[vendor])
+        ax.set_xlim(max(result['grid'][0], 0.0), result['grid'][-1]) # the kernel tails reach below 0 USD, which no scenario costs
+        ax.set_ylabel('Density (share of scenarios per USD)')
+    else:
+        ax.hist(cost_v1, histtype='stepfilled', bins = 13, alpha = 0.25, label = 'V1', edgecolor='black', color=colors['V1'])
+        ax.hist(cost_v2, histtype='stepfilled', bins = 12, alpha = 0.25, label = 'V2', edgecolor='black', color=colors['V2'])
+        ax.hist(cost_v3, histtype='stepfilled', bins = 20, alpha = 0.25, label = 'V3', edgecolor='black', color=colors['V3'])
+        ax.hist(cost_v4, histtype='stepfilled', bins = 10, alpha = 0.25, label = 'V4', edgecolor='black', color=colors['V4'])
+        ax.set_ylabel('Counts')
+    ax.legend(loc = 'upper right')
+    ax.set_title('Comparison of all vendor price options')
+    ax.set_xlabel('Procurement Cost (USD)')
+    ax.grid(axis = 'y')
+    if show:
+        plt.show()
     return
 
-def main():
-    while True:
-        introduction()
-        vendor = get_vendor()
-        num_d, num_i = get_number(vendor)
-        D1, D2, D3, I1, I2, I3 = get_variables(vendor, num_d, num_i)
-        sum_cost = user_input_cost(D1, D2, D3, I1, I2, I3, vendor)
-        df_vendor, df_v1, df_v2, df_v3, df_v4 = get_dfs(vendor)
-        cost_vendor, cost_v1, cost_v2, cost_v3, cost_v4, cost_list = get_costs(df_vendor, df_v1, df_v2, df_v3, df_v4)
-        code_vendor, code_list = get_codes(df_vendor, df_v1, df_v2, df_v3, df_v4)
-        filtered_cost_list = filter_cost_list(code_list, cost_list, num_d, num_i)
-        filtered_vendor_cost_list = filter_vendor_cost_list(code_vendor, cost_vendor, num_d, num_i)
-        percentile1, percentile2, percentile3, percentile4, product_list = data_report(cost_list, sum_cost, cost_vendor, filtered_cost_list, filtered_vendor_cost_list, vendor, num_d, num_i, code_list, code_vendor, D1, D2, D3, I1, I2, I3)
-        hist_1(sum_cost, cost_list, percentile1, product_list)
-        hist_2(cost_vendor, vendor, sum_cost, percentile2, product_list)
-        hist_3(filtered_cost_list, num_d, num_i, sum_cost, percentile3, product_list)
-        hist_4(filtered_vendor_cost_list, vendor, sum_cost, percentile4, num_d, num_i, product_list)
-        hist_5(cost_v1, cost_v2, cost_v3, cost_v4)
+def main(rank_by='cost', profile=None, profile_format='json', cache_dir=None):
+    # rank_by='npv' compares scenarios by the net present value of their 5-year cash flows instead of their sticker cost
+    # profile is an optional file to record the time and memory of every stage to (see stage_profiler.py), as 'json' or 'chrome' trace
+    # cache_dir is an optional folder of the persistent report cache (see report_cache.py): repeated scenarios are printed and shown from it
+    if profile:
+        stage_profiler.enable()
+    try:
+        while True:
+            stage_profiler.new_scenario()
+            with stage('prompts'):
+                introduction()
+                vendor = get_vendor()
+                num_d, num_i = get_number(vendor)
+                D1, D2, D3, I1, I2, I3 = get_variables(vendor, num_d, num_i)
+            if cache_dir:
+                with stage('report_cache'):
+                    from report_cache import cached_report, show_charts
+                    report = cached_report(vendor, [x for x in [D1, D2, D3] if x != '0'], [x for x in [I1, I2, I3] if x != '0'], rank_by, cache_dir)
+                print_report(report['cost'], vendor, num_d, num_i, report['product_list'], report['percentiles'], report['num_scenarios'], report['num_vendor_scenarios'])
+                with stage('alternatives'):
+                    print_alternatives(load_catalog(), report['cost'], vendor, num_d, num_i, cost_column=rank_by)
+                show_charts(report)
+                restart = input('\nWould you like to restart? Enter \'yes\' or \'no\'.\n')
+                if restart.lower() != 'yes':
+                    break
+                continue
+            with stage('user_input_cost'):
+                sum_cost = user_input_cost(D1, D2, D3, I1, I2, I3, vendor)
+            if rank_by == 'npv':
+                with stage('scenario_npv'):
+                    from cash_flow import scenario_npv
+                    sum_cost = round(scenario_npv(D1, D2, D3, I1, I2, I3, vendor, sum_cost), 2)
+            with stage('get_sorted_costs'):
+                cost_vendor, cost_v1, cost_v2, cost_v3, cost_v4, cost_list, filtered_cost_list, filtered_vendor_cost_list = get_sorted_costs(vendor, num_d, num_i, rank_by)
+            with stage('data_report'):
+                percentile1, percentile2, percentile3, percentile4, product_list = data_report(cost_list, sum_cost, cost_vendor, filtered_cost_list, filtered_vendor_cost_list, vendor, num_d, num_i, cost_list, cost_vendor, D1, D2, D3, I1, I2, I3)
+            with stage('alternatives'):
+                print_alternatives(load_catalog(), sum_cost, vendor, num_d, num_i, cost_column=rank_by) # other vendors' scenarios of about the same expense, and the cheapest with the same unit counts
+            with stage('hist_1'):
+                hist_1(sum_cost, cost_list, percentile1, product_list)
+            with stage('hist_2'):
+                hist_2(cost_vendor, vendor, sum_cost, percentile2, product_list)
+            with stage('hist_3'):
+                hist_3(filtered_cost_list, num_d, num_i, sum_cost, percentile3, product_list)
+            with stage('hist_4'):
+                hist_4(filtered_vendor_cost_list, vendor, sum_cost, percentile4, num_d, num_i, product_list)
+            with stage('hist_5'):
+                hist_5(cost_v1, cost_v2, cost_v3, cost_v4)
 
-        restart = input('\nWould you like to restart? Enter \'yes\' or \'no\'.\n')
-        if restart.lower() != 'yes':
-            break
+            restart = input('\nWould you like to restart? Enter \'yes\' or \'no\'.\n')
+            if restart.lower() != 'yes':
+                break
+    finally:
+        if profile:
+            stage_profiler.write_profile(profile, profile_format)
+            print(stage_profiler.summary_table())
+            stage_profiler.disable()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Forecast the expense of a procurement scenario and compare it with all vendor scenarios.')
+    parser.add_argument('--rank-by', default='cost', choices=['cost', 'npv'], help='compare scenarios by sticker cost (default) or by 5-year NPV')
+    parser.add_argument('--profile', default=None, help='record wall time, CPU time and peak memory of every stage to this file')
+    parser.add_argument('--profile-format', default='json', choices=['json', 'chrome'], help='format of the --profile file: JSON records (default) or a Chrome trace')
+    parser.add_argument('--cache', nargs='?', const='.report_cache', default=None, help='answer repeated scenarios from the persistent report cache in this folder (default .report_cache)')
+    args = parser.parse_args()
+    main(args.rank_by, args.profile, args.profile_format, args.cache)
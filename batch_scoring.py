@@ -0,0 +1,139 @@
+"""
+Non-interactive batch scoring of many procurement scenarios.
+
+Usage:
+    python batch_scoring.py scenarios.csv results.csv
+
+The input file (.csv or .json) holds one scenario per row (or per JSON object) with the following fields:
+    vendor - 'V1', 'V2', 'V3' or 'V4'
+    devices - names of the devices to be procured (a JSON list, or names separated by ';' in a .csv)
+    instruments - names of the instruments to be procured (a JSON list, or names separated by ';' in a .csv)
+A .csv may instead use the catalog slot columns I1, I2, I3, D1, D2, D3, with '0' for an empty slot.
+As in get_variables, V1 devices always follow the V1 instrument bundles, so devices given for V1 are ignored.
+
+All scenarios are priced in one vectorized pass of the user_input_cost rules and get the four data_report percentiles.
+The results are written as a .csv or .json table (chosen by the output file extension), one row per input scenario.
+Scenarios that cannot be priced (unknown vendor or a product the vendor does not offer) keep their row, with the reason in 'error'.
+"""
+
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+from cost_index import batch_percentiles, get_cost_index
+from pricing_rules import V1_BUNDLES, VENDOR_DEVICES, VENDOR_INSTRUMENTS, price_scenarios
+from scenario_catalog import load_catalog
+
+PRODUCT_SEPARATOR = ';'
+
+def split_products(value):
+    # list of product names from a JSON list or a ';'-separated .csv cell, without empty slots
+    if isinstance(value, (list, tuple)):
+        names = [str(name).strip() for name in value]
+    elif value is None or (isinstance(value, float) and np.isnan(value)):
+        names = []
+    else:
+        names = [name.strip() for name in str(value).split(PRODUCT_SEPARATOR)]
+    return [name for name in names if name not in ('', '0')]
+
+def read_scenarios(path):
+    """
+    input- path of a .csv or .json file of scenarios
+    output- dataframe with the columns vendor, devices and instruments (lists of product names)
+    """
+    if path.lower().endswith('.json'):
+        with open(path) as f:
+            df = pd.DataFrame(json.load(f))
+    else:
+        df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    if 'devices' not in df.columns and 'D1' in df.columns: # catalog slot columns
+        device_columns = sorted(name for name in df.columns if name[:1] == 'D' and name[1:].isdigit())
+        instrument_columns = sorted(name for name in df.columns if name[:1] == 'I' and name[1:].isdigit())
+        df['devices'] = df[device_columns].values.tolist()
+        df['instruments'] = df[instrument_columns].values.tolist()
+    for name in ['vendor', 'devices', 'instruments']:
+        if name not in df.columns:
+            df[name] = ''
+    scenarios = pd.DataFrame({'vendor': df['vendor'].astype(str).str.strip(),
+    'devices': df['devices'].map(split_products),
+    'instruments': df['instruments'].map(split_products)})
+    return scenarios
+
+def slot_array(product_lists, width):
+    # 2-D array of product names, left-aligned and padded with '0', as user_input_cost expects
+    slots = np.full((len(product_lists), width), '0', dtype=object)
+    for row, names in enumerate(product_lists):
+        slots[row, :len(names)] = names
+    return slots
+
+def score_scenarios(scenarios, cost_index):
+    """
+    input- dataframe from read_scenarios and the cost index to rank against
+    output- dataframe with one row per scenario: vendor, devices, instruments, num_d, num_i, cost, percentile1-4 and error
+    """
+    vendors = scenarios['vendor'].to_numpy(dtype=str)
+    width = max([3] + scenarios['devices'].map(len).tolist() + scenarios['instruments'].map(len).tolist()) # at least the three slots of user_input_cost
+    instrument_slots = slot_array(scenarios['instruments'].tolist(), width)
+    device_slots = slot_array(scenarios['devices'].tolist(), width)
+    v1 = vendors == 'V1'
+    if v1.any():
+        device_slots[v1] = np.vectorize(lambda name: V1_BUNDLES.get(name, '0'), otypes=[object])(instrument_slots[v1])
+    instrument_slots = instrument_slots.astype(str)
+    device_slots = device_slots.astype(str)
+    errors = np.full(len(vendors), '', dtype=object)
+    errors[~np.isin(vendors, list(VENDOR_INSTRUMENTS))] = 'unknown vendor'
+    for vendor in VENDOR_INSTRUMENTS:
+        rows = vendors == vendor
+        offered_devices = np.isin(device_slots[rows], VENDOR_DEVICES[vendor] + ['0']).all(axis=1)
+        offered_instruments = np.isin(instrument_slots[rows], VENDOR_INSTRUMENTS[vendor] + ['0']).all(axis=1)
+        errors[np.flatnonzero(rows)[~(offered_devices & offered_instruments)]] = 'product not offered by ' + vendor
+    valid = errors == ''
+    num_d = np.count_nonzero(device_slots != '0', axis=1)
+    num_i = np.count_nonzero(instrument_slots != '0', axis=1)
+    costs = np.full(len(vendors), np.nan)
+    codes = np.char.add(np.char.add(num_i.astype(str), '_'), num_d.astype(str))
+    percentiles = np.full((len(vendors), 4), np.nan)
+    if valid.any(): # a file without any scenario that can be priced still gets its rows, with the errors
+        costs[valid] = price_scenarios(vendors[valid], device_slots[valid], instrument_slots[valid])
+        percentiles[valid] = batch_percentiles(cost_index, costs[valid], vendors[valid], codes[valid])
+    results = pd.DataFrame({'vendor': vendors,
+    'devices': [PRODUCT_SEPARATOR.join(name for name in names if name != '0') for names in device_slots.tolist()],
+    'instruments': [PRODUCT_SEPARATOR.join(name for name in names if name != '0') for names in instrument_slots.tolist()],
+    'num_d': num_d,
+    'num_i': num_i,
+    'cost': costs})
+    for column in range(4):
+        results['percentile' + str(column + 1)] = pd.array(np.trunc(percentiles[:, column]), dtype='Int64') # whole percentiles, as printed by data_report
+    results['error'] = errors
+    return results
+
+def result_slots(results):
+    """
+    input- dataframe from score_scenarios (or any dataframe with vendor, devices and instruments as ';'-separated names)
+    output- vendors, device slots and instrument slots as NumPy arrays, padded with '0' as in score_scenarios
+    """
+    devices = [names.split(PRODUCT_SEPARATOR) if names else [] for names in results['devices']]
+    instruments = [names.split(PRODUCT_SEPARATOR) if names else [] for names in results['instruments']]
+    width = max([3] + [len(names) for names in devices + instruments])
+    return results['vendor'].to_numpy(dtype=str), slot_array(devices, width).astype(str), slot_array(instruments, width).astype(str)
+
+def write_results(results, path):
+    if path.lower().endswith('.json'):
+        results.to_json(path, orient='records', indent=1)
+    else:
+        results.to_csv(path, index=False)
+
+def main():
+    parser = argparse.ArgumentParser(description='Price a file of procurement scenarios and rank them against all vendor scenarios.')
+    parser.add_argument('scenarios', help='.csv or .json file of scenarios (vendor, devices, instruments)')
+    parser.add_argument('results', help='.csv or .json file to write the scored scenarios to')
+    args = parser.parse_args()
+    cost_index = get_cost_index(load_catalog())
+    results = score_scenarios(read_scenarios(args.scenarios), cost_index)
+    write_results(results, args.results)
+    print('Scored {} scenarios ({} could not be priced) into {}'.format(len(results), int((results['error'] != '').sum()), args.results))
+
+if __name__ == "__main__":
+    main()
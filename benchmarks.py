@@ -0,0 +1,185 @@
+"""
+Benchmark suite for the hot paths of the forecast pipeline, over synthetic scenario catalogs of growing size.
+
+Usage:
+    python benchmarks.py [--sizes 1e3,1e4,1e5,1e6] [--repeat 5] [--save baseline.json] [--compare baseline.json] [--threshold 1.25]
+
+synthetic_catalog() resamples the scenarios generated by the pricing rules (pricing_rules.generate_catalog) to any number of rows,
+keeping each vendor's share of the catalog, and returns it in the layout of scenario_catalog.load_catalog. Every stage of main() is
+timed on it:
+    get_dfs - dataframes of every vendor (RFI_Expense_Forecast.get_dfs)
+    get_costs, get_codes - cost and 'i_d' lists of every vendor
+    filter_cost_list - the num_d/num_i filters of the list pipeline (filter_cost_list and filter_vendor_cost_list)
+    build_cost_index - sorting the catalog into the cost index (cost_index.build_cost_index)
+    percentiles - the four data_report percentiles (cost_index.report_percentiles)
+    bins - the bin counts of hist_1 to hist_4 (histogram_bins.compute_bins)
+    user_input_cost - user_input_cost called once per scenario of a batch
+    price_scenarios - the same batch priced in one vectorized call
+Each stage runs --repeat times; the minimum and median wall times are kept. --save writes them as a JSON baseline, and --compare
+flags every stage whose median is more than --threshold times its baseline median (the exit status is then 1).
+At 10^7 rows the dataframes and lists of the list pipeline need a few GB of memory.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+
+import RFI_Expense_Forecast as forecast
+from cost_index import build_cost_index, lookup_costs, report_percentiles
+from histogram_bins import compute_bins
+from pricing_rules import generate_catalog, price_scenarios
+from scenario_catalog import PRODUCT_COLUMNS
+
+DEFAULT_SIZES = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 1.25 # a stage regresses when its median is 25% slower than the baseline
+MAX_BATCH = 10 ** 4 # scenarios priced per call by the user_input_cost and price_scenarios stages
+PROBE = ('V2', 2, 1) # vendor, num_d and num_i of the scenario that is scored against the catalog
+
+def synthetic_catalog(rows, seed=0):
+    """
+    input- number of rows and random seed
+    output- scenario catalog of rows scenarios, drawn with replacement from the scenarios of the pricing rules
+    Product columns are object arrays, so each row only costs a pointer per product slot.
+    """
+    rng = np.random.default_rng(seed)
+    source = generate_catalog(3)
+    shares = np.array([stop - start for start, stop in source['vendor_slices'].values()], dtype=np.float64)
+    sizes = np.floor(shares / shares.sum() * rows).astype(np.int64)
+    sizes[0] += rows - sizes.sum()
+    picks = []
+    vendor_slices = {}
+    start = 0
+    for (vendor, (first, last)), size in zip(source['vendor_slices'].items(), sizes):
+        picks.append(rng.integers(first, last, size))
+        vendor_slices[vendor] = (start, start + size)
+        start += size
+    picks = np.concatenate(picks)
+    columns = {}
+    for name, values in source['columns'].items():
+        if name in PRODUCT_COLUMNS:
+            values = values.astype(object)
+        columns[name] = values[picks]
+    return {'columns': columns, 'vendor_slices': vendor_slices, 'sources': {vendor: {'synthetic': True, 'rows': rows, 'seed': seed} for vendor in vendor_slices}}
+
+def probe_scenario():
+    # a fixed scenario to score: slots as returned by get_variables, and its cost
+    vendor, num_d, num_i = PROBE
+    devices = ['Device_C', 'Device_D', '0']
+    instruments = ['Instrument_D', '0', '0']
+    return vendor, num_d, num_i, devices, instruments, forecast.user_input_cost(*devices, *instruments, vendor)
+
+def batch_slots(catalog, size):
+    # vendors and slot arrays of the first size catalog rows, as user_input_cost expects them
+    columns = catalog['columns']
+    rows = slice(0, min(size, len(columns['cost'])))
+    vendors = np.asarray(columns['vendor'][rows], dtype=str)
+    devices = np.stack([np.asarray(columns[name][rows], dtype=str) for name in ['D1', 'D2', 'D3']], axis=1)
+    instruments = np.stack([np.asarray(columns[name][rows], dtype=str) for name in ['I1', 'I2', 'I3']], axis=1)
+    return vendors, devices, instruments
+
+def stages(catalog):
+    """
+    Returns the benchmark stages for catalog as a list of (name, function without arguments).
+    Inputs of each stage are prepared here, outside of the timed functions.
+    """
+    vendor, num_d, num_i, devices, instruments, sum_cost = probe_scenario()
+    dfs = forecast.get_dfs(vendor, catalog)
+    cost_vendor, cost_v1, cost_v2, cost_v3, cost_v4, cost_list = forecast.get_costs(*dfs)
+    code_vendor, code_list = forecast.get_codes(*dfs)
+    index = build_cost_index(catalog)
+    sorted_costs = [lookup_costs(index), lookup_costs(index, vendor), lookup_costs(index, None, num_d, num_i), lookup_costs(index, vendor, num_d, num_i)]
+    sorted_costs = [costs for costs in sorted_costs if len(costs)] # hist_1 to hist_4
+    vendors, device_slots, instrument_slots = batch_slots(catalog, MAX_BATCH)
+    def filters():
+        forecast.filter_cost_list(code_list, cost_list, num_d, num_i)
+        forecast.filter_vendor_cost_list(code_vendor, cost_vendor, num_d, num_i)
+    def bins():
+        for costs in sorted_costs:
+            compute_bins(costs, sum_cost, is_sorted=True)
+    def user_input_costs():
+        for row in range(len(vendors)):
+            forecast.user_input_cost(*device_slots[row], *instrument_slots[row], vendors[row])
+    return [('get_dfs', lambda: forecast.get_dfs(vendor, catalog)),
+    ('get_costs', lambda: forecast.get_costs(*dfs)),
+    ('get_codes', lambda: forecast.get_codes(*dfs)),
+    ('filter_cost_list', filters),
+    ('build_cost_index', lambda: build_cost_index(catalog)),
+    ('percentiles', lambda: report_percentiles(index, sum_cost, vendor, num_d, num_i)),
+    ('bins', bins),
+    ('user_input_cost', user_input_costs),
+    ('price_scenarios', lambda: price_scenarios(vendors, device_slots, instrument_slots))]
+
+def time_stage(function, repeat):
+    # wall times of repeat calls, in seconds
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+def run_benchmarks(sizes=DEFAULT_SIZES, repeat=DEFAULT_REPEAT, seed=0):
+    """
+    input- catalog sizes in rows, repetitions per stage and random seed
+    output- dictionary {'meta': run environment, 'results': {'stage@rows': {'stage', 'rows', 'min', 'median', 'repeat'}}}
+    """
+    results = {}
+    for rows in sizes:
+        catalog = synthetic_catalog(rows, seed)
+        for name, function in stages(catalog):
+            times = time_stage(function, repeat)
+            results['{}@{}'.format(name, rows)] = {'stage': name, 'rows': rows, 'min': min(times), 'median': statistics.median(times), 'repeat': repeat}
+            print('{:>18} {:>10} rows  median {:>12.6f} s  min {:>12.6f} s'.format(name, rows, statistics.median(times), min(times)))
+        del catalog
+    meta = {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(), 'platform': platform.platform(), 'created': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    return {'meta': meta, 'results': results}
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    input- results of run_benchmarks, a saved baseline and the slowdown ratio that counts as a regression
+    output- list of (key, baseline median, new median, ratio) of every regressed stage, worst first
+    Stages missing from either run are ignored.
+    """
+    regressions = []
+    for key, result in results['results'].items():
+        before = baseline['results'].get(key)
+        if before is None or before['median'] <= 0:
+            continue
+        ratio = result['median'] / before['median']
+        if ratio > threshold:
+            regressions.append((key, before['median'], result['median'], ratio))
+    return sorted(regressions, key=lambda regression: -regression[3])
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the forecast pipeline on synthetic catalogs and compare against a baseline.')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES), help='comma-separated catalog sizes in rows, e.g. 1e3,1e5,1e7')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='runs of each stage (default 5)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', default=None, help='JSON file to write the results to, for use as a baseline')
+    parser.add_argument('--compare', default=None, help='JSON baseline to compare the results against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='median slowdown ratio flagged as a regression (default 1.25)')
+    args = parser.parse_args()
+    sizes = [int(float(size)) for size in args.sizes.split(',')]
+    results = run_benchmarks(sizes, args.repeat, args.seed)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=1)
+        print('Saved the results to', args.save)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for key, before, after, ratio in regressions:
+            print('REGRESSION {}: {:.6f} s -> {:.6f} s ({:.2f}x)'.format(key, before, after, ratio))
+        if regressions:
+            sys.exit(1)
+        print('No stage is more than {}x slower than {}'.format(args.threshold, args.compare))
+
+if __name__ == "__main__":
+    main()
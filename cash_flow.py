@@ -0,0 +1,120 @@
+"""
+Multi-year cash flows and net present value (NPV) of procurement scenarios.
+
+user_input_cost only adds up acquisition prices. cash_flows() spreads the expense of every scenario over the forecast years:
+- year 0: the acquisition cost of the scenario (its sticker cost)
+- every year from warranty_years on: a service contract per unit, priced as a share (service_rate) of the product's list price
+  and escalated every year by service_escalation
+npv() discounts the yearly spend at discount_rate. Both work on all scenarios at once: the yearly spend is a
+(scenarios x years) matrix, built from the unit counts of pricing_rules.tier_counts with one matrix product.
+
+add_cash_flow_columns() stores the NPV of every catalog row as the catalog column 'npv', so that get_cost_index(catalog, 'npv')
+ranks scenarios by NPV instead of sticker cost.
+
+Usage:
+    python cash_flow.py scenarios.csv results.csv [--settings settings.json]
+
+The optional settings file is a JSON object with any of the keys of CASH_FLOW_DEFAULTS.
+"""
+
+import argparse
+import json
+
+import numpy as np
+
+from batch_scoring import read_scenarios, result_slots, score_scenarios, write_results
+from cost_index import batch_percentiles, get_cost_index
+from pricing_rules import PRODUCTS, catalog_tier_counts, price_vector, tier_counts
+from scenario_catalog import load_catalog
+
+CASH_FLOW_DEFAULTS = {'years': 5, # length of the forecast, as in the 5-year expense forecast
+'discount_rate': 0.05, # yearly rate used to discount future spend
+'service_rate': 0.08, # yearly service contract as a share of the list price
+'service_escalation': 0.03, # yearly increase of the service contract price
+'warranty_years': 1, # years after acquisition without a service contract
+'service_rates': {}, # per-product overrides of service_rate
+'escalations': {}} # per-product overrides of service_escalation
+
+def cash_flow_settings(settings=None):
+    # CASH_FLOW_DEFAULTS updated with settings
+    merged = dict(CASH_FLOW_DEFAULTS)
+    merged.update(settings or {})
+    return merged
+
+def service_matrix(settings=None):
+    """
+    input- cash flow settings
+    output- np.ndarray of shape (len(PRODUCTS), years): service contract cost of one unit of each product in each year
+    """
+    settings = cash_flow_settings(settings)
+    years = np.arange(settings['years'])
+    rates = np.array([settings['service_rates'].get(name, settings['service_rate']) for name in PRODUCTS])
+    escalations = np.array([settings['escalations'].get(name, settings['service_escalation']) for name in PRODUCTS])
+    service = (price_vector() * rates)[:, None] * (1 + escalations[:, None]) ** years[None, :]
+    service[:, years < settings['warranty_years']] = 0
+    return service
+
+def cash_flows(tiers, acquisition, settings=None):
+    """
+    input- tier counts of the scenarios (pricing_rules.tier_counts), acquisition cost of every scenario and cash flow settings
+    output- np.ndarray of shape (number of scenarios, years): spend of every scenario in every year
+    """
+    units = np.asarray(tiers).sum(axis=0, dtype=np.float64) # units of each product, whatever their price tier
+    spend = units @ service_matrix(settings)
+    spend[:, 0] += acquisition
+    return spend
+
+def npv(spend, discount_rate):
+    # net present value of the yearly spend (year 0 is not discounted)
+    return spend @ (1 + discount_rate) ** -np.arange(spend.shape[1], dtype=np.float64)
+
+def add_cash_flow_columns(catalog, settings=None):
+    """
+    Adds the cash flows of every catalog row to the catalog:
+        catalog['spend'] - (rows x years) matrix of yearly spend, acquisition at the catalog cost
+        catalog['columns']['npv'] - NPV of every row
+    Returns the catalog.
+    """
+    settings = cash_flow_settings(settings)
+    spend = cash_flows(catalog_tier_counts(catalog), catalog['columns']['cost'], settings)
+    catalog['spend'] = spend
+    catalog['columns']['npv'] = npv(spend, settings['discount_rate'])
+    catalog.get('cost_indexes', {}).pop('npv', None) # an NPV index built with other settings is out of date
+    return catalog
+
+def scenario_npv(D1, D2, D3, I1, I2, I3, vendor, sum_cost, settings=None):
+    # NPV of a single scenario from the get_variables prompts, with sum_cost (from user_input_cost) as its acquisition cost
+    settings = cash_flow_settings(settings)
+    tiers = tier_counts([vendor], [[D1, D2, D3]], [[I1, I2, I3]])
+    return float(npv(cash_flows(tiers, [sum_cost], settings), settings['discount_rate'])[0])
+
+def main():
+    parser = argparse.ArgumentParser(description='Forecast the yearly spend and NPV of a file of procurement scenarios.')
+    parser.add_argument('scenarios', help='.csv or .json file of scenarios (vendor, devices, instruments)')
+    parser.add_argument('results', help='.csv or .json file to write the cash flows to')
+    parser.add_argument('--settings', default=None, help='JSON file of cash flow settings (see CASH_FLOW_DEFAULTS)')
+    args = parser.parse_args()
+    settings = None
+    if args.settings:
+        with open(args.settings) as f:
+            settings = json.load(f)
+    settings = cash_flow_settings(settings)
+    catalog = add_cash_flow_columns(load_catalog(), settings)
+    results = score_scenarios(read_scenarios(args.scenarios), get_cost_index(catalog))
+    valid = (results['error'] == '').to_numpy()
+    priced = results[valid]
+    vendors, device_slots, instrument_slots = result_slots(priced)
+    spend = cash_flows(tier_counts(vendors, device_slots, instrument_slots), priced['cost'].to_numpy(), settings)
+    scenario_npvs = npv(spend, settings['discount_rate'])
+    for year in range(settings['years']):
+        results.loc[valid, 'spend_year' + str(year)] = spend[:, year]
+    results.loc[valid, 'npv'] = scenario_npvs
+    codes = (priced['num_i'].astype(str) + '_' + priced['num_d'].astype(str)).to_numpy()
+    percentiles = batch_percentiles(get_cost_index(catalog, 'npv'), scenario_npvs, vendors, codes)
+    for column in range(4):
+        results.loc[valid, 'npv_percentile' + str(column + 1)] = np.trunc(percentiles[:, column])
+    write_results(results, args.results)
+    print('Forecast {} years of cash flows for {} scenarios into {}'.format(settings['years'], int(valid.sum()), args.results))
+
+if __name__ == "__main__":
+    main()
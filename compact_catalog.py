@@ -0,0 +1,194 @@
+"""
+Compact, integer-coded scenario catalog with order-invariant deduplication.
+
+The vendor .csv files hold every scenario as product-name strings ('Instrument_C laser', ...) and a string 'i_d' code, and list every
+ordering of the same products as its own row. compact_catalog() stores the same scenarios as:
+    'vendor' - int8 vendor code (position in 'vendor_names')
+    'devices', 'instruments' - (rows x slots) int8 product codes (PRODUCT_CODES; 0 is an empty slot), sorted within each row
+    'num_d', 'num_i' - uint8 unit counts instead of the 'i_d' strings
+    'cost' - float64 cost
+    'weight' - int64 number of catalog rows the compact row stands for
+Rows that buy the same products from the same vendor at the same cost are merged into one row with their weight. The cost is part of
+the key: V1 discounts depend on the order of the instruments, so orderings of the same instruments can cost different amounts.
+Rows are sorted by vendor, so 'vendor_slices' gives each vendor's rows as in the .csv catalog.
+
+build_weighted_index() and weighted_percentile() answer the data_report percentiles from the weighted rows, and
+histogram_bins.compute_bins(..., weights=...) bins them; both give the same numbers as the full catalog, because every count is a
+running total of the integer weights.
+
+Usage:
+    python compact_catalog.py [--max-units 3]
+
+compares the size of the .csv catalog (or, with --max-units, of the catalog generated for that unit ceiling) with its compact form.
+"""
+
+import argparse
+
+import numpy as np
+
+from cost_index import scenario_code
+from pricing_rules import DEFAULT_CHUNK_ROWS, PRODUCTS, VENDOR_INSTRUMENTS, generate_scenarios, strip_labels
+from scenario_catalog import load_catalog
+
+PRODUCT_CODES = dict([('0', 0)] + [(name, code) for code, name in enumerate(PRODUCTS, start=1)]) # int8 code of every product name
+VENDOR_NAMES = list(VENDOR_INSTRUMENTS)
+
+def encode_slots(slots):
+    # (rows x slots) int8 product codes of catalog slot values, sorted within each row so that every ordering gets the same codes
+    names, inverse = np.unique(strip_labels(slots), return_inverse=True)
+    unknown = [name for name in names if name not in PRODUCT_CODES]
+    if unknown:
+        raise ValueError('no code for product(s) {}'.format(unknown))
+    codes = np.array([PRODUCT_CODES[name] for name in names], dtype=np.int8)[inverse.reshape(np.shape(slots))]
+    return np.sort(codes, axis=1)
+
+def split_codes(codes):
+    # unit counts of the 'i_d' codes ('#instruments_#devices')
+    parts = np.char.partition(np.asarray(codes, dtype=str), '_')
+    return parts[:, 2].astype(np.uint8), parts[:, 0].astype(np.uint8)
+
+def encode_rows(columns, vendor_names=VENDOR_NAMES):
+    # compact rows (one per catalog row, weight 1) of catalog columns
+    instrument_columns = sorted(name for name in columns if name[:1] == 'I' and name[1:].isdigit())
+    device_columns = sorted(name for name in columns if name[:1] == 'D' and name[1:].isdigit())
+    num_d, num_i = split_codes(columns['i_d'])
+    vendor_codes = {name: code for code, name in enumerate(vendor_names)}
+    return {'vendor': np.array([vendor_codes[name] for name in np.asarray(columns['vendor']).tolist()], dtype=np.int8),
+    'devices': encode_slots(np.column_stack([columns[name] for name in device_columns])),
+    'instruments': encode_slots(np.column_stack([columns[name] for name in instrument_columns])),
+    'num_d': num_d,
+    'num_i': num_i,
+    'cost': np.asarray(columns['cost'], dtype=np.float64),
+    'weight': np.ones(len(columns['cost']), dtype=np.int64)}
+
+def dedup(rows):
+    """
+    Merges compact rows with the same vendor, products, unit counts and cost, adding up their weights.
+    Returns the merged rows sorted by vendor, unit counts, products and cost.
+    """
+    width = rows['devices'].shape[1]
+    keys = np.column_stack([rows['vendor'], rows['num_i'], rows['num_d'], rows['devices'], rows['instruments']]).astype(np.float64)
+    keys = np.column_stack([keys, rows['cost']]) # every code is exactly representable as float64, so one key matrix holds them all
+    unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    return {'vendor': unique[:, 0].astype(np.int8),
+    'devices': unique[:, 3:3 + width].astype(np.int8),
+    'instruments': unique[:, 3 + width:3 + 2 * width].astype(np.int8),
+    'num_d': unique[:, 2].astype(np.uint8),
+    'num_i': unique[:, 1].astype(np.uint8),
+    'cost': unique[:, -1],
+    'weight': np.bincount(inverse, weights=rows['weight'], minlength=len(unique)).astype(np.int64)}
+
+def concat_rows(parts):
+    # compact rows of several parts, padding the product slots to the widest part
+    width = max(part['devices'].shape[1] for part in parts)
+    def pad(slots):
+        return np.pad(slots, ((0, 0), (width - slots.shape[1], 0))) # empty slots (0) sort first within a row
+    return {name: np.concatenate([pad(part[name]) if name in ('devices', 'instruments') else part[name] for part in parts]) for name in parts[0]}
+
+def with_vendor_slices(rows, vendor_names=VENDOR_NAMES):
+    # adds 'vendor_names' and 'vendor_slices' ({vendor: (start, stop)}) to deduplicated rows, which are sorted by vendor
+    bounds = np.searchsorted(rows['vendor'], np.arange(len(vendor_names) + 1))
+    rows['vendor_names'] = list(vendor_names)
+    rows['vendor_slices'] = {name: (int(bounds[code]), int(bounds[code + 1])) for code, name in enumerate(vendor_names) if bounds[code + 1] > bounds[code]}
+    return rows
+
+def compact_catalog(catalog=None):
+    # compact, deduplicated form of a scenario catalog (default: the .csv catalog)
+    if catalog is None:
+        catalog = load_catalog()
+    return with_vendor_slices(dedup(encode_rows(catalog['columns'])))
+
+def compact_generated(max_units=3, vendors=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Compact, deduplicated catalog of the scenarios the pricing rules generate for a unit ceiling (see pricing_rules.generate_scenarios).
+    Every chunk is deduplicated as it is generated, so memory follows the number of distinct scenarios, not of orderings.
+    """
+    if vendors is None:
+        vendors = VENDOR_NAMES
+    parts = []
+    for vendor in vendors:
+        for chunk in generate_scenarios(vendor, max_units, chunk_rows):
+            parts.append(dedup(encode_rows(chunk)))
+        parts = [dedup(concat_rows(parts))]
+    return with_vendor_slices(parts[0])
+
+def sorted_weighted_groups(keys, costs, weights):
+    # {key: (sorted costs, running total of their weights)}, computed with a single lexsort
+    order = np.lexsort((costs, keys))
+    sorted_keys = keys[order]
+    starts = np.concatenate(([0], np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1))
+    stops = np.append(starts[1:], len(sorted_keys))
+    return {sorted_keys[start].item(): (costs[order[start:stop]], np.cumsum(weights[order[start:stop]])) for start, stop in zip(starts, stops)}
+
+def build_weighted_index(compact):
+    """
+    input- compact catalog
+    output- dictionary {(vendor or None, i_d or None): (sorted costs, running total of their weights)}, keyed like the cost index
+    """
+    codes = np.char.add(np.char.add(compact['num_i'].astype(str), '_'), compact['num_d'].astype(str))
+    vendors = np.array(compact['vendor_names'])[compact['vendor']]
+    index = {}
+    everything = np.zeros(len(codes), dtype=np.int8)
+    index[(None, None)] = sorted_weighted_groups(everything, compact['cost'], compact['weight'])[0]
+    for code, entry in sorted_weighted_groups(codes, compact['cost'], compact['weight']).items():
+        index[(None, code)] = entry
+    for vendor, entry in sorted_weighted_groups(vendors, compact['cost'], compact['weight']).items():
+        index[(vendor, None)] = entry
+    for key, entry in sorted_weighted_groups(np.char.add(np.char.add(vendors, ' '), codes), compact['cost'], compact['weight']).items():
+        index[tuple(key.split(' '))] = entry
+    return index
+
+def weighted_percentile(entry, score):
+    """
+    cost_index.percentile_weak for weighted costs: the share of scenarios costing less than or equal to score, times 100.
+    entry is (sorted costs, running total of their weights), or None for no scenarios (nan).
+    """
+    score = np.asarray(score, dtype=np.float64)
+    if entry is None or len(entry[0]) == 0 or np.isnan(entry[0][-1]):
+        perct = np.full_like(score, np.nan)
+    else:
+        costs, cumulative = entry
+        totals = np.concatenate(([0], cumulative))
+        perct = totals[np.searchsorted(costs, score, side='right')] * (100.0 / cumulative[-1])
+        perct = np.where(np.isnan(score), np.nan, perct)
+    if perct.ndim == 0:
+        return perct[()]
+    return perct
+
+def weighted_percentiles(index, sum_cost, vendor, num_d, num_i):
+    # report_percentiles from a weighted index
+    code = scenario_code(num_d, num_i)
+    return tuple(weighted_percentile(index.get(key), sum_cost) for key in [(None, None), (vendor, None), (None, code), (vendor, code)])
+
+def weighted_costs(index, vendor=None, num_d=None, num_i=None):
+    # lookup_costs for a weighted index: (sorted costs, weights), empty if no scenario matches
+    entry = index.get((vendor, None if num_d is None else scenario_code(num_d, num_i)))
+    if entry is None:
+        return np.empty(0, dtype=np.float64), np.empty(0, dtype=np.int64)
+    costs, cumulative = entry
+    return costs, np.diff(np.concatenate(([0], cumulative)))
+
+def nbytes(arrays):
+    # memory held by the NumPy arrays of a catalog's columns or a compact catalog
+    return sum(values.nbytes for values in arrays.values() if isinstance(values, np.ndarray))
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the size of the scenario catalog with its compact, deduplicated form.')
+    parser.add_argument('--max-units', type=int, default=None, help='compact the catalog generated for this unit ceiling instead of the .csv catalog')
+    args = parser.parse_args()
+    if args.max_units is None:
+        catalog = load_catalog()
+        rows = len(catalog['columns']['cost'])
+        size = nbytes(catalog['columns'])
+        compact = compact_catalog(catalog)
+    else:
+        rows = sum(len(chunk['cost']) for vendor in VENDOR_NAMES for chunk in generate_scenarios(vendor, args.max_units, with_products=False))
+        size = None
+        compact = compact_generated(args.max_units)
+    print('{} catalog rows -> {} compact rows ({:.1f}x fewer)'.format(rows, len(compact['cost']), rows / len(compact['cost'])))
+    if size is not None:
+        print('{} bytes -> {} bytes ({:.1f}x smaller)'.format(size, nbytes(compact), size / nbytes(compact)))
+
+if __name__ == "__main__":
+    main()
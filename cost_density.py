@@ -0,0 +1,118 @@
+"""
+Smooth cost densities of every vendor and 'i_d' bucket, by binned kernel density estimation with FFT convolution.
+
+Histograms of fixed bin counts (hist_5(..., bins='fixed')) make the vendors' shapes depend on the choice of bins. A Gaussian
+kernel density estimate does not, but evaluated exactly it costs (scenarios x grid points). kde_densities() instead
+- spreads every cost over the two nearest points of one shared, evenly spaced grid (linear binning), with one np.bincount for all
+  groups at once: O(n)
+- convolves each group's binned counts with a Gaussian kernel of its own bandwidth, as a product of Fourier transforms: the binned
+  counts of all groups are transformed in one np.fft.rfft call, and the transform of the Gaussian is known in closed form:
+  O(groups x grid log grid)
+The bandwidth of every group follows Silverman's rule of thumb, 0.9 * min(std, IQR / 1.34) * n^(-1/5), and is never narrower than
+one grid step. Every density integrates to 1 over the grid, so groups of different sizes compare directly; multiply by the number
+of scenarios (see 'counts') for expected scenarios per USD.
+
+index_densities() estimates the densities of every level of a cost index (see cost_index.py) at once; hist_5 draws the vendor
+densities (vendor_densities) by default.
+
+Usage:
+    python cost_density.py densities.csv [--level vendor|i_d|vendor_i_d] [--grid 512]
+
+writes one row per group and grid point: vendor, i_d, cost, density.
+"""
+
+import argparse
+
+import numpy as np
+
+from cost_index import get_cost_index
+from scenario_catalog import load_catalog
+
+DEFAULT_GRID_SIZE = 512
+TAIL_BANDWIDTHS = 3.0 # the grid extends this many of the widest bandwidths below the cheapest and above the dearest scenario
+
+def silverman_bandwidth(sorted_costs):
+    # Silverman's rule of thumb for the Gaussian kernel bandwidth of sorted costs (0 for fewer than two distinct costs)
+    n = len(sorted_costs)
+    if n < 2:
+        return 0.0
+    std = np.std(sorted_costs, ddof=1)
+    iqr = np.quantile(sorted_costs, 0.75) - np.quantile(sorted_costs, 0.25)
+    spread = min(std, iqr / 1.34) if iqr > 0 else std
+    return 0.9 * spread * n ** -0.2
+
+def linear_binning(costs, groups, num_groups, grid_start, step, grid_size):
+    # (groups x grid) counts: every cost split between its two nearest grid points, in proportion to its distance to each
+    position = (costs - grid_start) / step
+    left = np.clip(np.floor(position).astype(np.int64), 0, grid_size - 2)
+    right_share = np.clip(position - left, 0.0, 1.0)
+    cells = groups * grid_size + left
+    binned = np.bincount(cells, weights=1.0 - right_share, minlength=num_groups * grid_size)
+    binned += np.bincount(cells + 1, weights=right_share, minlength=num_groups * grid_size)
+    return binned.reshape(num_groups, grid_size)
+
+def kde_densities(groups, grid_size=DEFAULT_GRID_SIZE, bandwidths=None):
+    """
+    input- {key: sorted costs} of every group, number of grid points and optional {key: bandwidth in USD} (default: Silverman)
+    output- dictionary with
+        'grid' - np.ndarray of the grid costs, shared by every group
+        'densities' - {key: np.ndarray density at every grid point (1/USD), integrating to 1}; groups without costs are left out
+        'bandwidths' - {key: bandwidth used, in USD}
+        'counts' - {key: number of scenarios}
+    """
+    groups = {key: np.asarray(costs, dtype=np.float64) for key, costs in groups.items() if len(costs)}
+    keys = list(groups)
+    if bandwidths is None:
+        bandwidths = {key: silverman_bandwidth(groups[key]) for key in keys}
+    widths = np.array([bandwidths[key] for key in keys], dtype=np.float64)
+    low = min(costs[0] for costs in groups.values())
+    high = max(costs[-1] for costs in groups.values())
+    span = high - low if high > low else max(abs(high), 1.0)
+    margin = TAIL_BANDWIDTHS * max(widths.max(), span / grid_size)
+    grid = np.linspace(low - margin, high + margin, grid_size)
+    step = grid[1] - grid[0]
+    widths = np.maximum(widths, step) # a single cost (or a group of equal costs) becomes a peak one grid step wide
+    lengths = [len(groups[key]) for key in keys]
+    binned = linear_binning(np.concatenate([groups[key] for key in keys]), np.repeat(np.arange(len(keys)), lengths), len(keys), grid[0], step, grid_size)
+    padded = 2 * grid_size # zero padding: the kernel does not wrap around the ends of the grid
+    frequencies = np.fft.rfftfreq(padded) # cycles per grid step
+    kernels = np.exp(-0.5 * (2 * np.pi * frequencies[None, :] * (widths[:, None] / step)) ** 2) # Fourier transform of the Gaussian
+    smoothed = np.fft.irfft(np.fft.rfft(binned, padded, axis=1) * kernels, padded, axis=1)[:, :grid_size]
+    smoothed = np.clip(smoothed, 0.0, None) # round-off of the transforms can leave tiny negative values
+    densities = smoothed / (smoothed.sum(axis=1, keepdims=True) * step)
+    return {'grid': grid,
+    'densities': {key: densities[row] for row, key in enumerate(keys)},
+    'bandwidths': {key: float(widths[row]) for row, key in enumerate(keys)},
+    'counts': dict(zip(keys, lengths))}
+
+def index_densities(index, level='vendor_i_d', grid_size=DEFAULT_GRID_SIZE):
+    """
+    Densities of every group of one level of a cost index:
+        'all' - (None, None); 'vendor' - (vendor, None); 'i_d' - (None, i_d); 'vendor_i_d' - (vendor, i_d)
+    All groups of the level share one grid and are estimated together (see kde_densities).
+    """
+    selected = {'all': lambda vendor, code: vendor is None and code is None,
+    'vendor': lambda vendor, code: vendor is not None and code is None,
+    'i_d': lambda vendor, code: vendor is None and code is not None,
+    'vendor_i_d': lambda vendor, code: vendor is not None and code is not None}[level]
+    return kde_densities({key: costs for key, costs in index.items() if selected(*key)}, grid_size)
+
+def vendor_densities(vendor_costs, grid_size=DEFAULT_GRID_SIZE):
+    # kde_densities of {vendor: costs} (sorted here, so any cost lists may be passed)
+    return kde_densities({vendor: np.sort(np.asarray(costs, dtype=np.float64)) for vendor, costs in vendor_costs.items()}, grid_size)
+
+def main():
+    parser = argparse.ArgumentParser(description='Estimate smooth cost densities of every vendor and unit-count bucket and export them.')
+    parser.add_argument('out', help='.csv or .json file to write the densities to')
+    parser.add_argument('--level', default='vendor_i_d', choices=['all', 'vendor', 'i_d', 'vendor_i_d'], help='groups to estimate (default: every vendor and i_d bucket)')
+    parser.add_argument('--grid', type=int, default=DEFAULT_GRID_SIZE, help='number of grid points (default {})'.format(DEFAULT_GRID_SIZE))
+    args = parser.parse_args()
+    import pandas as pd
+    from batch_scoring import write_results
+    result = index_densities(get_cost_index(load_catalog()), args.level, args.grid)
+    frames = [pd.DataFrame({'vendor': vendor, 'i_d': code, 'cost': result['grid'], 'density': density}) for (vendor, code), density in result['densities'].items()]
+    write_results(pd.concat(frames, ignore_index=True), args.out)
+    print('Wrote the densities of {} groups on {} grid points into {}'.format(len(frames), args.grid, args.out))
+
+if __name__ == "__main__":
+    main()
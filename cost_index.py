@@ -0,0 +1,113 @@
+"""
+Sorted-cost index over the scenario catalog.
+
+build_cost_index() sorts the scenario costs once per catalog and keeps one sorted NumPy array for every level that data_report asks about:
+    (None, None) - all vendors, all scenarios
+    (vendor, None) - all scenarios of one vendor
+    (None, i_d) - all vendors, given the 'i_d' code of num_i instruments and num_d devices
+    (vendor, i_d) - one vendor, given the 'i_d' code
+A percentile is then a single binary search (np.searchsorted) instead of a full pass over the costs.
+"""
+
+import numpy as np
+
+def scenario_code(num_d, num_i):
+    # 'i_d' code used by the vendor .csv files: '#instruments_#devices'
+    return str(num_i) + "_" + str(num_d)
+
+def sorted_groups(keys, costs):
+    # {key: sorted costs of the rows with that key}, computed with a single lexsort
+    order = np.lexsort((costs, keys))
+    sorted_keys = keys[order]
+    sorted_costs = costs[order]
+    starts = np.concatenate(([0], np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1))
+    stops = np.append(starts[1:], len(sorted_keys))
+    return {sorted_keys[start].item(): sorted_costs[start:stop] for start, stop in zip(starts, stops)}
+
+def build_cost_index(catalog, cost_column='cost'):
+    """
+    input- scenario catalog (see scenario_catalog.load_catalog) and the name of the cost column to index
+    output- dictionary {(vendor or None, i_d or None): sorted np.ndarray of costs}
+    """
+    columns = catalog['columns']
+    costs = np.asarray(columns[cost_column], dtype=np.float64)
+    codes = columns['i_d']
+    index = {(None, None): np.sort(costs)}
+    for code, code_costs in sorted_groups(codes, costs).items():
+        index[(None, code)] = code_costs
+    for vendor, (start, stop) in catalog['vendor_slices'].items():
+        index[(vendor, None)] = np.sort(costs[start:stop])
+        for code, code_costs in sorted_groups(codes[start:stop], costs[start:stop]).items():
+            index[(vendor, code)] = code_costs
+    return index
+
+def get_cost_index(catalog, cost_column='cost'):
+    # the index is built once per catalog and kept alongside it, so repeated scenarios reuse the same sorted arrays
+    indexes = catalog.setdefault('cost_indexes', {})
+    if cost_column not in indexes:
+        indexes[cost_column] = build_cost_index(catalog, cost_column)
+    return indexes[cost_column]
+
+def lookup_costs(index, vendor=None, num_d=None, num_i=None):
+    """
+    input- cost index, optional vendor and optional number of devices/instruments (both or neither)
+    output- sorted np.ndarray of the matching scenario costs (empty if no scenario matches)
+    """
+    code = None if num_d is None else scenario_code(num_d, num_i)
+    return index.get((vendor, code), np.empty(0, dtype=np.float64))
+
+def percentile_weak(sorted_costs, score):
+    """
+    Percentile of score within sorted_costs, identical to scipy.stats.percentileofscore(sorted_costs, score, kind='weak'):
+    the share of costs that are less than or equal to score, times 100. score may be a single value or an array of values.
+    """
+    score = np.asarray(score, dtype=np.float64)
+    n = len(sorted_costs)
+    if n == 0 or np.isnan(sorted_costs[-1]): # empty or containing nan (sorted last) - scipy returns nan
+        perct = np.full_like(score, np.nan)
+    else:
+        perct = np.searchsorted(sorted_costs, score, side='right') * (100.0 / n)
+        perct = np.where(np.isnan(score), np.nan, perct)
+    if perct.ndim == 0:
+        return perct[()]
+    return perct
+
+def report_percentiles(index, sum_cost, vendor, num_d, num_i):
+    """
+    Returns the four data_report percentiles of sum_cost:
+        (float) percentile1 - relative to all scenarios
+        (float) percentile2 - relative to all scenarios of vendor
+        (float) percentile3 - relative to all scenarios with num_d devices and num_i instruments
+        (float) percentile4 - relative to all scenarios of vendor with num_d devices and num_i instruments
+    """
+    percentile1 = percentile_weak(lookup_costs(index), sum_cost)
+    percentile2 = percentile_weak(lookup_costs(index, vendor), sum_cost)
+    percentile3 = percentile_weak(lookup_costs(index, None, num_d, num_i), sum_cost)
+    percentile4 = percentile_weak(lookup_costs(index, vendor, num_d, num_i), sum_cost)
+    return percentile1, percentile2, percentile3, percentile4
+
+def batch_percentiles(index, costs, vendors, codes):
+    """
+    report_percentiles for many scenarios at once: every scenario is looked up at the four levels of the index, and the scenarios
+    that share a level key are answered together with one vectorized np.searchsorted.
+
+    input- cost index, and one cost, vendor and 'i_d' code per scenario
+    output- np.ndarray of shape (number of scenarios, 4) holding percentile1 to percentile4 of every scenario
+    """
+    costs = np.asarray(costs, dtype=np.float64)
+    vendors = np.asarray(vendors)
+    codes = np.asarray(codes)
+    percentiles = np.empty((len(costs), 4), dtype=np.float64)
+    percentiles[:, 0] = percentile_weak(lookup_costs(index), costs)
+    levels = [(1, vendors, lambda key: (key, None)),
+    (2, codes, lambda key: (None, key)),
+    (3, np.char.add(np.char.add(vendors.astype(str), ' '), codes.astype(str)), lambda key: tuple(key.split(' ')))]
+    for column, keys, index_key in levels:
+        groups, inverse = np.unique(keys, return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.searchsorted(inverse[order], np.arange(len(groups) + 1))
+        for group, start, stop in zip(groups, bounds[:-1], bounds[1:]):
+            rows = order[start:stop]
+            sorted_costs = index.get(index_key(str(group)), np.empty(0, dtype=np.float64))
+            percentiles[rows, column] = percentile_weak(sorted_costs, costs[rows])
+    return percentiles
@@ -0,0 +1,159 @@
+"""
+Exact scenario cost distributions by convolution, without enumerating the scenarios.
+
+pricing_rules.generate_scenarios() lists every ordered scenario, and their number grows exponentially with the unit ceiling. But the
+cost of a scenario is a sum over its slots, so the distribution of the costs of all scenarios in a (vendor, devices, instruments)
+bucket is a convolution of per-slot distributions:
+- V2, V3, V4: num_d device slots that each hold any of the vendor's devices, convolved with num_i copies of the vendor's instrument
+- V1: the 1st instrument at list price, the 2nd at its discount1 price and every later one at its discount2 price, each with its
+  bundled device (V1_BUNDLES); V1 buys one device per instrument
+- the empty slots may sit anywhere among the max_units slots of each category, which multiplies every bucket by C(max_units, num_d)
+  and C(max_units, num_i), as in the generated catalog
+A distribution is a sparse dictionary {cost: number of scenarios}. Costs are kept as integer multiples of 1/TICKS_PER_USD USD, so equal
+costs always land on the same key, and counts are Python integers, which do not overflow however many scenarios there are.
+
+build_distributions() keys the distributions like the cost index (see cost_index.py), and exact_percentiles() answers the four
+data_report percentiles from them. Fleets of 20-50 units per category take seconds, where enumeration would take 3^50 rows.
+
+Usage:
+    python exact_distribution.py V2 --num-d 20 --num-i 30 --cost 12500000 [--max-units 50]
+"""
+
+import argparse
+from math import comb
+
+import numpy as np
+
+from cost_index import scenario_code
+from pricing_rules import PRODUCT2COST, V1_BUNDLES, VENDOR_DEVICES, VENDOR_INSTRUMENTS, discount_tables
+
+TICKS_PER_USD = 10 ** 5 # discounted V1 prices have up to 5 decimals
+
+def to_ticks(cost):
+    # cost in USD as an integer number of ticks
+    return int(round(cost * TICKS_PER_USD))
+
+def slot_distribution(prices):
+    # {cost in ticks: number of choices} of one slot that holds any of the given prices
+    distribution = {}
+    for price in prices:
+        ticks = to_ticks(price)
+        distribution[ticks] = distribution.get(ticks, 0) + 1
+    return distribution
+
+def convolve(first, second):
+    # distribution of the sum of two independent costs
+    result = {}
+    for cost1, count1 in first.items():
+        for cost2, count2 in second.items():
+            result[cost1 + cost2] = result.get(cost1 + cost2, 0) + count1 * count2
+    return result
+
+def scale(distribution, factor):
+    return {cost: count * factor for cost, count in distribution.items()}
+
+def vendor_buckets(vendor, max_units=3, product2cost=None, discount1_rates=None, discount2_rates=None):
+    """
+    Returns {i_d code: distribution} of every (num_d, num_i) bucket of vendor up to max_units units of each category.
+    """
+    product2cost = PRODUCT2COST if product2cost is None else product2cost
+    buckets = {}
+    if vendor == 'V1':
+        discount1, discount2 = discount_tables(product2cost, discount1_rates, discount2_rates)
+        instruments = VENDOR_INSTRUMENTS[vendor]
+        # each slot costs its instrument at the price of its rank plus the bundled device
+        ranks = [slot_distribution([table[name] + product2cost[V1_BUNDLES[name]] for name in instruments]) for table in [product2cost, discount1, discount2]]
+        distribution = {0: 1}
+        for num_i in range(max_units + 1):
+            if num_i > 0:
+                distribution = convolve(distribution, ranks[min(num_i - 1, 2)])
+            buckets[scenario_code(num_i, num_i)] = scale(distribution, comb(max_units, num_i))
+        return buckets
+    device_slot = slot_distribution([product2cost[name] for name in VENDOR_DEVICES[vendor]])
+    instrument_slot = slot_distribution([product2cost[name] for name in VENDOR_INSTRUMENTS[vendor]])
+    devices = {0: 1}
+    device_sums = []
+    for num_d in range(max_units + 1):
+        if num_d > 0:
+            devices = convolve(devices, device_slot)
+        device_sums.append(scale(devices, comb(max_units, num_d)))
+    instruments = {0: 1}
+    for num_i in range(max_units + 1):
+        if num_i > 0:
+            instruments = convolve(instruments, instrument_slot)
+        placed = scale(instruments, comb(max_units, num_i))
+        for num_d in range(max_units + 1):
+            buckets[scenario_code(num_d, num_i)] = convolve(device_sums[num_d], placed)
+    return buckets
+
+def merge(distributions):
+    # distribution of the union of several sets of scenarios
+    result = {}
+    for distribution in distributions:
+        for cost, count in distribution.items():
+            result[cost] = result.get(cost, 0) + count
+    return result
+
+def cumulative_entry(distribution):
+    # (sorted costs in ticks as np.ndarray, running number of scenarios as a list of Python integers)
+    costs = sorted(distribution)
+    cumulative = []
+    total = 0
+    for cost in costs:
+        total += distribution[cost]
+        cumulative.append(total)
+    return np.array(costs, dtype=np.int64), cumulative
+
+def build_distributions(max_units=3, vendors=None, product2cost=None, discount1_rates=None, discount2_rates=None):
+    """
+    input- unit ceiling per category, vendors (default all) and optional prices and V1 discount rates
+    output- dictionary {(vendor or None, i_d or None): (sorted costs in ticks, running number of scenarios)}, keyed like the cost index
+    """
+    if vendors is None:
+        vendors = list(VENDOR_INSTRUMENTS)
+    by_vendor = {vendor: vendor_buckets(vendor, max_units, product2cost, discount1_rates, discount2_rates) for vendor in vendors}
+    codes = sorted(set(code for buckets in by_vendor.values() for code in buckets))
+    index = {(None, None): cumulative_entry(merge(distribution for buckets in by_vendor.values() for distribution in buckets.values()))}
+    for code in codes:
+        index[(None, code)] = cumulative_entry(merge(buckets[code] for buckets in by_vendor.values() if code in buckets))
+    for vendor, buckets in by_vendor.items():
+        index[(vendor, None)] = cumulative_entry(merge(buckets.values()))
+        for code, distribution in buckets.items():
+            index[(vendor, code)] = cumulative_entry(distribution)
+    return index
+
+def exact_percentile(entry, score):
+    # cost_index.percentile_weak against an exact distribution: share of scenarios costing at most score, times 100 (nan without scenarios)
+    if entry is None or len(entry[0]) == 0 or np.isnan(score):
+        return np.nan
+    costs, cumulative = entry
+    position = int(np.searchsorted(costs, to_ticks(score), side='right'))
+    count = cumulative[position - 1] if position else 0
+    return count * (100.0 / cumulative[-1])
+
+def exact_percentiles(index, sum_cost, vendor, num_d, num_i):
+    # report_percentiles from exact distributions
+    code = scenario_code(num_d, num_i)
+    return tuple(exact_percentile(index.get(key), sum_cost) for key in [(None, None), (vendor, None), (None, code), (vendor, code)])
+
+def scenario_count(index, vendor=None, num_d=None, num_i=None):
+    # number of scenarios at one level of the index
+    entry = index.get((vendor, None if num_d is None else scenario_code(num_d, num_i)))
+    return 0 if entry is None else entry[1][-1]
+
+def main():
+    parser = argparse.ArgumentParser(description='Percentiles of a cost against the exact distribution of all scenarios, for large unit ceilings.')
+    parser.add_argument('vendor', choices=list(VENDOR_INSTRUMENTS))
+    parser.add_argument('--num-d', type=int, required=True)
+    parser.add_argument('--num-i', type=int, required=True)
+    parser.add_argument('--cost', type=float, required=True)
+    parser.add_argument('--max-units', type=int, default=None, help='unit ceiling per category (default: the larger of --num-d and --num-i, at least 3)')
+    args = parser.parse_args()
+    max_units = args.max_units or max(3, args.num_d, args.num_i)
+    index = build_distributions(max_units)
+    percentiles = exact_percentiles(index, args.cost, args.vendor, args.num_d, args.num_i)
+    print('{} scenarios in total, {} for {} with {} device(s) and {} instrument(s)'.format(scenario_count(index), scenario_count(index, args.vendor, args.num_d, args.num_i), args.vendor, args.num_d, args.num_i))
+    print('percentiles: {}'.format([None if np.isnan(percentile) else round(percentile, 4) for percentile in percentiles]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Plot-free core of the expense forecast: pricing (user_input_cost), the num_d/num_i filters and the percentiles of data_report.
+
+This module only needs NumPy. It does not import pandas, scipy or matplotlib, so scripts that only need numbers start quickly;
+RFI_Expense_Forecast.py re-exports these functions and loads matplotlib only when a histogram is drawn.
+pandas is only loaded when a vendor .csv has to be parsed, i.e. when the on-disk catalog cache is missing or out of date.
+
+Usage:
+    python forecast_core.py V2 --devices Device_C,Device_D --instruments Instrument_D [--rank-by npv]
+
+prints the cost and the four data_report percentiles of the scenario as one line of JSON.
+"""
+
+import argparse
+import json
+
+import numpy as np
+
+from cost_index import get_cost_index, lookup_costs, percentile_weak, scenario_code
+from pricing_rules import PRODUCT2COST, V1_BUNDLES, VENDOR_DEVICES, VENDOR_INSTRUMENTS, discount_tables
+from scenario_catalog import load_catalog
+from stage_profiler import stage
+
+def user_input_cost(D1, D2, D3, I1, I2, I3, vendor):
+    """
+    Assigns a forecast-expense value for each product purchase variable and calculates the total forecasted expense.
+    Include V1 bundling discounts where applicable 
+    """   
+    product2cost = PRODUCT2COST # the value for each key corresponds to each product's acquisition cost in USD
+    discount1, discount2 = discount_tables() # the discounted values of V1 I2 and I3 instruments
+
+    Cost_D1 = product2cost.get(D1)
+    Cost_D2 = product2cost.get(D2)
+    Cost_D3 = product2cost.get(D3)
+    Cost_I1 = product2cost.get(I1)
+    if vendor == 'V1':
+        if I3 == '0': # if I3 = 0, then I2 = 0, Instrument_A, Instrument_B, or Instrument_C. The costs corresponding to each value of I2 should be discounted.
+            Cost_I2 = discount1.get(I2)
+            Cost_I3 = 0
+        else: # if vendor = V1 and I3 != 0, then neither I1 = 0, I2 = 0, nor I3 = 0, meaning I2 and I3 acquisition costs are discounted  
+            Cost_I2 = discount1.get(I2)
+            Cost_I3 = discount2.get(I3)
+    else:
+        Cost_I2 = product2cost.get(I2)
+        Cost_I3 = product2cost.get(I3)
+    sum_cost = Cost_D1 + Cost_D2 + Cost_D3 + Cost_I1 + Cost_I2 + Cost_I3
+    return sum_cost
+
+def filter_cost_list(code_list, cost_list, num_d, num_i): 
+    match = np.asarray(code_list) == scenario_code(num_d, num_i) # boolean mask of the scenarios that match user-input values of num_i and num_d
+    filtered_cost_list = np.asarray(cost_list)[match].tolist()
+    return filtered_cost_list
+
+def filter_vendor_cost_list(code_vendor, cost_vendor, num_d, num_i): 
+    match = np.asarray(code_vendor) == scenario_code(num_d, num_i) # boolean mask of the vendor scenarios that match user-input values of num_i and num_d
+    filtered_vendor_cost_list = np.asarray(cost_vendor)[match].tolist()
+    return filtered_vendor_cost_list
+
+def get_sorted_costs(vendor, num_d, num_i, rank_by='cost'):
+    """
+    Looks up the sorted cost arrays of the shared cost index instead of building and filtering lists.
+    With rank_by='npv' the arrays hold the net present value of each scenario's 5-year cash flows (see cash_flow.py) instead of its sticker cost.
+
+    Returns:
+        (np.ndarray) cost_vendor - sorted costs of all scenarios, given vendor selection
+        (np.ndarray) cost_v1, cost_v2, cost_v3, cost_v4 - sorted costs of all scenarios for each vendor
+        (np.ndarray) cost_list - sorted costs of all scenarios
+        (np.ndarray) filtered_cost_list - sorted costs of all scenarios, given num_d and num_i
+        (np.ndarray) filtered_vendor_cost_list - sorted costs of all scenarios, given vendor selection, num_d and num_i
+    """
+    with stage('load_catalog'):
+        catalog = load_catalog()
+    with stage('get_cost_index'):
+        if rank_by == 'npv' and 'npv' not in catalog['columns']:
+            from cash_flow import add_cash_flow_columns # only NPV ranking needs the cash flow engine (and pandas)
+            add_cash_flow_columns(catalog)
+        cost_index = get_cost_index(catalog, rank_by)
+    cost_vendor = lookup_costs(cost_index, vendor)
+    cost_v1, cost_v2, cost_v3, cost_v4 = [lookup_costs(cost_index, name) for name in ['V1', 'V2', 'V3', 'V4']]
+    cost_list = lookup_costs(cost_index)
+    filtered_cost_list = lookup_costs(cost_index, None, num_d, num_i)
+    filtered_vendor_cost_list = lookup_costs(cost_index, vendor, num_d, num_i)
+    return cost_vendor, cost_v1, cost_v2, cost_v3, cost_v4, cost_list, filtered_cost_list, filtered_vendor_cost_list
+
+def scenario_percentiles(sum_cost, vendor, num_d, num_i, rank_by='cost'):
+    """
+    The four data_report percentiles of sum_cost, without printing the report.
+
+    Returns:
+        (list) percentiles - percentile1 to percentile4 as whole numbers (None where no scenario is comparable)
+    """
+    cost_vendor, cost_v1, cost_v2, cost_v3, cost_v4, cost_list, filtered_cost_list, filtered_vendor_cost_list = get_sorted_costs(vendor, num_d, num_i, rank_by)
+    percentiles = [percentile_weak(costs, sum_cost) for costs in [cost_list, cost_vendor, filtered_cost_list, filtered_vendor_cost_list]]
+    return [None if np.isnan(percentile) else int(percentile) for percentile in percentiles]
+
+def slots(names):
+    # three user_input_cost slots from a list of up to three product names, padded with '0'
+    if len(names) > 3:
+        raise ValueError('user_input_cost prices at most 3 devices and 3 instruments')
+    return names + ['0'] * (3 - len(names))
+
+def scenario_products(vendor, devices, instruments):
+    """
+    input- vendor and lists of device and instrument names (V1 devices follow the instrument bundles, so the given ones are ignored)
+    output- (devices, instruments) of the scenario
+    Raises ValueError for an unknown vendor or a product the vendor does not offer.
+    """
+    if vendor not in VENDOR_INSTRUMENTS:
+        raise ValueError('unknown vendor {}'.format(vendor))
+    if vendor == 'V1':
+        devices = [V1_BUNDLES[name] for name in instruments if name in V1_BUNDLES]
+    unknown = [name for name in devices if name not in VENDOR_DEVICES[vendor]] + [name for name in instruments if name not in VENDOR_INSTRUMENTS[vendor]]
+    if unknown:
+        raise ValueError('product not offered by {}: {}'.format(vendor, ', '.join(unknown)))
+    return devices, instruments
+
+def parse_scenario(parser, vendor, devices, instruments):
+    # (devices, instruments) of the comma-separated --devices and --instruments options; parser.error if the scenario cannot be priced
+    split = lambda value: [name.strip() for name in value.split(',') if name.strip()]
+    try:
+        return scenario_products(vendor, split(devices), split(instruments))
+    except ValueError as error:
+        parser.error(str(error))
+
+def main():
+    parser = argparse.ArgumentParser(description='Print the cost and percentiles of one procurement scenario, without plotting.')
+    parser.add_argument('vendor', choices=['V1', 'V2', 'V3', 'V4'])
+    parser.add_argument('--devices', default='', help='comma-separated devices (ignored for V1, whose devices follow the instrument bundles)')
+    parser.add_argument('--instruments', default='', help='comma-separated instruments')
+    parser.add_argument('--rank-by', default='cost', choices=['cost', 'npv'], help='compare scenarios by sticker cost (default) or by 5-year NPV')
+    args = parser.parse_args()
+    devices, instruments = parse_scenario(parser, args.vendor, args.devices, args.instruments)
+    D1, D2, D3 = slots(devices)
+    I1, I2, I3 = slots(instruments)
+    sum_cost = user_input_cost(D1, D2, D3, I1, I2, I3, args.vendor)
+    if args.rank_by == 'npv':
+        from cash_flow import scenario_npv
+        sum_cost = round(scenario_npv(D1, D2, D3, I1, I2, I3, args.vendor, sum_cost), 2)
+    percentiles = scenario_percentiles(sum_cost, args.vendor, len(devices), len(instruments), args.rank_by)
+    print(json.dumps({'vendor': args.vendor, 'devices': devices, 'instruments': instruments, 'cost': sum_cost, 'percentiles': percentiles}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Histogram binning engine shared by hist_1 through hist_4.
+
+compute_bins() reproduces the binning of the original histograms - Scott's rule for the number of bins, one highlighted bin
+that contains the user-input cost, and bins of the same width below and above it - but computes every edge and every count
+in a single pass: the costs are sorted once and each bin count is the difference of two np.searchsorted positions.
+The result is a plain dictionary, so it can be plotted (see plot_bins in RFI_Expense_Forecast.py) or used as numeric data.
+"""
+
+import math
+
+import numpy as np
+
+MIN_BINS = 5
+
+def weighted_std(sorted_costs, weights):
+    # sample standard deviation (ddof=1) of costs that each stand for weights scenarios
+    num_samples = weights.sum()
+    mean = (weights @ sorted_costs) / num_samples
+    return np.sqrt((weights @ (sorted_costs - mean) ** 2) / (num_samples - 1))
+
+def scott_num_bins(sorted_costs, weights=None):
+    # Scott 1979 rule of thumb for number of bins, never fewer than MIN_BINS
+    num_samples = len(sorted_costs) if weights is None else int(weights.sum())
+    span = sorted_costs[-1] - sorted_costs[0]
+    if num_samples <= 1:
+        std = 0.0
+    elif weights is None:
+        std = np.std(sorted_costs, ddof=1)
+    else:
+        std = weighted_std(sorted_costs, weights)
+    if span == 0 or not std > 0:
+        return MIN_BINS
+    return max(int(span * (num_samples ** (1/3)) / std / 3.49), MIN_BINS)
+
+def count_bins(sorted_costs, edges, cumulative=None):
+    # number of costs in each bin (edges[k], edges[k+1]]; the first bin also holds costs equal to edges[0]
+    # with cumulative (running total of the weights of sorted_costs) each cost counts for its weight
+    positions = np.searchsorted(sorted_costs, edges, side='right')
+    first = np.searchsorted(sorted_costs, edges[0], side='left')
+    if cumulative is not None:
+        totals = np.concatenate(([0], cumulative))
+        positions = totals[positions]
+        first = totals[first]
+    counts = np.diff(positions)
+    if len(counts):
+        counts[0] += positions[0] - first
+    return counts
+
+def weighted_median(sorted_costs, cumulative):
+    # np.median of the costs repeated by their weights, without repeating them
+    num_samples = cumulative[-1]
+    lower = sorted_costs[np.searchsorted(cumulative, (num_samples - 1) // 2, side='right')]
+    upper = sorted_costs[np.searchsorted(cumulative, num_samples // 2, side='right')]
+    return np.mean([lower, upper])
+
+def compute_bins(costs, sum_cost, is_sorted=False, weights=None):
+    """
+    input- costs of the distribution to plot, the user-input cost, whether costs are already sorted in ascending order,
+           and optionally the number of scenarios each cost stands for (see compact_catalog.py); the bins are then those of
+           the costs repeated by their weights
+    output- None if there are no costs (no scenario to compare with), otherwise a dictionary with
+        'edges' - np.ndarray of all bin edges, lowest first
+        'counts' - np.ndarray of the number of costs in each bin
+        'highlight' - position of the bin containing sum_cost in 'counts'
+        'lower_bound', 'upper_bound' - edges of the highlighted bin
+        'bin_size', 'num_bins' - bin width and Scott's-rule bin count
+        'min', 'max', 'median' - of the costs
+        'highlight_count', 'max_count' - count of the highlighted bin and of the fullest bin
+        'label_x', 'label_y' - position of the text label next to the highlighted bin
+    """
+    sorted_costs = np.asarray(costs, dtype=np.float64)
+    if weights is not None:
+        weights = np.asarray(weights, dtype=np.int64)
+    if not is_sorted:
+        order = np.argsort(sorted_costs, kind='stable')
+        sorted_costs = sorted_costs[order]
+        if weights is not None:
+            weights = weights[order]
+    if len(sorted_costs) == 0:
+        return None
+    cumulative = None if weights is None else np.cumsum(weights)
+    cost_min = sorted_costs[0]
+    cost_max = sorted_costs[-1]
+    span = cost_max - cost_min
+    num_bins = scott_num_bins(sorted_costs, weights)
+    bin_size = span / num_bins if span > 0 else 1.0
+    if sum_cost == cost_max:
+        lower_bound_bin = sum_cost - bin_size
+        upper_bound_bin = sum_cost
+    elif sum_cost == cost_min:
+        lower_bound_bin = sum_cost
+        upper_bound_bin = sum_cost + bin_size
+    else:
+        lower_bound_bin = (math.trunc((sum_cost - cost_min) / bin_size) * bin_size) + cost_min
+        upper_bound_bin = lower_bound_bin + bin_size
+    lower_edges = np.empty(0)
+    upper_edges = np.empty(0)
+    if sum_cost >= cost_min + bin_size:
+        num_bins_lower = round((lower_bound_bin - cost_min) / bin_size)
+        lower_edges = cost_min + bin_size * np.arange(num_bins_lower) # the last lower edge is lower_bound_bin itself
+    if sum_cost <= cost_max - bin_size:
+        num_bins_upper = round((cost_max - upper_bound_bin) / bin_size)
+        upper_edges = upper_bound_bin + bin_size * np.arange(1, num_bins_upper + 1)
+    edges = np.concatenate((lower_edges, [lower_bound_bin, upper_bound_bin], upper_edges))
+    edges[-1] = max(edges[-1], cost_max) # repeated bin_size steps can end a rounding error short of the highest cost
+    counts = count_bins(sorted_costs, edges, cumulative)
+    highlight = len(lower_edges)
+    median = np.median(sorted_costs) if weights is None else weighted_median(sorted_costs, cumulative)
+    return {'edges': edges,
+    'counts': counts,
+    'highlight': highlight,
+    'lower_bound': lower_bound_bin,
+    'upper_bound': upper_bound_bin,
+    'bin_size': bin_size,
+    'num_bins': num_bins,
+    'min': cost_min,
+    'max': cost_max,
+    'median': median,
+    'highlight_count': int(counts[highlight]),
+    'max_count': int(counts.max()),
+    'label_x': sum_cost - (bin_size * 2) if sum_cost < median else sum_cost,
+    'label_y': counts[highlight] * 1.1}
@@ -0,0 +1,144 @@
+"""
+Nearest-cost alternatives to a scenario: what else could be bought for roughly the same money.
+
+The cost index (see cost_index.py) keeps sorted costs only. sorted_rows() keeps, once per catalog, the catalog rows in the same
+order for every (vendor, None) and (None, i_d) level, so a sorted position leads straight back to the scenario's products.
+- nearest_scenarios() binary-searches the user's cost in each other vendor's sorted rows and walks outward from that position,
+  always taking the closer of the two neighbours, until it has k scenarios; the per-vendor candidates are then merged.
+  This costs O(log n + k) per vendor, whatever the size of the catalog.
+- cheapest_scenarios() walks the (None, i_d) level from its start: the cheapest scenarios of any vendor with the same numbers of
+  devices and instruments.
+The catalog lists every ordering of the same products as its own row, so both lists skip rows that buy the same products from the
+same vendor as a row already listed (the walk only takes as many extra steps as there are orderings of the listed scenarios).
+
+print_alternatives() prints both lists after data_report.
+
+Usage:
+    python nearest_alternatives.py V2 --devices Device_C,Device_D --instruments Instrument_D [-k 5]
+"""
+
+import argparse
+
+import numpy as np
+
+from cost_index import scenario_code
+from forecast_core import parse_scenario, slots, user_input_cost
+from pricing_rules import strip_labels
+from scenario_catalog import PRODUCT_COLUMNS, load_catalog
+
+DEFAULT_K = 5
+
+def sorted_rows(catalog, cost_column='cost'):
+    """
+    Returns {(vendor, None) or (None, i_d): np.ndarray of catalog rows sorted by cost}, built once per catalog and cost column
+    and kept alongside the catalog (catalog['sorted_rows']). The 'npv' column is added to the catalog first if it is missing, as when
+    the report of the scenario came from the report cache.
+    """
+    cache = catalog.setdefault('sorted_rows', {})
+    if cost_column not in cache:
+        if cost_column == 'npv' and 'npv' not in catalog['columns']:
+            from cash_flow import add_cash_flow_columns # only NPV ranking needs the cash flow engine (and pandas)
+            add_cash_flow_columns(catalog)
+        costs = np.asarray(catalog['columns'][cost_column], dtype=np.float64)
+        codes = catalog['columns']['i_d']
+        levels = {}
+        for vendor, (start, stop) in catalog['vendor_slices'].items():
+            levels[(vendor, None)] = start + np.argsort(costs[start:stop], kind='stable')
+        order = np.lexsort((costs, codes))
+        sorted_codes = codes[order]
+        starts = np.concatenate(([0], np.flatnonzero(sorted_codes[1:] != sorted_codes[:-1]) + 1))
+        stops = np.append(starts[1:], len(order))
+        for start, stop in zip(starts, stops):
+            levels[(None, sorted_codes[start].item())] = order[start:stop]
+        cache[cost_column] = levels
+    return cache[cost_column]
+
+def mix_key(catalog, row):
+    # vendor and sorted products of a row: the same for every ordering of the same products
+    columns = catalog['columns']
+    return (columns['vendor'][row],) + tuple(sorted(strip_labels([columns[name][row] for name in PRODUCT_COLUMNS]).tolist()))
+
+def nearest_in(catalog, rows, costs, sum_cost, k):
+    # the k rows (sorted by cost, one per product mix) whose cost is closest to sum_cost, found by walking outward from its sorted position
+    sorted_costs = costs[rows]
+    high = int(np.searchsorted(sorted_costs, sum_cost))
+    low = high - 1
+    nearest = []
+    seen = set()
+    while len(nearest) < k and (low >= 0 or high < len(rows)):
+        if high >= len(rows) or (low >= 0 and sum_cost - sorted_costs[low] <= sorted_costs[high] - sum_cost):
+            row = rows[low]
+            low -= 1
+        else:
+            row = rows[high]
+            high += 1
+        key = mix_key(catalog, row)
+        if key not in seen:
+            seen.add(key)
+            nearest.append(row)
+    return nearest
+
+def nearest_scenarios(catalog, sum_cost, vendor=None, k=DEFAULT_K, cost_column='cost'):
+    # catalog rows of the k scenarios closest in cost to sum_cost among all vendors other than vendor, closest first
+    levels = sorted_rows(catalog, cost_column)
+    costs = catalog['columns'][cost_column]
+    candidates = []
+    for name in catalog['vendor_slices']:
+        if name != vendor:
+            candidates += nearest_in(catalog, levels[(name, None)], costs, sum_cost, k)
+    return sorted(candidates, key=lambda row: (abs(costs[row] - sum_cost), costs[row]))[:k]
+
+def cheapest_scenarios(catalog, num_d, num_i, k=DEFAULT_K, cost_column='cost'):
+    # catalog rows of the k cheapest scenarios (one per product mix) of any vendor with num_d devices and num_i instruments
+    cheapest = []
+    seen = set()
+    for row in sorted_rows(catalog, cost_column).get((None, scenario_code(num_d, num_i)), []):
+        if len(cheapest) == k:
+            break
+        key = mix_key(catalog, row)
+        if key not in seen:
+            seen.add(key)
+            cheapest.append(row)
+    return cheapest
+
+def describe(catalog, row, cost_column='cost'):
+    """
+    Returns:
+        (str) vendor - vendor of the scenario
+        (list) products - devices, then instruments, as data_report lists them
+        (float) cost - cost of the scenario
+    """
+    columns = catalog['columns']
+    names = strip_labels([columns[name][row] for name in ['D1', 'D2', 'D3', 'I1', 'I2', 'I3']]).tolist()
+    return str(columns['vendor'][row]), [name for name in names if name != '0'], float(columns[cost_column][row])
+
+def print_alternatives(catalog, sum_cost, vendor, num_d, num_i, k=DEFAULT_K, cost_column='cost'):
+    # prints the nearest-cost scenarios of the other vendors and the cheapest scenarios with the same unit counts, after data_report
+    data_6 = "6. The {} scenarios from other vendors whose expense is closest to {} USD:"
+    data_7 = "7. The {} cheapest scenarios across the four vendors, given selection of {} device(s) and {} instrument(s):"
+    print(data_6.format(k, sum_cost))
+    for row in nearest_scenarios(catalog, sum_cost, vendor, k, cost_column):
+        name, products, cost = describe(catalog, row, cost_column)
+        print("   {}: {} - {} USD ({:+} USD)".format(name, products, round(cost, 2), round(cost - sum_cost, 2)))
+    print("\n" + data_7.format(k, num_d, num_i))
+    for row in cheapest_scenarios(catalog, num_d, num_i, k, cost_column):
+        name, products, cost = describe(catalog, row, cost_column)
+        print("   {}: {} - {} USD".format(name, products, round(cost, 2)))
+    print()
+    return
+
+def main():
+    parser = argparse.ArgumentParser(description='List the scenarios of other vendors closest in cost to a scenario, and the cheapest scenarios with its unit counts.')
+    parser.add_argument('vendor', choices=['V1', 'V2', 'V3', 'V4'])
+    parser.add_argument('--devices', default='', help='comma-separated devices (ignored for V1, whose devices follow the instrument bundles)')
+    parser.add_argument('--instruments', default='', help='comma-separated instruments')
+    parser.add_argument('-k', type=int, default=DEFAULT_K, help='number of scenarios to list (default {})'.format(DEFAULT_K))
+    args = parser.parse_args()
+    devices, instruments = parse_scenario(parser, args.vendor, args.devices, args.instruments)
+    D1, D2, D3 = slots(devices)
+    I1, I2, I3 = slots(instruments)
+    sum_cost = user_input_cost(D1, D2, D3, I1, I2, I3, args.vendor)
+    print_alternatives(load_catalog(), sum_cost, args.vendor, len(devices), len(instruments), args.k)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Parallel scoring of many scenarios with the cost index in shared memory.
+
+Usage:
+    python parallel_scoring.py scenarios.csv results.json [--workers 8] [--no-bins]
+
+The catalog is loaded and its cost index (see cost_index.py) built once, in the parent process. share_cost_index() then copies the
+sorted cost arrays of every index level into one multiprocessing.shared_memory block, and the worker processes attach to that block
+by name: their index arrays are NumPy views of the shared pages, so no worker reads v1.csv-v4.csv, rebuilds the index or holds a copy
+of the costs, whatever the start method of the pool. Only the small layout {index key: (offset, length)} and the scenarios are sent to
+the workers.
+
+Every worker scores its chunks of scenarios like POST /score of scoring_service.py: the user_input_cost price, num_d, num_i, the four
+data_report percentiles and, unless --no-bins, the histogram bins of hist_1 to hist_4. The results are written as a JSON list, in the
+order of the scenarios file, of the objects POST /score answers with (not the flat table of batch_scoring.py):
+    vendor, devices, instruments - devices and instruments as lists of names
+    num_d, num_i, cost
+    percentiles - list of percentile1 to percentile4
+    bins - {'hist_1': ..., 'hist_4': ...}, unless --no-bins
+A scenario that cannot be priced keeps vendor, devices and instruments, and gets an "error" instead of the other fields.
+"""
+
+import argparse
+import json
+import os
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+
+from batch_scoring import read_scenarios
+from cost_index import get_cost_index
+from scenario_catalog import load_catalog
+from scoring_service import score_scenario
+
+DEFAULT_CHUNK_SCENARIOS = 256 # scenarios per task sent to a worker
+
+_SHARED = None # shared memory block this worker process is attached to (kept open while the process lives)
+_INDEX = None # cost index of this worker process: views of the shared block
+
+def share_cost_index(index):
+    """
+    Copies the sorted arrays of a cost index into a new shared memory block.
+
+    Returns:
+        (shared_memory.SharedMemory) block - the block; the caller closes and unlinks it when the workers are done
+        (dict) layout - {index key: (offset, length)} position of every array in the block, in float64 items
+    """
+    layout = {}
+    offset = 0
+    for key, costs in index.items():
+        layout[key] = (offset, len(costs))
+        offset += len(costs)
+    block = shared_memory.SharedMemory(create=True, size=max(1, offset) * np.dtype(np.float64).itemsize)
+    buffer = np.ndarray((offset,), dtype=np.float64, buffer=block.buf)
+    for key, costs in index.items():
+        start, length = layout[key]
+        buffer[start:start + length] = costs
+    return block, layout
+
+def attach_cost_index(name, layout):
+    """
+    input- name of a block from share_cost_index and its layout
+    output- (block, cost index of read-only views of the block); keep the block open while the index is used
+    """
+    block = shared_memory.SharedMemory(name=name)
+    total = sum(length for offset, length in layout.values())
+    buffer = np.ndarray((total,), dtype=np.float64, buffer=block.buf)
+    buffer.flags.writeable = False
+    return block, {key: buffer[offset:offset + length] for key, (offset, length) in layout.items()}
+
+def init_worker(name, layout):
+    # pool initializer: attach to the shared cost index once per worker process
+    global _SHARED, _INDEX
+    _SHARED, _INDEX = attach_cost_index(name, layout)
+
+def score_chunk(chunk):
+    # scores a list of (vendor, devices, instruments, with_bins) against the shared index of this worker
+    results = []
+    for vendor, devices, instruments, with_bins in chunk:
+        try:
+            results.append(score_scenario(_INDEX, vendor, devices, instruments, with_bins))
+        except ValueError as error:
+            results.append({'vendor': vendor, 'devices': devices, 'instruments': instruments, 'error': str(error)})
+    return results
+
+def parallel_score(scenarios, index, workers=None, with_bins=True, chunk_scenarios=DEFAULT_CHUNK_SCENARIOS):
+    """
+    input- dataframe from batch_scoring.read_scenarios, cost index, number of worker processes (default: one per CPU),
+           whether to add the histogram bins and the number of scenarios per task
+    output- list of result dictionaries (see scoring_service.score_scenario), in the order of the scenarios
+    """
+    rows = [(vendor, devices, instruments, with_bins) for vendor, devices, instruments in zip(scenarios['vendor'], scenarios['devices'], scenarios['instruments'])]
+    chunks = [rows[start:start + chunk_scenarios] for start in range(0, len(rows), chunk_scenarios)]
+    workers = workers or os.cpu_count() or 1
+    block, layout = share_cost_index(index)
+    try:
+        with Pool(workers, initializer=init_worker, initargs=(block.name, layout)) as pool:
+            results = [result for chunk in pool.imap(score_chunk, chunks) for result in chunk]
+    finally:
+        block.close()
+        block.unlink()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Score a file of scenarios in parallel worker processes that share one in-memory cost index.')
+    parser.add_argument('scenarios', help='.csv or .json file of scenarios (vendor, devices, instruments)')
+    parser.add_argument('results', help='.json file to write the scored scenarios to')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default: one per CPU)')
+    parser.add_argument('--no-bins', action='store_true', help='leave out the histogram bins')
+    args = parser.parse_args()
+    index = get_cost_index(load_catalog())
+    results = parallel_score(read_scenarios(args.scenarios), index, args.workers, not args.no_bins)
+    with open(args.results, 'w') as f:
+        json.dump(results, f, indent=1)
+    print('Scored {} scenarios ({} could not be priced) into {}'.format(len(results), sum('error' in result for result in results), args.results))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Partitioned Parquet store of the scenario catalog, read with predicate pushdown on vendor and unit counts.
+
+write_store() converts the catalog (by default the vendor .csv files, see scenario_catalog.py) into one Parquet file per vendor
+and (num_d, num_i) bucket, in hive-style folders:
+    scenario_store/vendor=V2/num_d=1/num_i=2/part-0.parquet
+Each file holds the product columns (I1, I2, I3, D1, D2, D3) and 'cost' of its bucket; vendor, num_d and num_i are given by the
+folder names, and 'i_d' follows from num_d and num_i. _manifest.json records the .csv files the store was converted from.
+
+read_columns() filters on vendor, num_d and num_i before reading: folders that cannot match are never opened, and only the
+requested columns (by default just 'cost') are decoded. The costs filter_cost_list needs for one bucket are therefore a read of one
+small file per vendor instead of a scan of every .csv. read_catalog() loads the whole store back into the catalog layout, so
+get_dfs(vendor, catalog=read_catalog()) and every other catalog consumer work unchanged.
+
+pyarrow is an optional dependency, only needed by this module (pip install pyarrow).
+
+Usage:
+    python parquet_store.py convert [--store scenario_store]
+    python parquet_store.py query V2 --num-d 1 --num-i 2 [--columns cost,I1] [--store scenario_store]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from cost_index import scenario_code
+from scenario_catalog import CATALOG_COLUMNS, PRODUCT_COLUMNS, load_catalog
+
+STORE_DIR = 'scenario_store'
+STORE_FORMAT = 1 # bump whenever the layout of the store changes
+MANIFEST = '_manifest.json'
+
+_DATASETS = {} # process-wide pyarrow datasets, keyed on the store folder and its manifest modification time
+
+def require_pyarrow():
+    # pyarrow modules, or an ImportError that says how to get them
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('the Parquet scenario store needs pyarrow (pip install pyarrow)')
+    return pyarrow, pyarrow.dataset, pyarrow.parquet
+
+def partition_path(store_dir, vendor, num_d, num_i):
+    return os.path.join(store_dir, 'vendor=' + vendor, 'num_d=' + str(num_d), 'num_i=' + str(num_i))
+
+def write_store(catalog=None, store_dir=STORE_DIR):
+    """
+    Converts a scenario catalog (default: the .csv catalog) into a partitioned Parquet store, replacing any store in store_dir.
+
+    Returns:
+        (int) partitions - number of Parquet files written
+    """
+    pa, ds, pq = require_pyarrow()
+    if catalog is None:
+        catalog = load_catalog()
+    columns = catalog['columns']
+    tmp_dir = store_dir.rstrip(os.sep) + '.tmp-' + str(os.getpid())
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    partitions = 0
+    for vendor, (start, stop) in catalog['vendor_slices'].items():
+        codes = columns['i_d'][start:stop]
+        for code in np.unique(codes):
+            rows = start + np.flatnonzero(codes == code)
+            num_i, num_d = code.split('_')
+            folder = partition_path(tmp_dir, vendor, num_d, num_i)
+            os.makedirs(folder)
+            table = pa.table({name: columns[name][rows] for name in PRODUCT_COLUMNS + ['cost']})
+            pq.write_table(table, os.path.join(folder, 'part-0.parquet'))
+            partitions += 1
+    manifest = {'format': STORE_FORMAT, 'sources': catalog['sources'], 'vendors': list(catalog['vendor_slices'])}
+    with open(os.path.join(tmp_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1)
+    shutil.rmtree(store_dir, ignore_errors=True)
+    os.replace(tmp_dir, store_dir) # readers never see a half-written store
+    return partitions
+
+def read_manifest(store_dir=STORE_DIR):
+    with open(os.path.join(store_dir, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != STORE_FORMAT:
+        raise ValueError('{} was written in another store format; convert the catalog again'.format(store_dir))
+    return manifest
+
+def get_dataset(store_dir=STORE_DIR):
+    # the dataset of a store, discovered once per process and again only when the store is rewritten
+    pa, ds, pq = require_pyarrow()
+    key = (os.path.abspath(store_dir), os.stat(os.path.join(store_dir, MANIFEST)).st_mtime_ns)
+    if key not in _DATASETS:
+        read_manifest(store_dir)
+        schema = pa.schema([(name, pa.string()) for name in PRODUCT_COLUMNS] + [('cost', pa.float64()), ('vendor', pa.string()), ('num_d', pa.int32()), ('num_i', pa.int32())])
+        partitioning = ds.partitioning(pa.schema([('vendor', pa.string()), ('num_d', pa.int32()), ('num_i', pa.int32())]), flavor='hive')
+        _DATASETS.clear()
+        _DATASETS[key] = ds.dataset(store_dir, format='parquet', partitioning=partitioning, schema=schema, exclude_invalid_files=True)
+    return _DATASETS[key]
+
+def read_columns(store_dir=STORE_DIR, vendor=None, num_d=None, num_i=None, columns=('cost',)):
+    """
+    input- store folder, optional vendor and optional number of devices/instruments (both or neither), and the columns to read
+    output- dictionary {column name: np.ndarray} of the matching scenarios; the filters are pushed down to the partition folders
+    """
+    pa, ds, pq = require_pyarrow()
+    dataset = get_dataset(store_dir)
+    condition = None
+    for name, value in [('vendor', vendor), ('num_d', num_d), ('num_i', num_i)]:
+        if value is not None:
+            term = ds.field(name) == value
+            condition = term if condition is None else condition & term
+    table = dataset.to_table(columns=list(columns), filter=condition)
+    return {name: table.column(name).to_numpy() if name in ('cost', 'num_d', 'num_i') else np.array(table.column(name).to_pylist(), dtype=str) for name in columns}
+
+def read_costs(store_dir=STORE_DIR, vendor=None, num_d=None, num_i=None):
+    # sorted costs of the matching scenarios, like cost_index.lookup_costs
+    return np.sort(read_columns(store_dir, vendor, num_d, num_i)['cost'])
+
+def read_catalog(store_dir=STORE_DIR):
+    """
+    Loads a whole store back into the catalog layout of scenario_catalog.load_catalog ('columns', 'vendor_slices', 'sources').
+    Rows are grouped by vendor, then by unit counts.
+    """
+    manifest = read_manifest(store_dir)
+    parts = []
+    vendor_slices = {}
+    start = 0
+    for vendor in manifest['vendors']:
+        part = read_columns(store_dir, vendor, columns=PRODUCT_COLUMNS + ['cost', 'num_d', 'num_i'])
+        order = np.lexsort((part['num_i'], part['num_d']))
+        part = {name: values[order] for name, values in part.items()}
+        part['i_d'] = np.char.add(np.char.add(part.pop('num_i').astype(str), '_'), part.pop('num_d').astype(str))
+        part['vendor'] = np.full(len(part['cost']), vendor)
+        parts.append(part)
+        vendor_slices[vendor] = (start, start + len(part['cost']))
+        start += len(part['cost'])
+    return {'columns': {name: np.concatenate([part[name] for part in parts]) for name in CATALOG_COLUMNS},
+    'vendor_slices': vendor_slices,
+    'sources': manifest['sources']}
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert the scenario catalog to a partitioned Parquet store, or query the store.')
+    parser.add_argument('command', choices=['convert', 'query'])
+    parser.add_argument('vendor', nargs='?', default=None, help='vendor to query (default: all)')
+    parser.add_argument('--num-d', type=int, default=None)
+    parser.add_argument('--num-i', type=int, default=None)
+    parser.add_argument('--columns', default='cost', help='comma-separated columns to read (default cost)')
+    parser.add_argument('--store', default=STORE_DIR, help='folder of the store (default {})'.format(STORE_DIR))
+    args = parser.parse_args()
+    if args.command == 'convert':
+        partitions = write_store(store_dir=args.store)
+        print('Wrote {} partitions into {}'.format(partitions, args.store))
+        return
+    if (args.num_d is None) != (args.num_i is None):
+        parser.error('give both --num-d and --num-i, or neither')
+    require_pyarrow() # not part of the timed read
+    start = time.perf_counter()
+    result = read_columns(args.store, args.vendor, args.num_d, args.num_i, [name.strip() for name in args.columns.split(',')])
+    elapsed = time.perf_counter() - start
+    code = None if args.num_d is None else scenario_code(args.num_d, args.num_i)
+    print('{} scenarios (vendor {}, i_d {}) read in {:.1f} ms'.format(len(next(iter(result.values()))), args.vendor or 'any', code or 'any', elapsed * 1000))
+    if 'cost' in result and len(result['cost']):
+        print('cost min {} / median {} / max {}'.format(result['cost'].min(), np.median(result['cost']), result['cost'].max()))
+
+if __name__ == "__main__":
+    main()
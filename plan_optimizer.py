@@ -0,0 +1,207 @@
+"""
+Constrained search for the cheapest procurement plans, without enumerating every scenario.
+
+A requirement is a set of constraints, for example "at least 2 devices and 2 instruments, must include Instrument_B or Device_E":
+    min_devices, min_instruments - minimum number of units of each category
+    max_devices, max_instruments - optional unit ceilings (None for no ceiling)
+    vendors - vendors allowed to supply the plan (default all)
+    require_any - the plan must include at least one of these products
+    exclude - products the plan must not include
+A plan is one vendor and a multiset of its products. V1 sells every instrument bundled with its device (V1_BUNDLES), and prices
+the 2nd instrument with DISCOUNT1_RATES and later ones with DISCOUNT2_RATES, so every V1 plan is priced in its cheapest instrument order.
+
+best_plans() is a best-first branch-and-bound over product multisets. Every multiset is generated once (units are only ever
+added to the last product added or to products after it), and a branch is ordered by a lower bound on every plan below it:
+the units it already holds at their lowest possible unit price plus the cheapest way to meet the minimums still missing.
+Plans are returned in order of cost once no open branch can beat them, so the top-k plans come out after exploring only a small part of the space.
+
+Usage:
+    python plan_optimizer.py --min-devices 2 --min-instruments 2 --require-any Instrument_B,Device_E -k 5
+"""
+
+import argparse
+import heapq
+import itertools
+
+import numpy as np
+
+from pricing_rules import DISCOUNT1_RATES, DISCOUNT2_RATES, PRODUCT2COST, PRODUCTS, V1_BUNDLES, VENDOR_DEVICES, VENDOR_INSTRUMENTS, price_scenarios
+
+MAX_EXPANSIONS = 1000000 # branches explored before best_plans gives up
+
+def vendor_products(vendor, exclude=()):
+    """
+    Returns the products a plan of vendor is built from, without excluded products:
+        (list) products - for V1 the instruments (each one brings its bundled device), otherwise devices followed by instruments
+        (list) is_device - for every product, whether it counts as a device
+    """
+    if vendor == 'V1':
+        products = [name for name in VENDOR_INSTRUMENTS[vendor] if name not in exclude and V1_BUNDLES[name] not in exclude]
+        return products, [False] * len(products)
+    devices = [name for name in VENDOR_DEVICES[vendor] if name not in exclude]
+    instruments = [name for name in VENDOR_INSTRUMENTS[vendor] if name not in exclude]
+    return devices + instruments, [True] * len(devices) + [False] * len(instruments)
+
+def floor_prices(vendor, products):
+    # lowest price any unit of each product can be bought at (V1 instruments: their deepest discount)
+    if vendor == 'V1':
+        return np.array([PRODUCT2COST[name] * min(1, DISCOUNT1_RATES[name], DISCOUNT2_RATES[name]) for name in products])
+    return np.array([PRODUCT2COST[name] for name in products], dtype=np.float64)
+
+def v1_instrument_order(counts, products):
+    """
+    Cheapest order of a multiset of V1 instruments: the 1st instrument pays list price, the 2nd its discount1 price, the rest their discount2 price.
+
+    Returns:
+        (list) instruments - instrument names in their cheapest order
+        (float) cost - cost of the instruments in that order
+    """
+    pool = [name for name, count in zip(products, counts) for _ in range(count)]
+    if not pool:
+        return [], 0.0
+    base = sum(PRODUCT2COST[name] * DISCOUNT2_RATES[name] for name in pool) # every instrument at the discount2 price ...
+    best = None
+    for first in set(pool): # ... plus the surcharge of the instruments in the 1st and 2nd position
+        rest = list(pool)
+        rest.remove(first)
+        seconds = set(rest) if rest else [None]
+        for second in seconds:
+            cost = base + PRODUCT2COST[first] * (1 - DISCOUNT2_RATES[first])
+            if second is not None:
+                cost += PRODUCT2COST[second] * (DISCOUNT1_RATES[second] - DISCOUNT2_RATES[second])
+            if best is None or cost < best[0]:
+                best = (cost, first, second)
+    cost, first, second = best
+    pool.remove(first)
+    order = [first]
+    if second is not None:
+        pool.remove(second)
+        order.append(second)
+    return order + sorted(pool, key=lambda name: products.index(name)), cost
+
+def make_plan(vendor, products, is_device, counts):
+    # plan dictionary of a multiset, with its cost from the vectorized user_input_cost rules
+    if vendor == 'V1':
+        instruments, _ = v1_instrument_order(counts, products)
+        devices = [V1_BUNDLES[name] for name in instruments]
+    else:
+        devices = [name for name, device, count in zip(products, is_device, counts) if device for _ in range(count)]
+        instruments = [name for name, device, count in zip(products, is_device, counts) if not device for _ in range(count)]
+    width = max(3, len(devices), len(instruments))
+    device_slots = [devices + ['0'] * (width - len(devices))]
+    instrument_slots = [instruments + ['0'] * (width - len(instruments))]
+    cost = float(price_scenarios([vendor], device_slots, instrument_slots)[0])
+    return {'vendor': vendor, 'devices': devices, 'instruments': instruments, 'num_d': len(devices), 'num_i': len(instruments), 'cost': cost}
+
+def exact_cost(vendor, products, floors, units):
+    # cost of a multiset, used to order finished plans
+    if vendor == 'V1':
+        return v1_instrument_order(units.tolist(), products)[1]
+    return float(units @ floors)
+
+def bound(vendor, counts, setup, min_devices, min_instruments, require_any):
+    """
+    Lower bound on the cost of every plan that contains the multiset counts: its units at their floor prices, plus the cheapest
+    units that could still meet the minimums and the require_any constraint.
+    """
+    products, is_device, wanted, floors, device_ceiling, instrument_ceiling = setup
+    units = np.array(counts)
+    held = float(units @ floors)
+    if vendor == 'V1':
+        missing = max(min_devices, min_instruments) - units.sum()
+        needed = max(missing, 0) * floors.min()
+    else:
+        missing_d = max(min_devices - units[is_device].sum(), 0)
+        missing_i = max(min_instruments - units[~is_device].sum(), 0)
+        needed = (missing_d * floors[is_device].min() if missing_d else 0) + (missing_i * floors[~is_device].min() if missing_i else 0)
+    if require_any and not (units[wanted] > 0).any():
+        needed = max(needed, floors[wanted].min())
+    return held + needed
+
+def best_plans(k=5, min_devices=0, min_instruments=0, max_devices=None, max_instruments=None, vendors=None, require_any=(), exclude=(), max_expansions=MAX_EXPANSIONS):
+    """
+    Returns the k cheapest plans meeting the requirement, cheapest first (fewer if fewer plans exist).
+    Each plan is a dictionary with vendor, devices, instruments, num_d, num_i and cost.
+    Raises ValueError for an unknown vendor or product.
+    """
+    if vendors is None:
+        vendors = list(VENDOR_INSTRUMENTS)
+    unknown = [vendor for vendor in vendors if vendor not in VENDOR_INSTRUMENTS]
+    if unknown:
+        raise ValueError('unknown vendor(s) {}'.format(unknown))
+    require_any = set(require_any)
+    exclude = set(exclude)
+    for name in require_any | exclude:
+        if name not in PRODUCTS:
+            raise ValueError('unknown product {}'.format(name))
+    heap = []
+    tie = itertools.count() # keeps heap entries comparable when bounds are equal
+    setups = {}
+    for vendor in vendors:
+        products, is_device = vendor_products(vendor, exclude)
+        is_device = np.array(is_device, dtype=bool)
+        if vendor == 'V1':
+            wanted = np.array([name in require_any or V1_BUNDLES[name] in require_any for name in products], dtype=bool)
+            device_ceiling = instrument_ceiling = min(ceiling for ceiling in [max_devices, max_instruments, np.inf] if ceiling is not None)
+            minimum = max(min_devices, min_instruments)
+            if not products or minimum > device_ceiling:
+                continue
+        else:
+            wanted = np.array([name in require_any for name in products], dtype=bool)
+            device_ceiling = np.inf if max_devices is None else max_devices
+            instrument_ceiling = np.inf if max_instruments is None else max_instruments
+            if (min_devices > 0 and not is_device.any()) or (min_instruments > 0 and is_device.all()) or min_devices > device_ceiling or min_instruments > instrument_ceiling:
+                continue
+        if require_any and not wanted.any():
+            continue
+        floors = floor_prices(vendor, products)
+        setups[vendor] = (products, is_device, wanted, floors, device_ceiling, instrument_ceiling)
+        counts = (0,) * len(products)
+        heapq.heappush(heap, (bound(vendor, counts, setups[vendor], min_devices, min_instruments, require_any), next(tie), 'branch', vendor, counts, 0))
+    plans = []
+    expansions = 0
+    while heap and len(plans) < k and expansions < max_expansions:
+        key, _, kind, vendor, counts, last = heapq.heappop(heap)
+        products, is_device, wanted, floors, device_ceiling, instrument_ceiling = setups[vendor]
+        if kind == 'plan':
+            plans.append(make_plan(vendor, products, is_device, counts))
+            continue
+        expansions += 1
+        units = np.array(counts)
+        num_d = units.sum() if vendor == 'V1' else units[is_device].sum()
+        num_i = units[~is_device].sum()
+        if num_d >= min_devices and num_i >= min_instruments and (not require_any or (units[wanted] > 0).any()):
+            heapq.heappush(heap, (exact_cost(vendor, products, floors, units), next(tie), 'plan', vendor, counts, last))
+        for position in range(last, len(products)): # add one unit of the last product added or of a later one
+            if is_device[position] and num_d >= device_ceiling:
+                continue
+            if not is_device[position] and (num_i >= instrument_ceiling or (vendor == 'V1' and num_d >= device_ceiling)):
+                continue
+            child = counts[:position] + (counts[position] + 1,) + counts[position + 1:]
+            heapq.heappush(heap, (bound(vendor, child, setups[vendor], min_devices, min_instruments, require_any), next(tie), 'branch', vendor, child, position))
+    return plans
+
+def main():
+    parser = argparse.ArgumentParser(description='Find the cheapest procurement plans that meet a requirement.')
+    parser.add_argument('-k', type=int, default=5, help='number of plans to return (default 5)')
+    parser.add_argument('--min-devices', type=int, default=0)
+    parser.add_argument('--min-instruments', type=int, default=0)
+    parser.add_argument('--max-devices', type=int, default=None)
+    parser.add_argument('--max-instruments', type=int, default=None)
+    parser.add_argument('--vendors', default=None, help='comma-separated vendors allowed to supply the plan (default all)')
+    parser.add_argument('--require-any', default='', help='comma-separated products; the plan must include at least one of them')
+    parser.add_argument('--exclude', default='', help='comma-separated products the plan must not include')
+    args = parser.parse_args()
+    split = lambda value: [name.strip() for name in value.split(',') if name.strip()]
+    try:
+        plans = best_plans(args.k, args.min_devices, args.min_instruments, args.max_devices, args.max_instruments,
+        split(args.vendors) if args.vendors else None, split(args.require_any), split(args.exclude))
+    except ValueError as error:
+        parser.error(str(error))
+    if not plans:
+        print('No plan meets this requirement.')
+    for rank, plan in enumerate(plans, start=1):
+        print('{}. {} {} USD: devices {}, instruments {}'.format(rank, plan['vendor'], round(plan['cost'], 2), plan['devices'], plan['instruments']))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Monte Carlo simulation of price uncertainty for the 5-year expense forecast.
+
+user_input_cost prices a scenario with fixed list prices (PRODUCT2COST) and fixed V1 discount factors. simulate() instead draws
+every product price and every V1 discount factor from a distribution and prices all scenarios under every draw:
+- prices are lognormal (default) or normal around the list price, with a relative standard deviation per product
+- prices are correlated through a Gaussian copula: products of the same vendor share the correlation 'same_vendor', all other pairs 'other_vendor'
+- V1 discount factors are normal around DISCOUNT1_RATES / DISCOUNT2_RATES, clipped to [0, 1]
+Scenario costs are the matrix product of a chunk of drawn prices with the tier counts of pricing_rules.tier_counts, for all scenarios at once.
+Every chunk is folded into running statistics per scenario (mean, standard deviation, a fixed-grid histogram for the quantiles and the
+number of draws within budget) and then discarded, so memory stays bounded no matter how many samples are drawn.
+The quantiles are approximate: they are interpolated inside the bins of the histogram, whose grid spans the range of a pilot chunk
+widened by half of it on both sides, and draws outside that grid are counted in the outer bins. The mean, standard deviation and
+budget probability are exact over all draws.
+
+Usage:
+    python price_simulation.py scenarios.csv results.csv --samples 1000000 --budget 2500000 [--distributions distributions.json]
+
+The optional distributions file is a JSON object with any of the keys of DEFAULT_DISTRIBUTIONS, for example
+    {"price_sd": 0.08, "same_vendor": 0.6, "prices": {"Instrument_E": {"dist": "normal", "sd": 0.15}}, "discounts": {"Instrument_A": {"sd": 0.02}}}
+"""
+
+import argparse
+import json
+
+import numpy as np
+
+from batch_scoring import read_scenarios, result_slots, score_scenarios, write_results
+from cost_index import get_cost_index
+from pricing_rules import PRODUCTS, VENDOR_DEVICES, VENDOR_INSTRUMENTS, price_vector, rate_vectors, tier_counts
+from scenario_catalog import load_catalog
+
+DEFAULT_DISTRIBUTIONS = {'price_dist': 'lognormal', # 'lognormal' or 'normal'
+'price_sd': 0.05, # standard deviation of each price, relative to its list price
+'discount_sd': 0.01, # standard deviation of each V1 discount factor
+'same_vendor': 0.5, # correlation between the prices of two products of the same vendor
+'other_vendor': 0.0, # correlation between the prices of products of different vendors
+'prices': {}, # per-product overrides: {product: {'dist': ..., 'sd': ...}}
+'discounts': {}} # per-product overrides: {product: {'sd': ...}}
+
+DEFAULT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+DEFAULT_CHUNK_CELLS = 1 << 22 # samples x max(scenarios, products) priced per chunk
+DEFAULT_BINS = 512 # histogram bins per scenario used for the quantiles
+
+def product_vendors():
+    # vendor of every product in PRODUCTS
+    owner = {}
+    for vendor in VENDOR_DEVICES:
+        for name in VENDOR_DEVICES[vendor] + VENDOR_INSTRUMENTS[vendor]:
+            owner[name] = vendor
+    return [owner[name] for name in PRODUCTS]
+
+def correlation_matrix(same_vendor, other_vendor):
+    # correlation of the price draws of every pair of products
+    vendors = np.array(product_vendors())
+    same = vendors[:, None] == vendors[None, :]
+    correlation = np.where(same, same_vendor, other_vendor)
+    np.fill_diagonal(correlation, 1.0)
+    return correlation
+
+def price_model(distributions=None):
+    """
+    input- distribution settings (see DEFAULT_DISTRIBUTIONS; missing keys take the default)
+    output- dictionary of arrays over PRODUCTS describing how to draw prices and discount factors
+    """
+    settings = dict(DEFAULT_DISTRIBUTIONS)
+    settings.update(distributions or {})
+    price_overrides = settings['prices']
+    discount_overrides = settings['discounts']
+    dists = [price_overrides.get(name, {}).get('dist', settings['price_dist']) for name in PRODUCTS]
+    unknown = sorted(set(dists) - {'lognormal', 'normal'})
+    if unknown:
+        raise ValueError('unknown price distribution(s) {}'.format(unknown))
+    rates1, rates2 = rate_vectors()
+    return {'price': price_vector(),
+    'price_sd': np.array([price_overrides.get(name, {}).get('sd', settings['price_sd']) for name in PRODUCTS], dtype=np.float64),
+    'lognormal': np.array([dist == 'lognormal' for dist in dists]),
+    'rates1': rates1,
+    'rates2': rates2,
+    'discount_sd': np.array([discount_overrides.get(name, {}).get('sd', settings['discount_sd']) for name in PRODUCTS], dtype=np.float64),
+    'discounted': rates1 != 1.0,
+    'cholesky': np.linalg.cholesky(correlation_matrix(settings['same_vendor'], settings['other_vendor']))}
+
+def draw_pricing(rng, model, num_samples):
+    """
+    Returns num_samples correlated draws of:
+        (np.ndarray) prices - shape (num_samples, len(PRODUCTS))
+        (np.ndarray) rates1, rates2 - V1 discount factors, same shape (1.0 for products without a discount)
+    """
+    z = rng.standard_normal((num_samples, len(PRODUCTS))) @ model['cholesky'].T
+    sigma = np.sqrt(np.log1p(model['price_sd'] ** 2)) # lognormal with the same mean and relative standard deviation
+    lognormal = model['price'] * np.exp(sigma * z - sigma ** 2 / 2)
+    normal = model['price'] * np.maximum(1 + model['price_sd'] * z, 0)
+    prices = np.where(model['lognormal'], lognormal, normal)
+    noise = model['discount_sd'] * model['discounted']
+    rates1 = np.clip(model['rates1'] + noise * rng.standard_normal((num_samples, len(PRODUCTS))), 0, 1)
+    rates2 = np.clip(model['rates2'] + noise * rng.standard_normal((num_samples, len(PRODUCTS))), 0, 1)
+    return prices, rates1, rates2
+
+def scenario_costs(tiers, prices, rates1, rates2):
+    # cost of every scenario under every draw: shape (number of draws, number of scenarios)
+    return prices @ tiers[0].T + (prices * rates1) @ tiers[1].T + (prices * rates2) @ tiers[2].T
+
+def histogram_quantiles(counts, lower, width, quantiles):
+    # quantiles of every scenario from its fixed-grid histogram, interpolated linearly inside the bin
+    total = counts.sum(axis=1, keepdims=True)
+    cumulative = np.cumsum(counts, axis=1)
+    result = np.empty((len(counts), len(quantiles)))
+    for column, q in enumerate(quantiles):
+        target = q * total
+        position = np.argmax(cumulative >= target, axis=1)
+        rows = np.arange(len(counts))
+        before = cumulative[rows, position] - counts[rows, position]
+        inside = np.divide(target[:, 0] - before, counts[rows, position], out=np.zeros(len(counts)), where=counts[rows, position] > 0)
+        result[:, column] = lower + width * (position + inside)
+    return result
+
+def simulate(tiers, num_samples=100000, budget=None, quantiles=DEFAULT_QUANTILES, distributions=None, seed=None, chunk_cells=DEFAULT_CHUNK_CELLS, bins=DEFAULT_BINS):
+    """
+    input- tier counts of the scenarios (pricing_rules.tier_counts), number of samples, optional budget in USD, quantiles to report,
+           distribution settings, random seed, and the chunk and histogram sizes
+    output- dictionary of per-scenario arrays:
+        'mean', 'std' - mean and standard deviation of the simulated cost
+        'min', 'max' - lowest and highest simulated cost
+        'quantiles' - shape (number of scenarios, len(quantiles))
+        'p_within_budget' - share of draws with a cost at or below budget (only if budget is given)
+    """
+    model = price_model(distributions)
+    rng = np.random.default_rng(seed)
+    tiers = np.asarray(tiers, dtype=np.float64)
+    num_scenarios = tiers.shape[1]
+    chunk_samples = max(1, chunk_cells // max(num_scenarios, len(PRODUCTS))) # draw_pricing holds several (samples x products) arrays per chunk
+    pilot = scenario_costs(tiers, *draw_pricing(rng, model, min(chunk_samples, num_samples)))
+    # histogram grid of each scenario: the pilot range, widened by half of it on both sides; draws beyond it fall into the outer bins
+    spread = pilot.max(axis=0) - pilot.min(axis=0)
+    lower = pilot.min(axis=0) - spread / 2
+    width = np.where(spread > 0, 2 * spread / bins, 1.0)
+    counts = np.zeros(num_scenarios * bins, dtype=np.int64)
+    offsets = np.arange(num_scenarios) * bins
+    total = np.zeros(num_scenarios)
+    total_sq = np.zeros(num_scenarios)
+    within = np.zeros(num_scenarios, dtype=np.int64)
+    low = np.full(num_scenarios, np.inf)
+    high = np.full(num_scenarios, -np.inf)
+    drawn = 0
+    costs = pilot
+    while True:
+        total += costs.sum(axis=0)
+        total_sq += (costs ** 2).sum(axis=0)
+        low = np.minimum(low, costs.min(axis=0))
+        high = np.maximum(high, costs.max(axis=0))
+        if budget is not None:
+            within += np.count_nonzero(costs <= budget, axis=0)
+        position = np.clip(((costs - lower) / width).astype(np.int64), 0, bins - 1)
+        counts += np.bincount((position + offsets).ravel(), minlength=num_scenarios * bins)
+        drawn += len(costs)
+        if drawn >= num_samples:
+            break
+        costs = scenario_costs(tiers, *draw_pricing(rng, model, min(chunk_samples, num_samples - drawn)))
+    mean = total / drawn
+    result = {'mean': mean,
+    'std': np.sqrt(np.maximum(total_sq / drawn - mean ** 2, 0)),
+    'min': low,
+    'max': high,
+    'quantiles': np.clip(histogram_quantiles(counts.reshape(num_scenarios, bins), lower, width, quantiles), low[:, None], high[:, None])}
+    if budget is not None:
+        result['p_within_budget'] = within / drawn
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate price and discount uncertainty for a file of procurement scenarios.')
+    parser.add_argument('scenarios', help='.csv or .json file of scenarios (vendor, devices, instruments)')
+    parser.add_argument('results', help='.csv or .json file to write the simulated cost statistics to')
+    parser.add_argument('--samples', type=int, default=100000, help='number of price draws (default 100000)')
+    parser.add_argument('--budget', type=float, default=None, help='budget in USD; reports the probability of staying within it')
+    parser.add_argument('--quantiles', default=','.join(str(q) for q in DEFAULT_QUANTILES), help='comma-separated cost quantiles to report')
+    parser.add_argument('--distributions', default=None, help='JSON file of distribution settings (see DEFAULT_DISTRIBUTIONS)')
+    parser.add_argument('--seed', type=int, default=None, help='random seed, for reproducible results')
+    args = parser.parse_args()
+    distributions = None
+    if args.distributions:
+        with open(args.distributions) as f:
+            distributions = json.load(f)
+    quantiles = [float(q) for q in args.quantiles.split(',')]
+    results = score_scenarios(read_scenarios(args.scenarios), get_cost_index(load_catalog()))
+    valid = (results['error'] == '').to_numpy()
+    tiers = tier_counts(*result_slots(results[valid]))
+    simulation = simulate(tiers, args.samples, args.budget, quantiles, distributions, args.seed)
+    for name in ['mean', 'std', 'min', 'max']:
+        results.loc[valid, 'sim_' + name] = simulation[name]
+    for column, q in enumerate(quantiles):
+        results.loc[valid, 'sim_q{:g}'.format(q * 100)] = simulation['quantiles'][:, column]
+    if args.budget is not None:
+        results.loc[valid, 'p_within_budget'] = simulation['p_within_budget']
+    write_results(results, args.results)
+    print('Simulated {} scenarios with {} price draws each into {}'.format(int(valid.sum()), args.samples, args.results))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Audit of every catalog row against the pricing rules.
+
+The costs in v1.csv-v4.csv and the prices in pricing_rules.py (used by user_input_cost) are maintained separately. audit_catalog()
+reprices every row of the catalog with the pricing rules (list prices, V1 discount1/discount2 by instrument rank as in
+pricing_rules.tier_counts, ' laser' suffix of v1.csv ignored) and checks, for every row:
+- the vendor column matches the vendor whose file the row was loaded from
+- every product has a price and is offered by that vendor (VENDOR_DEVICES, VENDOR_INSTRUMENTS)
+- every V1 device is the bundle of the instrument in the same slot (V1_BUNDLES)
+- the 'i_d' code matches the number of instruments and devices in the row
+- the cost differs from the repriced cost by at most the rounding of the pricing rules (or a fixed tolerance in USD)
+The .csv costs were built from prices with cents and unrounded discount rates, while PRODUCT2COST holds whole USD and the V1
+discount rates 5 decimals, so most rows differ from the repriced cost by a few USD. The rounding bound of a row is PRICE_ROUNDING
+per unit plus RATE_ROUNDING times the list price of every discounted instrument; nonzero differences within it are reported as
+'rounding drift', which does not break the rules, and only larger ones as 'cost'.
+Every slot column is first turned into integer product columns (one comparison per distinct name, see factorize), so every check
+is an integer table lookup; rows are processed in chunks, so catalogs of millions of rows are audited in seconds with bounded memory.
+
+Usage:
+    python pricing_audit.py [--tolerance USD] [--out mismatches.csv] [--show 20]
+
+prints a summary per vendor and problem (rounding drift on its own line) and the first mismatching rows, optionally writes all
+reported rows to a .csv or .json file, and exits with status 1 if any row breaks the rules (0 otherwise, whatever the rounding
+drift), so it can gate a catalog refresh.
+"""
+
+import argparse
+import sys
+
+import numpy as np
+
+from pricing_rules import DEFAULT_CHUNK_ROWS, PRODUCTS, V1_BUNDLES, VENDOR_DEVICES, VENDOR_INSTRUMENTS, price_vector, rate_vectors, strip_labels
+from scenario_catalog import load_catalog
+
+PRICE_ROUNDING = 0.5 # USD per unit: PRODUCT2COST holds prices rounded to whole USD
+RATE_ROUNDING = 0.5e-5 # DISCOUNT1_RATES and DISCOUNT2_RATES hold 5 decimals
+DRIFT_FLOOR = 0.001 # USD: smaller differences are floating point noise, not rounding drift
+PROBLEMS = ['vendor column', 'unknown product', 'product not offered', 'V1 bundle', 'i_d code', 'cost', 'rounding drift'] # columns of the audit_chunk problem matrix
+DRIFT = PROBLEMS.index('rounding drift') # the only problem that does not break the rules
+
+MAX_PASSES = 64 # factorize() compares a column against at most this many distinct values before it sorts instead
+
+def slot_names(columns, prefix):
+    # slot columns of a catalog with the given prefix ('D' or 'I'), in slot order: D1, D2, ..., D10 for any unit ceiling
+    return sorted((name for name in columns if name[:1] == prefix and name[1:].isdigit()), key=lambda name: int(name[1:]))
+
+def tier_prices(product2cost=None, discount1_rates=None, discount2_rates=None):
+    # (len(PRODUCTS), 3) matrix: price of one unit of every product at list price, discount1 and discount2
+    prices = price_vector(product2cost)
+    rates1, rates2 = rate_vectors(discount1_rates, discount2_rates)
+    return np.column_stack([prices, prices * rates1, prices * rates2])
+
+def factorize(values):
+    """
+    Returns:
+        (np.ndarray) codes - position of every value in names
+        (list) names - distinct values, as str
+    Catalog columns hold a handful of distinct values, so one vectorized comparison per distinct value is much faster than
+    sorting the strings (np.unique); columns with many distinct values are sorted.
+    """
+    values = np.asarray(values)
+    codes = np.full(len(values), -1, dtype=np.int64)
+    names = []
+    left = np.arange(len(values))
+    while len(left) and len(names) < MAX_PASSES:
+        name = values[left[0]]
+        match = values[left] == name
+        codes[left[match]] = len(names)
+        names.append(str(name))
+        left = left[~match]
+    if len(left):
+        rest, inverse = np.unique(values[left].astype(str), return_inverse=True)
+        codes[left] = len(names) + inverse.ravel()
+        names += rest.tolist()
+    return codes, names
+
+def product_codes(values):
+    # product column of every slot value: -1 for an empty slot ('0'), len(PRODUCTS) for a product without a price; labels stripped
+    codes, names = factorize(values)
+    lookup = np.array([-1 if name == '0' else PRODUCTS.index(name) if name in PRODUCTS else len(PRODUCTS) for name in strip_labels(names).tolist()], dtype=np.int64)
+    return lookup[codes]
+
+def is_mismatch(problems):
+    # True for every '; '-separated problems string of audit_catalog that breaks the rules (rounding drift alone does not)
+    return np.array([any(problem not in ('', PROBLEMS[DRIFT]) for problem in text.split('; ')) for text in problems], dtype=bool)
+
+def audit_chunk(vendor, vendors, devices, instruments, codes, costs, prices, tolerance=None):
+    """
+    Audits the rows of one chunk, which were all loaded from the file of vendor.
+
+    input- vendor, vendor column, (rows x slots) product columns of the devices and instruments (see product_codes), 'i_d' codes,
+           costs, tier_prices() matrix and tolerance in USD (None: the rounding bound of every row)
+    output- (expected costs, np.ndarray of shape (rows, len(PROBLEMS)) with one boolean column per problem)
+    """
+    rows = len(costs)
+    problems = np.zeros((rows, len(PROBLEMS)), dtype=bool)
+    vendor_codes, vendor_names = factorize(vendors)
+    problems[:, 0] = np.array([name != vendor for name in vendor_names], dtype=bool)[vendor_codes]
+    problems[:, 1] = (devices == len(PRODUCTS)).any(axis=1) | (instruments == len(PRODUCTS)).any(axis=1)
+    offered = np.zeros(len(PRODUCTS) + 2, dtype=bool) # indexed by product column + 1: empty slot, products, product without a price
+    offered[0] = True
+    offered[[PRODUCTS.index(name) + 1 for name in VENDOR_DEVICES.get(vendor, []) + VENDOR_INSTRUMENTS.get(vendor, [])]] = True
+    problems[:, 2] = ~(offered[devices + 1].all(axis=1) & offered[instruments + 1].all(axis=1))
+    if vendor == 'V1':
+        bundles = np.full(len(PRODUCTS) + 2, -2, dtype=np.int64) # device column each instrument comes with; -2 for no bundle
+        bundles[0] = -1
+        for name, device in V1_BUNDLES.items():
+            bundles[PRODUCTS.index(name) + 1] = PRODUCTS.index(device)
+        problems[:, 3] = (bundles[instruments + 1] != devices).any(axis=1)
+    code_codes, code_names = factorize(codes)
+    parts = [name.partition('_') for name in code_names] # 'i_d' codes are '#instruments_#devices'
+    num_i = np.array([int(part[0]) if part[0].isdigit() else -1 for part in parts])[code_codes]
+    num_d = np.array([int(part[2]) if part[2].isdigit() else -1 for part in parts])[code_codes]
+    selected_i = instruments >= 0
+    problems[:, 4] = (num_i != selected_i.sum(axis=1)) | (num_d != (devices >= 0).sum(axis=1))
+    table = np.vstack([np.zeros((1, 3)), prices, np.zeros((1, 3))]) # empty slots and products without a price cost nothing; their rows are reported anyway
+    if vendor == 'V1':
+        tiers = np.clip(np.cumsum(selected_i, axis=1) - 1, 0, 2) # 1st instrument list price, 2nd discount1, later ones discount2
+    else:
+        tiers = np.zeros(instruments.shape, dtype=np.int64)
+    expected = table[devices + 1, 0].sum(axis=1) + table[instruments + 1, tiers].sum(axis=1)
+    if tolerance is None:
+        units = selected_i.sum(axis=1) + (devices >= 0).sum(axis=1)
+        tolerance = PRICE_ROUNDING * units + RATE_ROUNDING * (table[instruments + 1, 0] * (tiers > 0)).sum(axis=1)
+    difference = np.abs(costs - expected)
+    problems[:, 5] = difference > tolerance
+    problems[:, DRIFT] = (difference > DRIFT_FLOOR) & ~problems[:, 5]
+    return expected, problems
+
+def audit_catalog(catalog=None, tolerance=None, product2cost=None, discount1_rates=None, discount2_rates=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    input- scenario catalog (default: the .csv catalog), tolerance in USD (default: the rounding bound of every row), optional prices
+           and V1 discount rates, rows per chunk
+    output- dictionary of NumPy arrays, one entry per row that breaks at least one rule or drifts by rounding (see is_mismatch):
+        'row' - catalog row; 'vendor' - vendor whose file holds the row; 'line' - line of the row in that file (header = line 1)
+        'products' - slot values, devices first, separated by ';'; 'i_d' - code of the row
+        'cost' - cost in the file; 'expected' - cost under the pricing rules; 'difference' - cost - expected
+        'problems' - rules the row breaks, separated by '; ' (see PROBLEMS)
+    """
+    if catalog is None:
+        catalog = load_catalog()
+    columns = catalog['columns']
+    prices = tier_prices(product2cost, discount1_rates, discount2_rates)
+    device_columns = slot_names(columns, 'D')
+    instrument_columns = slot_names(columns, 'I')
+    found = {name: [] for name in ['row', 'vendor', 'line', 'products', 'i_d', 'cost', 'expected', 'difference', 'problems']}
+    for vendor, (start, stop) in catalog['vendor_slices'].items():
+        for chunk_start in range(start, stop, chunk_rows):
+            chunk = slice(chunk_start, min(chunk_start + chunk_rows, stop))
+            devices = np.column_stack([product_codes(columns[name][chunk]) for name in device_columns])
+            instruments = np.column_stack([product_codes(columns[name][chunk]) for name in instrument_columns])
+            costs = np.asarray(columns['cost'][chunk], dtype=np.float64)
+            expected, problems = audit_chunk(vendor, columns['vendor'][chunk], devices, instruments, columns['i_d'][chunk], costs, prices, tolerance)
+            bad = np.flatnonzero(problems.any(axis=1))
+            if len(bad) == 0:
+                continue
+            rows = chunk_start + bad
+            found['row'].append(rows)
+            found['vendor'].append(np.full(len(bad), vendor))
+            found['line'].append(rows - start + 2)
+            found['products'].append(np.array([';'.join(str(columns[name][row]) for name in device_columns + instrument_columns) for row in rows], dtype=object))
+            found['i_d'].append(np.asarray(columns['i_d'][rows], dtype=str))
+            found['cost'].append(costs[bad])
+            found['expected'].append(expected[bad])
+            found['difference'].append(costs[bad] - expected[bad])
+            found['problems'].append(np.array(['; '.join(name for name, broken in zip(PROBLEMS, flags) if broken) for flags in problems[bad].tolist()], dtype=object))
+    empty = {'row': np.int64, 'line': np.int64, 'cost': np.float64, 'expected': np.float64, 'difference': np.float64}
+    return {name: np.concatenate(parts) if parts else np.empty(0, dtype=empty.get(name, object)) for name, parts in found.items()}
+
+def summarize(mismatches):
+    # {(vendor, problem): (rows, largest absolute cost difference)}
+    summary = {}
+    for vendor, problems, difference in zip(mismatches['vendor'], mismatches['problems'], mismatches['difference']):
+        for problem in problems.split('; '):
+            rows, largest = summary.get((vendor, problem), (0, 0.0))
+            summary[(vendor, problem)] = (rows + 1, max(largest, abs(difference)))
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description='Check every catalog row against the pricing rules; exits with status 1 if any row breaks them.')
+    parser.add_argument('--tolerance', type=float, default=None, help='largest accepted cost difference in USD (default: the rounding bound of every row)')
+    parser.add_argument('--out', default=None, help='.csv or .json file to write every reported row (rounding drift included) to')
+    parser.add_argument('--show', type=int, default=20, help='number of mismatching rows to print (default 20)')
+    args = parser.parse_args()
+    catalog = load_catalog()
+    found = audit_catalog(catalog, args.tolerance)
+    broken = is_mismatch(found['problems'])
+    print('Audited {} rows: {} break the pricing rules, {} more differ by rounding only'.format(len(catalog['columns']['cost']), broken.sum(), len(broken) - broken.sum()))
+    summary = summarize(found)
+    for (vendor, problem), (rows, largest) in sorted(summary.items()):
+        if problem != PROBLEMS[DRIFT]:
+            print('   {}: {} row(s) - {} (largest cost difference {} USD)'.format(vendor, rows, problem, round(largest, 2)))
+    drift = sorted((vendor, rows, largest) for (vendor, problem), (rows, largest) in summary.items() if problem == PROBLEMS[DRIFT])
+    if drift:
+        print('Rounding drift (not a mismatch): ' + ', '.join('{} {} row(s) up to {} USD'.format(vendor, rows, round(largest, 2)) for vendor, rows, largest in drift))
+    mismatches = {name: values[broken] for name, values in found.items()}
+    for position in range(min(args.show, len(mismatches['row']))):
+        print('   {} line {}: {} ({}) cost {} expected {} difference {} - {}'.format(mismatches['vendor'][position], mismatches['line'][position], mismatches['products'][position],
+        mismatches['i_d'][position], mismatches['cost'][position], round(mismatches['expected'][position], 4), round(mismatches['difference'][position], 4), mismatches['problems'][position]))
+    if args.out:
+        import pandas as pd
+        from batch_scoring import write_results
+        write_results(pd.DataFrame(found), args.out)
+    sys.exit(1 if len(mismatches['row']) else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""
+Vendor pricing rules and a vectorized scenario generator built from them.
+
+The vendor .csv files enumerate every ordered product acquisition scenario (permutation) for 0-3 devices and 0-3 instruments,
+and every cost in them follows from the prices and discounts below. generate_scenarios() rebuilds those scenario tables
+straight from the rules with NumPy, for any unit ceiling, without writing any .csv:
+- V2, V3 and V4: every device slot holds one of the vendor's devices or '0', every instrument slot holds the vendor's instrument or '0'
+- V1: every instrument slot holds Instrument_A, Instrument_B, Instrument_C or '0', and the device slot next to it holds the bundled device (V1_BUNDLES)
+- V1 instruments are discounted by their rank among the selected instruments: the 2nd is priced with DISCOUNT1_RATES,
+  the 3rd (and, for unit ceilings above 3, every later one) with DISCOUNT2_RATES
+
+Rows are produced in chunks, so enumerations far larger than memory can be streamed.
+"""
+
+import numpy as np
+
+PRODUCT2COST = {'Device_A': 0,
+'Device_B': 0,
+'Instrument_A': 734056,
+'Instrument_B': 1014836,
+'Instrument_C': 1155106,
+'Device_C': 680128,
+'Device_D': 151903,
+'Instrument_D': 323563,
+'Device_E': 652534,
+'Device_F': 416411,
+'Instrument_E': 984185,
+'Device_G': 440423,
+'Device_H': 244368,
+'Instrument_F': 418311,
+'0': 0} # the value for each key corresponds to each product's acquisition cost in USD
+
+DISCOUNT1_RATES = {'Instrument_A': .9639,
+'Instrument_B': .95886,
+'Instrument_C': .95555} # share of the list price paid for the second V1 instrument
+
+DISCOUNT2_RATES = {'Instrument_A': .9278,
+'Instrument_B': .91772,
+'Instrument_C': .91109} # share of the list price paid for the third V1 instrument
+
+VENDOR_DEVICES = {'V1': ['Device_A', 'Device_B'],
+'V2': ['Device_C', 'Device_D'],
+'V3': ['Device_E', 'Device_F'],
+'V4': ['Device_G', 'Device_H']}
+
+VENDOR_INSTRUMENTS = {'V1': ['Instrument_A', 'Instrument_B', 'Instrument_C'],
+'V2': ['Instrument_D'],
+'V3': ['Instrument_E'],
+'V4': ['Instrument_F']}
+
+V1_BUNDLES = {'Instrument_A': 'Device_A',
+'Instrument_B': 'Device_B',
+'Instrument_C': 'Device_B'} # V1 only sells each instrument together with this device
+
+PRODUCTS = [name for name in PRODUCT2COST if name != '0'] # column order of the tier count matrices
+
+V1_INSTRUMENT_SUFFIX = ' laser' # v1.csv labels the V1 instruments 'Instrument_A laser' etc.
+
+DEFAULT_CHUNK_ROWS = 1 << 20
+
+def discount_tables(product2cost=None, discount1_rates=None, discount2_rates=None):
+    """
+    Returns the discounted V1 instrument prices used by user_input_cost:
+        (dict) discount1 - discounted values of V1 I2 instruments
+        (dict) discount2 - discounted values of V1 I3 instruments
+    """
+    product2cost = PRODUCT2COST if product2cost is None else product2cost
+    discount1_rates = DISCOUNT1_RATES if discount1_rates is None else discount1_rates
+    discount2_rates = DISCOUNT2_RATES if discount2_rates is None else discount2_rates
+    discount1 = {name: product2cost.get(name) * rate for name, rate in discount1_rates.items()}
+    discount1['0'] = 0
+    discount2 = {name: product2cost.get(name) * rate for name, rate in discount2_rates.items()}
+    return discount1, discount2
+
+def slot_columns(max_units):
+    # column names of the product slots for a given unit ceiling, e.g. I1, I2, I3, D1, D2, D3
+    return ['I' + str(n) for n in range(1, max_units + 1)] + ['D' + str(n) for n in range(1, max_units + 1)]
+
+def slot_choices(vendor):
+    """
+    Returns the values a single slot can take for vendor, with '0' (no product) last:
+        (list) instrument_choices - names allowed in an instrument slot
+        (list) device_choices - names allowed in a device slot (empty for V1, whose devices follow V1_BUNDLES)
+    """
+    instrument_choices = VENDOR_INSTRUMENTS[vendor] + ['0']
+    device_choices = [] if vendor == 'V1' else VENDOR_DEVICES[vendor] + ['0']
+    return instrument_choices, device_choices
+
+def count_scenarios(vendor, max_units=3):
+    # number of ordered scenarios generate_scenarios will produce for vendor
+    instrument_choices, device_choices = slot_choices(vendor)
+    total = len(instrument_choices) ** max_units
+    if device_choices:
+        total *= len(device_choices) ** max_units
+    return total
+
+def slot_digits(num_choices, max_units):
+    # every combination of max_units slots with num_choices values each, first slot most significant: shape (num_choices ** max_units, max_units)
+    return np.indices((num_choices,) * max_units, dtype=np.int8).reshape(max_units, -1).T
+
+def instrument_table(vendor, max_units, product2cost, discount1_rates, discount2_rates):
+    """
+    Enumerates the instrument slots of vendor on their own.
+
+    Returns:
+        (np.ndarray) digits - choice index of every instrument slot, one row per combination
+        (np.ndarray) num_i - number of instruments in each combination
+        (np.ndarray) cost - instrument cost of each combination, including the V1 rank discounts
+    """
+    instrument_choices, _ = slot_choices(vendor)
+    zero = len(instrument_choices) - 1
+    digits = slot_digits(len(instrument_choices), max_units)
+    selected = digits != zero
+    price = np.array([product2cost.get(name) for name in instrument_choices], dtype=np.float64)
+    cost = np.zeros(len(digits), dtype=np.float64)
+    if vendor == 'V1':
+        discount1, discount2 = discount_tables(product2cost, discount1_rates, discount2_rates)
+        price1 = np.array([discount1.get(name) for name in instrument_choices], dtype=np.float64)
+        price2 = np.array([discount2.get(name, 0) for name in instrument_choices], dtype=np.float64)
+        rank = np.cumsum(selected, axis=1) # position of each instrument among the selected ones
+        for slot in range(max_units):
+            choice = digits[:, slot]
+            cost += np.where(rank[:, slot] <= 1, price[choice], np.where(rank[:, slot] == 2, price1[choice], price2[choice]))
+    else:
+        for slot in range(max_units):
+            cost += price[digits[:, slot]]
+    return digits, np.count_nonzero(selected, axis=1), cost
+
+def device_table(vendor, max_units, product2cost):
+    # same as instrument_table for the device slots; V1 devices follow the instruments, so V1 gets a single empty combination
+    _, device_choices = slot_choices(vendor)
+    if not device_choices:
+        return np.zeros((1, 0), dtype=np.int8), np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.float64)
+    digits = slot_digits(len(device_choices), max_units)
+    price = np.array([product2cost.get(name) for name in device_choices], dtype=np.float64)
+    cost = np.zeros(len(digits), dtype=np.float64)
+    for slot in range(max_units):
+        cost += price[digits[:, slot]]
+    return digits, np.count_nonzero(digits != len(device_choices) - 1, axis=1), cost
+
+def generate_scenarios(vendor, max_units=3, chunk_rows=DEFAULT_CHUNK_ROWS, with_products=True, product2cost=None, discount1_rates=None, discount2_rates=None):
+    """
+    Enumerates every ordered scenario of vendor with 0 to max_units devices and 0 to max_units instruments.
+    The instrument slots and the device slots are enumerated separately, and a chunk of scenarios is the Cartesian product
+    of a block of instrument combinations with all device combinations, so costs are a broadcast sum of the two tables.
+    Rows come out in the order of the vendor .csv files: first instrument slot most significant, last device slot least significant.
+
+    Yields:
+        (dict) chunk - {column name: np.ndarray} with 'vendor', the slot columns (only if with_products), 'i_d' and 'cost'
+    """
+    product2cost = PRODUCT2COST if product2cost is None else product2cost
+    discount1_rates = DISCOUNT1_RATES if discount1_rates is None else discount1_rates
+    discount2_rates = DISCOUNT2_RATES if discount2_rates is None else discount2_rates
+    instrument_choices, device_choices = slot_choices(vendor)
+    instrument_digits, num_i, instrument_cost = instrument_table(vendor, max_units, product2cost, discount1_rates, discount2_rates)
+    device_digits, num_d, device_cost = device_table(vendor, max_units, product2cost)
+    instrument_names = np.array(instrument_choices)
+    if vendor == 'V1':
+        bundled_names = np.array([V1_BUNDLES.get(name, '0') for name in instrument_choices])
+        num_d = None # V1 buys one device per instrument
+    else:
+        device_names = np.array(device_choices)
+    code_table = np.array([[str(i) + '_' + str(d) for d in range(max_units + 1)] for i in range(max_units + 1)])
+    columns = slot_columns(max_units)
+    num_devices = len(device_cost)
+    block = max(1, chunk_rows // num_devices) # instrument combinations per chunk
+    for start in range(0, len(instrument_cost), block):
+        stop = min(start + block, len(instrument_cost))
+        rows = (stop - start) * num_devices
+        chunk = {'vendor': np.full(rows, vendor)}
+        if with_products:
+            for slot in range(max_units):
+                chunk[columns[slot]] = np.repeat(instrument_names[instrument_digits[start:stop, slot]], num_devices)
+            for slot in range(max_units):
+                if vendor == 'V1':
+                    chunk[columns[max_units + slot]] = bundled_names[instrument_digits[start:stop, slot]]
+                else:
+                    chunk[columns[max_units + slot]] = np.tile(device_names[device_digits[:, slot]], stop - start)
+        if num_d is None:
+            chunk['i_d'] = code_table[num_i[start:stop], num_i[start:stop]]
+        else:
+            chunk['i_d'] = code_table[num_i[start:stop, None], num_d[None, :]].ravel()
+        chunk['cost'] = (device_cost[None, :] + instrument_cost[start:stop, None]).ravel() # devices first, then instruments, as in user_input_cost
+        yield chunk
+
+def generate_catalog(max_units=3, vendors=None, with_products=True, product2cost=None, discount1_rates=None, discount2_rates=None):
+    """
+    Builds an in-memory scenario catalog from the pricing rules, in the same layout as scenario_catalog.load_catalog,
+    so that it can be indexed and reported on like the .csv catalog.
+
+    Returns:
+        (dict) catalog - 'columns', 'vendor_slices' and 'sources' (which records the unit ceiling instead of a file)
+    """
+    if vendors is None:
+        vendors = list(VENDOR_INSTRUMENTS)
+    parts = []
+    vendor_slices = {}
+    sources = {}
+    start = 0
+    for vendor in vendors:
+        chunks = list(generate_scenarios(vendor, max_units, with_products=with_products, product2cost=product2cost, discount1_rates=discount1_rates, discount2_rates=discount2_rates))
+        stop = start + sum(len(chunk['cost']) for chunk in chunks)
+        parts.extend(chunks)
+        vendor_slices[vendor] = (start, stop)
+        sources[vendor] = {'generated': True, 'max_units': max_units}
+        start = stop
+    columns = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+    return {'columns': columns, 'vendor_slices': vendor_slices, 'sources': sources}
+
+def price_scenarios(vendors, device_slots, instrument_slots, product2cost=None, discount1_rates=None, discount2_rates=None):
+    """
+    Vectorized user_input_cost for many scenarios at once.
+
+    V1 instruments are tiered by their rank among the selected instruments, as in tier_counts and generate_scenarios, so empty
+    slots ('0') may appear anywhere in a row; for left-aligned slots this is the user_input_cost rule.
+
+    input- vendors: array of vendor names, one per scenario
+           device_slots, instrument_slots: 2-D arrays of product names (one row per scenario, padded with '0')
+    output- np.ndarray of the total cost of every scenario (nan where a product name has no price)
+    """
+    product2cost = PRODUCT2COST if product2cost is None else product2cost
+    discount1, discount2 = discount_tables(product2cost, discount1_rates, discount2_rates)
+    vendors = np.asarray(vendors)
+    device_slots = np.asarray(device_slots, dtype=str).reshape(len(vendors), -1)
+    instrument_slots = np.asarray(instrument_slots, dtype=str).reshape(len(vendors), -1)
+    def lookup(slots, table, default=np.nan):
+        names, inverse = np.unique(slots, return_inverse=True)
+        prices = np.array([table.get(name, default) for name in names], dtype=np.float64)
+        return prices[inverse.reshape(slots.shape)]
+    device_cost = lookup(device_slots, product2cost)
+    instrument_cost = lookup(instrument_slots, product2cost)
+    v1 = vendors == 'V1'
+    if v1.any() and instrument_slots.shape[1] > 1: # V1: 2nd instrument priced with discount1, 3rd and later with discount2, by rank as in tier_counts
+        tier = np.clip(np.cumsum(instrument_slots != '0', axis=1) - 1, 0, 2)
+        tier_prices = [instrument_cost, lookup(instrument_slots, discount1), lookup(instrument_slots, dict(discount2, **{'0': 0}))]
+        instrument_cost = np.where(v1[:, None], np.choose(tier, tier_prices), instrument_cost)
+    cost = np.zeros(len(vendors), dtype=np.float64)
+    for slot in range(device_cost.shape[1]): # same order of addition as user_input_cost: devices first, then instruments
+        cost += device_cost[:, slot]
+    for slot in range(instrument_cost.shape[1]):
+        cost += instrument_cost[:, slot]
+    return cost
+
+def strip_labels(slots):
+    # product names of catalog slot values, without the ' laser' suffix of v1.csv
+    return np.char.replace(np.asarray(slots, dtype=str), V1_INSTRUMENT_SUFFIX, '')
+
+def tier_counts(vendors, device_slots, instrument_slots):
+    """
+    Linear form of the pricing rules: how many units of each product every scenario buys at each price tier.
+    The cost of every scenario is then counts[0] @ prices + counts[1] @ (prices * discount1 rates) + counts[2] @ (prices * discount2 rates).
+    Empty slots ('0') may appear anywhere in a row; V1 instruments are tiered by their rank among the selected instruments.
+
+    input- vendors, and 2-D arrays of device and instrument names (one row per scenario)
+    output- np.ndarray of shape (3, number of scenarios, len(PRODUCTS)): unit counts at list price, discount1 and discount2
+    """
+    vendors = np.asarray(vendors)
+    device_slots = strip_labels(device_slots).reshape(len(vendors), -1)
+    instrument_slots = strip_labels(instrument_slots).reshape(len(vendors), -1)
+    product_index = {name: column for column, name in enumerate(PRODUCTS)}
+    counts = np.zeros((3, len(vendors), len(PRODUCTS)), dtype=np.int16)
+    rows = np.arange(len(vendors))
+    v1 = vendors == 'V1'
+    rank = np.cumsum(instrument_slots != '0', axis=1)
+    for slots, is_instrument in ((device_slots, False), (instrument_slots, True)):
+        names, inverse = np.unique(slots, return_inverse=True)
+        unknown = [name for name in names if name != '0' and name not in product_index]
+        if unknown:
+            raise ValueError('no price for product(s) {}'.format(unknown))
+        columns = np.array([product_index.get(name, -1) for name in names])[inverse.reshape(slots.shape)]
+        for slot in range(slots.shape[1]):
+            selected = columns[:, slot] >= 0
+            if is_instrument:
+                tier = np.where(v1, np.clip(rank[:, slot] - 1, 0, 2), 0) # V1: 1st instrument list price, 2nd discount1, later ones discount2
+            else:
+                tier = np.zeros(len(vendors), dtype=np.intp)
+            counts[tier[selected], rows[selected], columns[selected, slot]] += 1 # each row appears once per slot, so plain fancy indexing is safe
+    return counts
+
+def rate_vectors(discount1_rates=None, discount2_rates=None):
+    # discount1 and discount2 rates as arrays over PRODUCTS (1.0 for products without a V1 discount)
+    discount1_rates = DISCOUNT1_RATES if discount1_rates is None else discount1_rates
+    discount2_rates = DISCOUNT2_RATES if discount2_rates is None else discount2_rates
+    rates1 = np.array([discount1_rates.get(name, 1.0) for name in PRODUCTS])
+    rates2 = np.array([discount2_rates.get(name, 1.0) for name in PRODUCTS])
+    return rates1, rates2
+
+def price_vector(product2cost=None):
+    # list prices as an array over PRODUCTS
+    product2cost = PRODUCT2COST if product2cost is None else product2cost
+    return np.array([product2cost.get(name) for name in PRODUCTS], dtype=np.float64)
+
+def catalog_tier_counts(catalog):
+    """
+    tier_counts of every row of a scenario catalog (from load_catalog or generate_catalog).
+    Raises ValueError if a vendor's rows buy a product the vendor does not sell: their tiers would be priced with another vendor's
+    product (pricing_audit.py lists such rows).
+    """
+    columns = catalog['columns']
+    instrument_columns = [name for name in columns if name[:1] == 'I' and name[1:].isdigit()]
+    device_columns = [name for name in columns if name[:1] == 'D' and name[1:].isdigit()]
+    counts = tier_counts(columns['vendor'], np.column_stack([columns[name] for name in device_columns]), np.column_stack([columns[name] for name in instrument_columns]))
+    for vendor, (start, stop) in catalog['vendor_slices'].items():
+        offered = set(VENDOR_DEVICES.get(vendor, []) + VENDOR_INSTRUMENTS.get(vendor, []))
+        bought = counts[:, start:stop].any(axis=(0, 1))
+        foreign = [name for column, name in enumerate(PRODUCTS) if bought[column] and name not in offered]
+        if foreign:
+            raise ValueError('catalog rows of {} buy product(s) {} that {} does not sell'.format(vendor, foreign, vendor))
+    return counts
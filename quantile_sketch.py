@@ -0,0 +1,237 @@
+"""
+Out-of-core percentiles with mergeable KLL quantile sketches.
+
+build_cost_index() needs every scenario cost in memory. build_sketches() instead reads the vendor .csv files in chunks and keeps one
+KLL sketch (Karnin, Lang & Liberty 2016) per level of the cost index:
+    (None, None) - all vendors, all scenarios
+    (vendor, None) - all scenarios of one vendor
+    (None, i_d) - all vendors, given the 'i_d' code
+    (vendor, i_d) - one vendor, given the 'i_d' code
+A sketch keeps a few hundred costs, whatever the number of scenarios, spread over levels: a cost kept at level h stands for 2^h scenarios.
+When a level outgrows its capacity it is sorted and every other cost is promoted to the next level. sketch_percentile() answers the
+data_report percentile (share of scenarios costing less than or equal to the score) within epsilon * 100 percentile points for every
+score at once, with high probability; a sketch that never had to compact (fewer scenarios than its capacity) is exact.
+
+Sketches are plain dictionaries of NumPy arrays. merge_sketches() combines sketches built from different files or by different
+worker processes into one with the same error bound, and sketches_to_json()/sketches_from_json() move them between processes.
+
+Usage:
+    python quantile_sketch.py build sketches.json [--epsilon 0.01] [--chunk-rows 1000000] [V1=v1.csv V2=v2.csv ...]
+    python quantile_sketch.py merge merged.json part1.json part2.json ...
+    python quantile_sketch.py query sketches.json V2 --num-d 2 --num-i 1 --cost 1155594
+"""
+
+import argparse
+import json
+import math
+
+import numpy as np
+
+from cost_index import scenario_code
+from scenario_catalog import ALL_POSSIBLE_OUTCOMES, COLUMN_ALIASES
+
+DEFAULT_EPSILON = 0.01 # target rank error, as a share of the number of scenarios
+ERROR_FACTOR = 4.0 # the largest KLL rank error over all queries of a sketch stays within ERROR_FACTOR / k with high probability
+CAPACITY_DECAY = 2 / 3 # each level below the top holds 2/3 of the level above it
+MIN_CAPACITY = 8
+DEFAULT_CHUNK_ROWS = 1 << 20
+
+def sketch_size(epsilon=DEFAULT_EPSILON):
+    # capacity k of the top level that keeps the rank error within epsilon
+    return max(MIN_CAPACITY, int(math.ceil(ERROR_FACTOR / epsilon)))
+
+def new_sketch(k, seed=0):
+    """
+    input- capacity of the top level (see sketch_size) and a seed for the choice of the promoted costs
+    output- empty sketch: {'k', 'seed', 'n' (number of scenarios), 'compactions', 'min', 'max', 'levels' (list of np.ndarray)}
+    """
+    return {'k': k, 'seed': seed, 'n': 0, 'compactions': 0, 'min': np.inf, 'max': -np.inf, 'levels': [np.empty(0, dtype=np.float64)]}
+
+def level_capacity(sketch, level):
+    # number of costs level may hold before it is compacted; lower levels hold fewer
+    height = len(sketch['levels'])
+    return max(2, int(math.ceil(sketch['k'] * CAPACITY_DECAY ** (height - 1 - level))))
+
+def compact(sketch, level):
+    # sorts level and promotes every other cost to the level above; with an odd count one cost stays behind
+    values = np.sort(sketch['levels'][level])
+    leftover = values[:len(values) % 2]
+    values = values[len(values) % 2:]
+    offset = int(np.random.default_rng([sketch['seed'], sketch['compactions']]).integers(2)) # random offset keeps the rank estimates unbiased
+    sketch['compactions'] += 1
+    if level + 1 == len(sketch['levels']):
+        sketch['levels'].append(np.empty(0, dtype=np.float64))
+    sketch['levels'][level] = leftover
+    sketch['levels'][level + 1] = np.concatenate((sketch['levels'][level + 1], values[offset::2]))
+
+def compress(sketch):
+    # compacts levels, lowest first, until every level fits its capacity
+    level = 0
+    while level < len(sketch['levels']):
+        if len(sketch['levels'][level]) > level_capacity(sketch, level):
+            compact(sketch, level)
+            level = 0 # adding a level lowers the capacity of all levels below it
+        else:
+            level += 1
+    return sketch
+
+def update_sketch(sketch, costs):
+    # adds a batch of costs to the sketch
+    costs = np.asarray(costs, dtype=np.float64).ravel()
+    if len(costs) == 0:
+        return sketch
+    sketch['n'] += len(costs)
+    sketch['min'] = min(sketch['min'], float(costs.min()))
+    sketch['max'] = max(sketch['max'], float(costs.max()))
+    sketch['levels'][0] = np.concatenate((sketch['levels'][0], costs))
+    return compress(sketch)
+
+def merge_sketches(sketch, other):
+    # sketch of the scenarios of both sketches; other is left unchanged
+    if sketch['k'] != other['k']:
+        raise ValueError('cannot merge sketches of different sizes ({} and {})'.format(sketch['k'], other['k']))
+    merged = {'k': sketch['k'], 'seed': sketch['seed'], 'n': sketch['n'] + other['n'], 'compactions': sketch['compactions'] + other['compactions'],
+    'min': min(sketch['min'], other['min']), 'max': max(sketch['max'], other['max']), 'levels': []}
+    for level in range(max(len(sketch['levels']), len(other['levels']))):
+        parts = [levels[level] for levels in [sketch['levels'], other['levels']] if level < len(levels)]
+        merged['levels'].append(np.concatenate(parts))
+    return compress(merged)
+
+def sketch_rank(sketch, score):
+    # estimated number of scenarios costing less than or equal to score (score may be an array)
+    score = np.asarray(score, dtype=np.float64)
+    rank = np.zeros(score.shape)
+    for level, values in enumerate(sketch['levels']):
+        if len(values):
+            rank = rank + np.searchsorted(np.sort(values), score, side='right') * 2.0 ** level
+    return rank
+
+def sketch_percentile(sketch, score):
+    """
+    Estimated percentile of score, as cost_index.percentile_weak: the share of scenarios costing less than or equal to score, times 100.
+    Scores below the lowest or above the highest cost are exact (0 and 100); an empty sketch gives nan.
+    """
+    score = np.asarray(score, dtype=np.float64)
+    if sketch is None or sketch['n'] == 0:
+        perct = np.full(score.shape, np.nan)
+    else:
+        rank = np.clip(sketch_rank(sketch, score), 0, sketch['n'])
+        rank = np.where(score < sketch['min'], 0, np.where(score >= sketch['max'], sketch['n'], rank))
+        perct = np.where(np.isnan(score), np.nan, rank * (100.0 / sketch['n']))
+    if perct.ndim == 0:
+        return perct[()]
+    return perct
+
+def read_chunks(path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    # yields the 'i_d' codes and costs of a vendor .csv, chunk_rows rows at a time
+    import pandas as pd # only needed to parse the .csv files
+    for chunk in pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_rows):
+        chunk = chunk.rename(columns=lambda name: COLUMN_ALIASES.get(name.strip(), name.strip()))
+        if 'i_d' not in chunk.columns or 'cost' not in chunk.columns:
+            raise ValueError('{} is missing the i_d or cost column'.format(path))
+        yield chunk['i_d'].to_numpy(dtype=str), chunk['cost'].to_numpy(dtype=np.float64)
+
+def update_sketches(sketches, k, vendor, codes, costs, seed=0):
+    # adds a chunk of one vendor's scenarios to every level it belongs to
+    def sketch_for(key):
+        if key not in sketches:
+            sketches[key] = new_sketch(k, seed + len(sketches))
+        return sketches[key]
+    update_sketch(sketch_for((None, None)), costs)
+    update_sketch(sketch_for((vendor, None)), costs)
+    groups, inverse = np.unique(codes, return_inverse=True)
+    order = np.argsort(inverse, kind='stable')
+    bounds = np.searchsorted(inverse[order], np.arange(len(groups) + 1))
+    for code, start, stop in zip(groups.tolist(), bounds[:-1], bounds[1:]):
+        group_costs = costs[order[start:stop]]
+        update_sketch(sketch_for((None, code)), group_costs)
+        update_sketch(sketch_for((vendor, code)), group_costs)
+    return sketches
+
+def build_sketches(outcomes=None, epsilon=DEFAULT_EPSILON, chunk_rows=DEFAULT_CHUNK_ROWS, seed=0):
+    """
+    input- {vendor: path of its .csv} (default ALL_POSSIBLE_OUTCOMES), target rank error, rows read per chunk and random seed
+    output- dictionary {(vendor or None, i_d or None): sketch}, keyed like the cost index
+    Only one chunk of each file is in memory at a time.
+    """
+    if outcomes is None:
+        outcomes = ALL_POSSIBLE_OUTCOMES
+    k = sketch_size(epsilon)
+    sketches = {}
+    for vendor, path in outcomes.items():
+        for codes, costs in read_chunks(path, chunk_rows):
+            update_sketches(sketches, k, vendor, codes, costs, seed)
+    return sketches
+
+def merge_sketch_sets(sketches, other):
+    # combines two sets of sketches (e.g. built from different files or by different processes) level by level
+    merged = dict(sketches)
+    for key, sketch in other.items():
+        merged[key] = merge_sketches(merged[key], sketch) if key in merged else sketch
+    return merged
+
+def sketch_percentiles(sketches, sum_cost, vendor, num_d, num_i):
+    """
+    report_percentiles from sketches instead of the cost index:
+    the percentile of sum_cost relative to all scenarios, to vendor, to num_d/num_i, and to vendor and num_d/num_i
+    """
+    code = scenario_code(num_d, num_i)
+    keys = [(None, None), (vendor, None), (None, code), (vendor, code)]
+    return tuple(sketch_percentile(sketches.get(key), sum_cost) for key in keys)
+
+def sketches_to_json(sketches):
+    # JSON-ready form of a set of sketches; keys become 'vendor|i_d' with '' for None
+    return {'{}|{}'.format(vendor or '', code or ''): dict(sketch, levels=[values.tolist() for values in sketch['levels']]) for (vendor, code), sketch in sketches.items()}
+
+def sketches_from_json(data):
+    # inverse of sketches_to_json
+    sketches = {}
+    for key, sketch in data.items():
+        vendor, code = key.split('|')
+        sketches[(vendor or None, code or None)] = dict(sketch, levels=[np.array(values, dtype=np.float64) for values in sketch['levels']])
+    return sketches
+
+def read_sketches(path):
+    with open(path) as f:
+        return sketches_from_json(json.load(f))
+
+def write_sketches(sketches, path):
+    with open(path, 'w') as f:
+        json.dump(sketches_to_json(sketches), f)
+
+def main():
+    parser = argparse.ArgumentParser(description='Percentiles of very large scenario catalogs from streaming quantile sketches.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='sketch vendor .csv files chunk by chunk')
+    build.add_argument('out', help='JSON file to write the sketches to')
+    build.add_argument('files', nargs='*', help='VENDOR=path pairs (default: the files of ALL_POSSIBLE_OUTCOMES)')
+    build.add_argument('--epsilon', type=float, default=DEFAULT_EPSILON, help='target rank error as a share of the scenarios (default 0.01)')
+    build.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+    build.add_argument('--seed', type=int, default=0)
+    merge = commands.add_parser('merge', help='combine sketch files built from different files or processes')
+    merge.add_argument('out')
+    merge.add_argument('parts', nargs='+')
+    query = commands.add_parser('query', help='the four data_report percentiles of a cost')
+    query.add_argument('sketches')
+    query.add_argument('vendor')
+    query.add_argument('--num-d', type=int, required=True)
+    query.add_argument('--num-i', type=int, required=True)
+    query.add_argument('--cost', type=float, required=True)
+    args = parser.parse_args()
+    if args.command == 'build':
+        outcomes = dict(pair.split('=', 1) for pair in args.files) if args.files else None
+        sketches = build_sketches(outcomes, args.epsilon, args.chunk_rows, args.seed)
+        write_sketches(sketches, args.out)
+        print('Sketched {} scenarios into {} sketches in {}'.format(sketches[(None, None)]['n'], len(sketches), args.out))
+    elif args.command == 'merge':
+        sketches = {}
+        for path in args.parts:
+            sketches = merge_sketch_sets(sketches, read_sketches(path))
+        write_sketches(sketches, args.out)
+        print('Merged {} sketch files into {}'.format(len(args.parts), args.out))
+    else:
+        percentiles = sketch_percentiles(read_sketches(args.sketches), args.cost, args.vendor, args.num_d, args.num_i)
+        print(json.dumps({'percentiles': [None if np.isnan(percentile) else float(percentile) for percentile in percentiles]}))
+
+if __name__ == "__main__":
+    main()
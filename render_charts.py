@@ -0,0 +1,117 @@
+"""
+Headless rendering of the forecast histograms to image files.
+
+Usage:
+    python render_charts.py scenarios.csv charts/ [--format svg] [--workers 8]
+
+The scenarios file has the same layout as for batch_scoring.py. Every scenario is scored once, then hist_1 to hist_4 are
+rendered for it with the non-interactive Agg backend, and hist_5 (which is the same for every scenario) is rendered once.
+Charts are rendered in parallel in a process pool. Each worker process creates a single figure and clears and reuses its axes
+for every chart it draws, instead of building a new figure per chart.
+"""
+
+import matplotlib
+matplotlib.use('Agg') # must be selected before RFI_Expense_Forecast imports pyplot
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib.pyplot as plt
+import pandas as pd
+
+import RFI_Expense_Forecast as forecast
+from batch_scoring import read_scenarios, score_scenarios
+from cost_index import get_cost_index
+from scenario_catalog import load_catalog
+
+FIGURE_SIZE = (6.4, 4.8)
+DPI = 100
+
+_FIGURE = None # figure and axes of this process, created by get_axes on first use
+_AXES = None
+
+def get_axes():
+    # the process-wide figure, with its axes cleared for the next chart
+    global _FIGURE, _AXES
+    if _FIGURE is None:
+        _FIGURE, _AXES = plt.subplots(figsize=FIGURE_SIZE, dpi=DPI)
+    else:
+        _AXES.clear()
+    return _FIGURE, _AXES
+
+def product_list(scenario):
+    # products in the order data_report lists them: devices first, then instruments
+    names = scenario['devices'].split(';') + scenario['instruments'].split(';')
+    return [name for name in names if name]
+
+def chart_jobs(results, out_dir, fmt):
+    """
+    input- scored scenarios (see batch_scoring.score_scenarios), output folder and image format
+    output- list of (chart number, scenario dictionary or None, output path) for every chart to render
+    Scenarios that could not be priced are skipped, and so are hist_3/hist_4 when no catalog scenario has the same unit counts.
+    """
+    jobs = [(5, None, os.path.join(out_dir, 'hist_5.' + fmt))]
+    for row, scenario in enumerate(results.to_dict('records')):
+        if scenario['error']:
+            continue
+        for number in [1, 2, 3, 4]:
+            if pd.isna(scenario['percentile' + str(number)]):
+                continue
+            jobs.append((number, scenario, os.path.join(out_dir, 'scenario_{:05d}_hist_{}.{}'.format(row, number, fmt))))
+    return jobs
+
+def render_chart(job):
+    # draws one chart on the reused figure of this process and saves it
+    number, scenario, path = job
+    fig, ax = get_axes()
+    if number == 5:
+        cost_vendor, cost_v1, cost_v2, cost_v3, cost_v4 = forecast.get_sorted_costs('V1', 0, 0)[:5]
+        forecast.hist_5(cost_v1, cost_v2, cost_v3, cost_v4, ax=ax)
+    else:
+        vendor = scenario['vendor']
+        num_d = scenario['num_d']
+        num_i = scenario['num_i']
+        sum_cost = scenario['cost']
+        percentile = int(scenario['percentile' + str(number)])
+        products = product_list(scenario)
+        cost_vendor, cost_v1, cost_v2, cost_v3, cost_v4, cost_list, filtered_cost_list, filtered_vendor_cost_list = forecast.get_sorted_costs(vendor, num_d, num_i)
+        if number == 1:
+            forecast.hist_1(sum_cost, cost_list, percentile, products, ax=ax)
+        elif number == 2:
+            forecast.hist_2(cost_vendor, vendor, sum_cost, percentile, products, ax=ax)
+        elif number == 3:
+            forecast.hist_3(filtered_cost_list, num_d, num_i, sum_cost, percentile, products, ax=ax)
+        else:
+            forecast.hist_4(filtered_vendor_cost_list, vendor, sum_cost, percentile, num_d, num_i, products, ax=ax)
+    fig.savefig(path)
+    return path
+
+def render_charts(results, out_dir, fmt='png', workers=None):
+    """
+    Renders every chart of the scored scenarios into out_dir, in parallel unless workers == 1.
+
+    Returns:
+        (list) paths - paths of the written image files
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = chart_jobs(results, out_dir, fmt)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return [render_chart(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(render_chart, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+def main():
+    parser = argparse.ArgumentParser(description='Render the forecast histograms of many scenarios to image files, without a display.')
+    parser.add_argument('scenarios', help='.csv or .json file of scenarios (vendor, devices, instruments)')
+    parser.add_argument('out_dir', help='folder to write the charts to')
+    parser.add_argument('--format', default='png', choices=['png', 'svg'], help='image format (default png)')
+    parser.add_argument('--workers', type=int, default=None, help='number of rendering processes (default: one per CPU)')
+    args = parser.parse_args()
+    results = score_scenarios(read_scenarios(args.scenarios), get_cost_index(load_catalog()))
+    paths = render_charts(results, args.out_dir, args.format, args.workers)
+    print('Rendered {} charts into {}'.format(len(paths), args.out_dir))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Persistent cache of scenario reports, with size-bounded LRU eviction.
+
+A report is everything the interactive forecast computes for one scenario: the user_input_cost price, the four data_report
+percentiles, the scenario counts it prints, the bins of hist_1 to hist_4 (see histogram_bins.compute_bins) and the five charts as
+image files. cached_report() looks a scenario up in CACHE_DIR first and only computes and renders it on a miss.
+
+Entries are keyed on
+- the canonical signature of the scenario: vendor, ranking (with the cash flow settings for NPV ranking), and the sorted multiset
+  of its devices and of its instruments. V1 instruments keep their order, because the V1 discounts depend on the rank of each instrument.
+- the version of the catalog: the content hashes of the vendor .csv files (see scenario_catalog.py) and the prices, V1 discounts and
+  bundles in force (pricing_rules.py, or catalog['pricing'] after repricing.py).
+Any change of a .csv or of a price changes the version, so stale entries are never answered; they are the first to be evicted.
+
+Every entry is a folder holding report.json and the chart files. A hit touches report.json, so its modification time is the time
+of last use. After every write, evict() removes stale entries and then the least recently used ones until the cache holds at most
+max_bytes.
+
+Usage:
+    python report_cache.py V4 --devices Device_G,Device_G,Device_G --instruments Instrument_F,Instrument_F [--no-charts]
+    python report_cache.py --clear
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from cost_index import percentile_weak
+from forecast_core import get_sorted_costs, scenario_products, slots, user_input_cost
+from histogram_bins import compute_bins
+from pricing_rules import DISCOUNT1_RATES, DISCOUNT2_RATES, PRODUCT2COST, V1_BUNDLES
+from scenario_catalog import load_catalog
+
+CACHE_DIR = '.report_cache'
+DEFAULT_MAX_BYTES = 256 << 20
+REPORT_FORMAT = 2 # bump whenever the layout of report.json or of the charts changes
+CHART_FORMAT = 'png'
+FIGURE_SIZE = (6.4, 4.8)
+DPI = 100
+
+def scenario_signature(vendor, devices, instruments, rank_by='cost'):
+    # canonical text of a scenario: the same products in any order give the same signature, except for the order of V1 instruments
+    if vendor == 'V1':
+        devices = [V1_BUNDLES.get(name, '0') for name in instruments]
+    else:
+        instruments = sorted(instruments)
+    ranking = rank_by
+    if rank_by == 'npv':
+        from cash_flow import CASH_FLOW_DEFAULTS
+        ranking += json.dumps(CASH_FLOW_DEFAULTS, sort_keys=True)
+    return '{}|{}|D:{}|I:{}'.format(vendor, ranking, ','.join(sorted(devices)), ','.join(instruments))
+
+def catalog_version(catalog=None):
+    # hash of the catalog and pricing inputs every report depends on
+    if catalog is None:
+        catalog = load_catalog()
+    pricing = catalog.get('pricing', {'prices': PRODUCT2COST, 'discount1_rates': DISCOUNT1_RATES, 'discount2_rates': DISCOUNT2_RATES})
+    inputs = {'format': REPORT_FORMAT,
+    'sources': {vendor: source['sha256'] for vendor, source in catalog['sources'].items()},
+    'pricing': pricing,
+    'bundles': V1_BUNDLES}
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+
+def entry_name(signature, version):
+    # folder name of an entry: the version prefix lets evict() recognize stale entries without opening them
+    return '{}-{}'.format(version[:16], hashlib.sha256(signature.encode('utf-8')).hexdigest()[:32])
+
+def bins_to_json(bins):
+    if bins is None:
+        return None
+    return {name: value.tolist() if isinstance(value, np.ndarray) else value.item() if isinstance(value, np.generic) else value for name, value in bins.items()}
+
+def compute_report(vendor, devices, instruments, rank_by='cost'):
+    """
+    input- vendor, lists of device and instrument names (V1 devices follow the instrument bundles) and the ranking ('cost' or 'npv')
+    output- (report dictionary, the sorted cost arrays of get_sorted_costs for rendering the charts)
+    Raises ValueError if the scenario cannot be priced.
+    """
+    devices, instruments = scenario_products(vendor, devices, instruments)
+    D1, D2, D3 = slots(devices)
+    I1, I2, I3 = slots(instruments)
+    sum_cost = user_input_cost(D1, D2, D3, I1, I2, I3, vendor)
+    if rank_by == 'npv':
+        from cash_flow import scenario_npv
+        sum_cost = round(scenario_npv(D1, D2, D3, I1, I2, I3, vendor, sum_cost), 2)
+    num_d = len(devices)
+    num_i = len(instruments)
+    costs = get_sorted_costs(vendor, num_d, num_i, rank_by)
+    cost_vendor, cost_v1, cost_v2, cost_v3, cost_v4, cost_list, filtered_cost_list, filtered_vendor_cost_list = costs
+    compared = [cost_list, cost_vendor, filtered_cost_list, filtered_vendor_cost_list]
+    report = {'vendor': vendor,
+    'devices': devices,
+    'instruments': instruments,
+    'rank_by': rank_by,
+    'num_d': num_d,
+    'num_i': num_i,
+    'cost': sum_cost,
+    'product_list': [name for name in [D1, D2, D3, I1, I2, I3] if name != '0'],
+    'num_scenarios': len(cost_list),
+    'num_vendor_scenarios': len(cost_vendor),
+    'percentiles': [None if len(sorted_costs) == 0 else int(percentile_weak(sorted_costs, sum_cost)) for sorted_costs in compared],
+    'bins': {'hist_' + str(number + 1): bins_to_json(compute_bins(sorted_costs, sum_cost, is_sorted=True)) for number, sorted_costs in enumerate(compared)}}
+    return report, costs
+
+def render_charts(report, costs, folder, fmt=CHART_FORMAT):
+    # renders hist_1 to hist_5 of a report into folder, without pyplot or a display; returns {chart name: file name}
+    from matplotlib.figure import Figure
+    import RFI_Expense_Forecast as forecast
+    cost_vendor, cost_v1, cost_v2, cost_v3, cost_v4, cost_list, filtered_cost_list, filtered_vendor_cost_list = costs
+    sum_cost, vendor, num_d, num_i, products = report['cost'], report['vendor'], report['num_d'], report['num_i'], report['product_list']
+    percentile1, percentile2, percentile3, percentile4 = report['percentiles']
+    charts = {'hist_1': lambda ax: forecast.hist_1(sum_cost, cost_list, percentile1, products, ax=ax),
+    'hist_2': lambda ax: forecast.hist_2(cost_vendor, vendor, sum_cost, percentile2, products, ax=ax),
+    'hist_3': lambda ax: forecast.hist_3(filtered_cost_list, num_d, num_i, sum_cost, percentile3, products, ax=ax),
+    'hist_4': lambda ax: forecast.hist_4(filtered_vendor_cost_list, vendor, sum_cost, percentile4, num_d, num_i, products, ax=ax),
+    'hist_5': lambda ax: forecast.hist_5(cost_v1, cost_v2, cost_v3, cost_v4, ax=ax)}
+    files = {}
+    for name, draw in charts.items():
+        if name != 'hist_5' and report['bins'][name] is None:
+            continue
+        fig = Figure(figsize=FIGURE_SIZE, dpi=DPI)
+        draw(fig.subplots())
+        files[name] = name + '.' + fmt
+        fig.savefig(os.path.join(folder, files[name]))
+    return files
+
+def folder_size(folder):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, dirs, names in os.walk(folder) for name in names)
+
+def read_entry(folder):
+    # report of a cache entry, touched as most recently used, or None if the entry is missing or unreadable
+    path = os.path.join(folder, 'report.json')
+    try:
+        with open(path) as f:
+            report = json.load(f)
+        os.utime(path)
+    except (OSError, ValueError):
+        return None
+    report['charts'] = {name: os.path.join(folder, file_name) for name, file_name in report.get('charts', {}).items()}
+    return report
+
+def write_entry(cache_dir, name, report, costs, charts=True):
+    # writes an entry into a temporary folder and renames it into place, so readers never see a half-written entry
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_folder = os.path.join(cache_dir, '{}.tmp-{}'.format(name, os.getpid()))
+    shutil.rmtree(tmp_folder, ignore_errors=True)
+    os.makedirs(tmp_folder)
+    report = dict(report)
+    report['charts'] = render_charts(report, costs, tmp_folder) if charts else {}
+    with open(os.path.join(tmp_folder, 'report.json'), 'w') as f:
+        json.dump(report, f)
+    folder = os.path.join(cache_dir, name)
+    try:
+        os.replace(tmp_folder, folder)
+    except OSError: # another process wrote the same entry first
+        shutil.rmtree(tmp_folder, ignore_errors=True)
+    return folder
+
+def evict(cache_dir=CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, version=None):
+    """
+    Removes the entries of other versions than version, then the least recently used entries until the cache holds at most max_bytes.
+
+    Returns:
+        (int) removed - number of entries removed
+        (int) size - bytes held by the remaining entries
+    """
+    if not os.path.isdir(cache_dir):
+        return 0, 0
+    entries = []
+    removed = 0
+    for name in os.listdir(cache_dir):
+        folder = os.path.join(cache_dir, name)
+        if not os.path.isdir(folder) or '.tmp-' in name:
+            continue
+        if version is not None and not name.startswith(version[:16] + '-'):
+            shutil.rmtree(folder, ignore_errors=True)
+            removed += 1
+            continue
+        try:
+            last_use = os.path.getmtime(os.path.join(folder, 'report.json'))
+        except OSError:
+            last_use = 0.0 # incomplete entry: evicted first
+        entries.append((last_use, folder, folder_size(folder)))
+    entries.sort()
+    size = sum(entry_size for last_use, folder, entry_size in entries)
+    for last_use, folder, entry_size in entries:
+        if size <= max_bytes:
+            break
+        shutil.rmtree(folder, ignore_errors=True)
+        size -= entry_size
+        removed += 1
+    return removed, size
+
+def cached_report(vendor, devices, instruments, rank_by='cost', cache_dir=CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, charts=True):
+    """
+    Report of a scenario (see compute_report), answered from the cache when its signature and version are already there.
+    'charts' maps hist_1 to hist_5 to the paths of the chart files; 'cached' tells whether the report came from the cache.
+    """
+    version = catalog_version(load_catalog())
+    name = entry_name(scenario_signature(vendor, devices, instruments, rank_by), version)
+    report = read_entry(os.path.join(cache_dir, name))
+    if report is not None and (report['charts'] or not charts):
+        report['cached'] = True
+        return report
+    report, costs = compute_report(vendor, devices, instruments, rank_by)
+    try:
+        folder = write_entry(cache_dir, name, report, costs, charts)
+        evict(cache_dir, max_bytes, version)
+        cached = read_entry(folder)
+    except OSError:
+        cached = None # the cache is an optimization only; a read-only folder still gets its report
+    if cached is None:
+        report['charts'] = {}
+        cached = report
+    cached['cached'] = False
+    return cached
+
+def show_charts(report):
+    # shows the cached chart files of a report, one window after the other, like the interactive histograms
+    import matplotlib.pyplot as plt
+    for name in sorted(report['charts']):
+        plt.imshow(plt.imread(report['charts'][name]))
+        plt.axis('off')
+        plt.show()
+
+def clear_cache(cache_dir=CACHE_DIR):
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Report of one procurement scenario, answered from the persistent report cache when possible.')
+    parser.add_argument('vendor', nargs='?', choices=['V1', 'V2', 'V3', 'V4'])
+    parser.add_argument('--devices', default='', help='comma-separated devices (ignored for V1, whose devices follow the instrument bundles)')
+    parser.add_argument('--instruments', default='', help='comma-separated instruments')
+    parser.add_argument('--rank-by', default='cost', choices=['cost', 'npv'], help='compare scenarios by sticker cost (default) or by 5-year NPV')
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--max-mb', type=float, default=DEFAULT_MAX_BYTES / (1 << 20), help='size bound of the cache in MB')
+    parser.add_argument('--no-charts', action='store_true', help='do not render the chart files')
+    parser.add_argument('--clear', action='store_true', help='remove every cache entry')
+    args = parser.parse_args()
+    if args.clear:
+        clear_cache(args.cache_dir)
+        print('Cleared {}'.format(args.cache_dir))
+        return
+    if args.vendor is None:
+        parser.error('a vendor is required')
+    split = lambda value: [name.strip() for name in value.split(',') if name.strip()]
+    start = time.perf_counter()
+    report = cached_report(args.vendor, split(args.devices), split(args.instruments), args.rank_by, args.cache_dir, int(args.max_mb * (1 << 20)), not args.no_charts)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({name: report[name] for name in ['vendor', 'devices', 'instruments', 'cost', 'percentiles', 'charts', 'cached']}))
+    print('{} in {:.1f} ms'.format('cache hit' if report['cached'] else 'computed', elapsed * 1000))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Incremental repricing of the scenario catalog when one product's price or V1 discount changes.
+
+product_index() records, once per catalog, which rows buy each product and how many units they buy at each price tier
+(list price, discount1, discount2; see pricing_rules.tier_counts). reprice() then changes the cost of only those rows, by the
+unit counts times the change of each tier price, so a catalog cost keeps whatever it was in the .csv apart from the change.
+The sorted arrays of the cost index (see cost_index.py) are patched in place: the old costs of the changed rows are deleted and
+their new costs inserted at their np.searchsorted positions, which moves memory once instead of sorting every array again.
+
+The prices in force are kept with the catalog (catalog['pricing']), starting from PRODUCT2COST, DISCOUNT1_RATES and DISCOUNT2_RATES,
+so successive changes add up and a change can be undone by repricing back.
+reprice() changes the catalog it is given in place. load_catalog() hands every caller of the process the same catalog, so reprice
+a working_catalog() of it, as main() does, unless every later user of the process should see the new prices.
+
+Usage:
+    python repricing.py Instrument_E --change -0.04 [--vendor V3 --devices Device_E --instruments Instrument_E]
+
+reprices the catalog for a 4% cheaper Instrument_E and prints how the percentiles of the given scenario move.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from cost_index import get_cost_index, report_percentiles, scenario_code
+from forecast_core import parse_scenario
+from pricing_rules import DISCOUNT1_RATES, DISCOUNT2_RATES, PRODUCT2COST, PRODUCTS, catalog_tier_counts, price_scenarios
+from scenario_catalog import load_catalog
+
+def catalog_pricing(catalog):
+    # prices and V1 discount rates the catalog costs currently follow
+    if 'pricing' not in catalog:
+        catalog['pricing'] = {'prices': dict(PRODUCT2COST), 'discount1_rates': dict(DISCOUNT1_RATES), 'discount2_rates': dict(DISCOUNT2_RATES)}
+    return catalog['pricing']
+
+def working_catalog(catalog):
+    """
+    Returns a catalog that can be repriced without changing catalog: its own cost column, prices and cost indexes, sharing the
+    product columns and the product index (neither depends on the prices).
+    """
+    columns = dict(catalog['columns'])
+    columns['cost'] = catalog['columns']['cost'].copy()
+    columns.pop('npv', None)
+    copy = {'columns': columns, 'vendor_slices': catalog['vendor_slices'], 'sources': catalog['sources']}
+    if 'product_index' in catalog:
+        copy['product_index'] = catalog['product_index']
+    if 'pricing' in catalog:
+        copy['pricing'] = {name: dict(values) for name, values in catalog['pricing'].items()}
+    return copy
+
+def product_index(catalog):
+    """
+    Returns {product: (rows, counts)}, built once per catalog and kept alongside it:
+        (np.ndarray) rows - catalog rows that buy the product
+        (np.ndarray) counts - shape (3, len(rows)): units of the product each row buys at list price, discount1 and discount2
+    """
+    if 'product_index' not in catalog:
+        tiers = catalog_tier_counts(catalog)
+        index = {}
+        for column, name in enumerate(PRODUCTS):
+            rows = np.flatnonzero(tiers[:, :, column].any(axis=0))
+            index[name] = (rows, tiers[:, rows, column].astype(np.float64))
+        catalog['product_index'] = index
+    return catalog['product_index']
+
+def tier_prices(pricing, product):
+    # price of one unit of product at list price, discount1 and discount2
+    price = pricing['prices'][product]
+    return np.array([price, price * pricing['discount1_rates'].get(product, 1.0), price * pricing['discount2_rates'].get(product, 1.0)])
+
+def patch_sorted(sorted_costs, old_costs, new_costs):
+    """
+    Replaces the values old_costs by new_costs in the sorted array sorted_costs, in place, keeping it sorted.
+    old_costs must all be present in sorted_costs (duplicates once per occurrence).
+    """
+    if len(old_costs) == 0:
+        return sorted_costs
+    old_costs = np.sort(old_costs)
+    new_costs = np.sort(new_costs)
+    # position of every old cost; equal costs take consecutive positions
+    positions = np.searchsorted(sorted_costs, old_costs, side='left') + np.arange(len(old_costs)) - np.searchsorted(old_costs, old_costs, side='left')
+    kept = np.delete(sorted_costs, positions)
+    sorted_costs[:] = np.insert(kept, np.searchsorted(kept, new_costs, side='left'), new_costs)
+    return sorted_costs
+
+def patch_cost_index(index, catalog, rows, old_costs, new_costs):
+    # patches every level of a cost index for the changed rows
+    codes = catalog['columns']['i_d'][rows]
+    vendors = np.empty(len(rows), dtype=object)
+    for vendor, (start, stop) in catalog['vendor_slices'].items():
+        vendors[(rows >= start) & (rows < stop)] = vendor
+    patch_sorted(index[(None, None)], old_costs, new_costs)
+    for keys, make_key in [(vendors, lambda key: (key, None)), (codes, lambda key: (None, key)),
+    (np.char.add(np.char.add(vendors.astype(str), ' '), codes.astype(str)), lambda key: tuple(key.split(' ')))]:
+        for key in np.unique(keys):
+            group = keys == key
+            patch_sorted(index[make_key(str(key))], old_costs[group], new_costs[group])
+
+def reprice(catalog, product, price=None, discount1_rate=None, discount2_rate=None):
+    """
+    Changes the list price and/or the V1 discount rates of product, and updates the catalog costs and the 'cost' index incrementally.
+    The catalog is changed in place (see working_catalog).
+    Columns derived from the costs (the NPV column and its index, see cash_flow.py) are dropped and rebuilt on next use.
+
+    Returns:
+        (np.ndarray) rows - catalog rows whose cost changed
+        (np.ndarray) old_costs, new_costs - their costs before and after the change
+    """
+    if product not in PRODUCTS:
+        raise ValueError('no price for product {}'.format(product))
+    pricing = catalog_pricing(catalog)
+    before = tier_prices(pricing, product)
+    if price is not None:
+        pricing['prices'][product] = price
+    if discount1_rate is not None:
+        pricing['discount1_rates'][product] = discount1_rate
+    if discount2_rate is not None:
+        pricing['discount2_rates'][product] = discount2_rate
+    rows, counts = product_index(catalog)[product]
+    delta = (tier_prices(pricing, product) - before) @ counts
+    changed = delta != 0
+    rows = rows[changed]
+    costs = catalog['columns']['cost']
+    old_costs = costs[rows]
+    new_costs = old_costs + delta[changed]
+    costs[rows] = new_costs
+    index = catalog.get('cost_indexes', {}).get('cost')
+    if index is not None and len(rows):
+        patch_cost_index(index, catalog, rows, old_costs, new_costs)
+    if len(rows):
+        catalog['columns'].pop('npv', None)
+        catalog.pop('spend', None)
+        catalog.pop('sorted_rows', None) # row orders of nearest_alternatives.py, rebuilt on next use
+        catalog.get('cost_indexes', {}).pop('npv', None)
+    return rows, old_costs, new_costs
+
+def scenario_cost(catalog, vendor, devices, instruments):
+    # user_input_cost of a scenario under the prices the catalog currently follows
+    pricing = catalog_pricing(catalog)
+    width = max(3, len(devices), len(instruments))
+    return float(price_scenarios([vendor], [devices + ['0'] * (width - len(devices))], [instruments + ['0'] * (width - len(instruments))],
+    pricing['prices'], pricing['discount1_rates'], pricing['discount2_rates'])[0])
+
+def main():
+    parser = argparse.ArgumentParser(description='Reprice the scenario catalog for a change of one product price or V1 discount.')
+    parser.add_argument('product')
+    parser.add_argument('--change', type=float, default=None, help='relative change of the list price, e.g. -0.04 for 4%% cheaper')
+    parser.add_argument('--price', type=float, default=None, help='new list price in USD')
+    parser.add_argument('--discount1', type=float, default=None, help='new discount1 rate (V1 instruments)')
+    parser.add_argument('--discount2', type=float, default=None, help='new discount2 rate (V1 instruments)')
+    parser.add_argument('--vendor', default=None, help='vendor of a scenario to compare before and after the change')
+    parser.add_argument('--devices', default='', help='comma-separated devices of the scenario (ignored for V1)')
+    parser.add_argument('--instruments', default='', help='comma-separated instruments of the scenario')
+    args = parser.parse_args()
+    catalog = working_catalog(load_catalog())
+    index = get_cost_index(catalog)
+    price = args.price
+    if args.change is not None:
+        price = catalog_pricing(catalog)['prices'][args.product] * (1 + args.change)
+    if args.vendor:
+        devices, instruments = parse_scenario(parser, args.vendor, args.devices, args.instruments)
+    if args.vendor:
+        sum_cost = scenario_cost(catalog, args.vendor, devices, instruments)
+        percentiles = report_percentiles(index, sum_cost, args.vendor, len(devices), len(instruments))
+        print('Before: {} USD, percentiles {}'.format(round(sum_cost, 2), [int(percentile) for percentile in percentiles if not np.isnan(percentile)]))
+    start = time.perf_counter()
+    rows, old_costs, new_costs = reprice(catalog, args.product, price, args.discount1, args.discount2)
+    print('Repriced {} of {} scenarios in {:.3f} ms'.format(len(rows), len(catalog['columns']['cost']), (time.perf_counter() - start) * 1000))
+    if args.vendor:
+        sum_cost = scenario_cost(catalog, args.vendor, devices, instruments)
+        percentiles = report_percentiles(index, sum_cost, args.vendor, len(devices), len(instruments))
+        print('After: {} USD, percentiles {} (i_d {})'.format(round(sum_cost, 2), [int(percentile) for percentile in percentiles if not np.isnan(percentile)], scenario_code(len(devices), len(instruments))))
+
+if __name__ == "__main__":
+    main()
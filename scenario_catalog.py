@@ -0,0 +1,172 @@
+"""
+Shared scenario catalog for all four vendor proposals.
+
+Each vendor .csv in ALL_POSSIBLE_OUTCOMES lists every product acquisition scenario (permutation) for that vendor, but the files
+use different headers for the same information: D1/D2/D3 in v1.csv, s1/a1 in v2.csv and A1 in v3.csv.
+load_catalog() parses every file a single time per process, maps its columns onto CATALOG_COLUMNS and keeps the result as
+one NumPy array per column (a columnar catalog). A binary copy of every parsed file is written to CACHE_DIR as a .npz file,
+keyed on the source file's content hash, so that restarts and repeated sessions skip .csv parsing.
+
+The catalog is a dictionary:
+    'columns' - {column name: np.ndarray} holding the rows of all vendors, one vendor after the other
+    'vendor_slices' - {vendor: (start, stop)} row range of each vendor inside 'columns'
+    'sources' - {vendor: {'path', 'mtime_ns', 'size', 'sha256'}} description of the .csv each vendor was loaded from
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+ALL_POSSIBLE_OUTCOMES = {'V1': 'v1.csv',
+'V2': 'v2.csv',
+'V3': 'v3.csv',
+'V4': 'v4.csv'} # dictionary to contain one .csv file for each vendor, corresponding to all possible product acquisition scenarios (permutations)
+
+CATALOG_COLUMNS = ['vendor', 'I1', 'I2', 'I3', 'D1', 'D2', 'D3', 'i_d', 'cost'] # normalized schema shared by every vendor
+PRODUCT_COLUMNS = ['I1', 'I2', 'I3', 'D1', 'D2', 'D3']
+
+COLUMN_ALIASES = {'s1': 'I1', 's2': 'I2', 's3': 'I3',
+'a1': 'D1', 'a2': 'D2', 'a3': 'D3',
+'A1': 'D1', 'A2': 'D2', 'A3': 'D3'} # vendor-specific .csv headers and the catalog column each one corresponds to
+
+CACHE_DIR = '.catalog_cache'
+CACHE_FORMAT = 1 # bump whenever the layout of the cached .npz files changes
+
+_CATALOGS = {} # process-wide catalogs, keyed on the (vendor, path) pairs they were loaded from
+
+def file_signature(path):
+    """
+    Returns:
+        (int) mtime_ns - modification time of the file in nanoseconds
+        (int) size - size of the file in bytes
+    """
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+def file_hash(path):
+    # sha256 hex digest of the file contents, read in blocks so that large scenario files are never held in memory
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def parse_vendor_csv(path):
+    """
+    input- path of one vendor .csv
+    output- dictionary of NumPy arrays following CATALOG_COLUMNS
+    """
+    import pandas as pd # only needed when the cache is missing or out of date
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    df = df.rename(columns=lambda name: COLUMN_ALIASES.get(name.strip(), name.strip()))
+    missing = [name for name in CATALOG_COLUMNS if name not in df.columns]
+    if missing:
+        raise ValueError('{} is missing the column(s) {}'.format(path, missing))
+    columns = {name: df[name].to_numpy(dtype=str) for name in CATALOG_COLUMNS if name != 'cost'}
+    columns['cost'] = df['cost'].to_numpy(dtype=np.float64)
+    return columns
+
+def cache_path(path):
+    # one cache file per source file; the absolute path is hashed into the name so that equally named files in different folders do not collide
+    abs_path = os.path.abspath(path)
+    key = hashlib.sha1(abs_path.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(os.path.dirname(abs_path), CACHE_DIR, '{}-{}.npz'.format(os.path.basename(abs_path), key))
+
+def read_cache(path, mtime_ns, size):
+    """
+    Looks up the cached copy of a parsed .csv.
+    The cache is valid when the content hash of the file still matches: a file rewritten within one modification time tick and with
+    the same size would pass a modification time and size check. Hashing the small vendor files costs far less than parsing them.
+
+    Returns:
+        (dict) columns - cached columns, or None if there is no valid cached copy
+        (str) sha256 - content hash of the source file, or None if there is no valid cached copy
+    """
+    npz_path = cache_path(path)
+    if not os.path.exists(npz_path):
+        return None, None
+    try:
+        with np.load(npz_path, allow_pickle=False) as npz:
+            meta = npz['meta']
+            if int(meta[0]) != CACHE_FORMAT:
+                return None, None
+            sha256 = str(npz['sha256'])
+            if file_hash(path) != sha256:
+                return None, None
+            if int(meta[1]) != mtime_ns or int(meta[2]) != size:
+                columns = {name: npz[name] for name in CATALOG_COLUMNS}
+                write_cache(path, columns, mtime_ns, size, sha256) # same content under a new modification time - refresh the key
+                return columns, sha256
+            columns = {name: npz[name] for name in CATALOG_COLUMNS}
+    except (OSError, KeyError, ValueError):
+        return None, None
+    return columns, sha256
+
+def write_cache(path, columns, mtime_ns, size, sha256):
+    npz_path = cache_path(path)
+    tmp_path = npz_path + '.tmp'
+    try:
+        os.makedirs(os.path.dirname(npz_path), exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, meta=np.array([CACHE_FORMAT, mtime_ns, size], dtype=np.int64), sha256=np.array(sha256), **columns)
+        os.replace(tmp_path, npz_path) # readers never see a half-written cache file
+    except OSError:
+        pass # the cache is an optimization only; a read-only folder still gets a working catalog
+
+def load_vendor_columns(path, use_cache=True):
+    """
+    Returns:
+        (dict) columns - normalized columns of one vendor .csv
+        (dict) source - path, modification time, size and content hash of the .csv
+    """
+    mtime_ns, size = file_signature(path)
+    columns, sha256 = read_cache(path, mtime_ns, size) if use_cache else (None, None)
+    if columns is None:
+        columns = parse_vendor_csv(path)
+        sha256 = file_hash(path)
+        if use_cache:
+            write_cache(path, columns, mtime_ns, size, sha256)
+    source = {'path': path, 'mtime_ns': mtime_ns, 'size': size, 'sha256': sha256}
+    return columns, source
+
+def load_catalog(outcomes=None, use_cache=True):
+    """
+    Loads the scenario catalog of every vendor in outcomes (default ALL_POSSIBLE_OUTCOMES).
+    The catalog is built once per process and only re-read when one of the .csv files changes on disk.
+
+    Returns:
+        (dict) catalog - see the module docstring
+    """
+    if outcomes is None:
+        outcomes = ALL_POSSIBLE_OUTCOMES
+    key = tuple(outcomes.items())
+    catalog = _CATALOGS.get(key)
+    if catalog is not None:
+        if all(file_signature(source['path']) == (source['mtime_ns'], source['size']) for source in catalog['sources'].values()):
+            return catalog
+    parts = []
+    vendor_slices = {}
+    sources = {}
+    start = 0
+    for vendor, path in outcomes.items():
+        columns, source = load_vendor_columns(path, use_cache)
+        stop = start + len(columns['cost'])
+        parts.append(columns)
+        vendor_slices[vendor] = (start, stop)
+        sources[vendor] = source
+        start = stop
+    catalog = {'columns': {name: np.concatenate([part[name] for part in parts]) for name in CATALOG_COLUMNS},
+    'vendor_slices': vendor_slices,
+    'sources': sources}
+    _CATALOGS[key] = catalog
+    return catalog
+
+def vendor_columns(catalog, vendor):
+    # columns of a single vendor; these are views into the catalog arrays, not copies
+    start, stop = catalog['vendor_slices'][vendor]
+    return {name: values[start:stop] for name, values in catalog['columns'].items()}
+
+def clear_catalog():
+    # forgets every catalog loaded by this process; the on-disk cache is kept
+    _CATALOGS.clear()
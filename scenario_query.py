@@ -0,0 +1,162 @@
+"""
+Ad-hoc scenario queries over the catalog, answered from precomputed boolean masks.
+
+filter_cost_list and filter_vendor_cost_list can only select scenarios by their 'i_d' code. build_mask_index() computes, once
+per catalog, a boolean mask (one bit per catalog row) for every vendor, every product and every unit count, and the unit counts of
+every product in every row. A query is then a handful of vectorized AND/OR/NOT operations on those masks instead of a pass over the
+rows, and its sorted costs feed straight into cost_index.percentile_weak and histogram_bins.compute_bins.
+
+Conditions (all given conditions must hold):
+    contains - products the scenario must buy; a product listed n times must be bought at least n times
+    excludes - products the scenario must not buy
+    any_of - the scenario must buy at least one of these products
+    vendors - the scenario's vendor is one of these
+    num_d, num_i - exact number of devices / instruments
+    min_cost, max_cost - cost range (inclusive)
+Product names are matched without the ' laser' suffix of v1.csv.
+
+Usage:
+    python scenario_query.py --where contains:Device_E --where excludes:Instrument_C --where cost:0:2000000 [--score 1500000]
+
+prints the number of matching scenarios, their cost range and, with --score, the percentile and histogram bins of that cost.
+"""
+
+import argparse
+import json
+
+import numpy as np
+
+from cost_index import percentile_weak
+from histogram_bins import compute_bins
+from pricing_rules import PRODUCTS, strip_labels
+from scenario_catalog import PRODUCT_COLUMNS, load_catalog
+
+CONDITION_NAMES = ['contains', 'excludes', 'any', 'vendor', 'num_d', 'num_i', 'cost']
+
+def build_mask_index(catalog):
+    """
+    Returns the mask index of a catalog, built once and kept alongside it (catalog['mask_index']):
+        'vendors' - {vendor: boolean mask of its rows}
+        'products' - {product: boolean mask of the rows that buy it}
+        'units' - np.ndarray of shape (rows, len(PRODUCTS)): units of each product every row buys (uint8)
+        'num_d', 'num_i' - {unit count: boolean mask of the rows with that many devices / instruments}
+    """
+    if 'mask_index' in catalog:
+        return catalog['mask_index']
+    columns = catalog['columns']
+    rows = len(columns['cost'])
+    slots = strip_labels(np.column_stack([columns[name] for name in PRODUCT_COLUMNS]))
+    names, inverse = np.unique(slots, return_inverse=True)
+    inverse = inverse.reshape(slots.shape)
+    units = np.zeros((rows, len(PRODUCTS)), dtype=np.uint8)
+    for code, name in enumerate(names):
+        if name in PRODUCTS:
+            units[:, PRODUCTS.index(name)] = np.count_nonzero(inverse == code, axis=1)
+    vendors = {}
+    for vendor, (start, stop) in catalog['vendor_slices'].items():
+        vendors[vendor] = np.zeros(rows, dtype=bool)
+        vendors[vendor][start:stop] = True
+    parts = np.char.partition(np.asarray(columns['i_d'], dtype=str), '_') # 'i_d' codes are '#instruments_#devices'
+    counts = {'num_i': parts[:, 0].astype(np.int64), 'num_d': parts[:, 2].astype(np.int64)}
+    index = {'vendors': vendors,
+    'products': {name: units[:, column] > 0 for column, name in enumerate(PRODUCTS)},
+    'units': units}
+    for name, values in counts.items():
+        index[name] = {int(value): values == value for value in np.unique(values)}
+    catalog['mask_index'] = index
+    return index
+
+def query_mask(catalog, contains=(), excludes=(), any_of=(), vendors=None, num_d=None, num_i=None, min_cost=None, max_cost=None):
+    """
+    input- scenario catalog and the conditions of the module docstring (None or empty: no condition)
+    output- boolean mask of the catalog rows that meet every condition
+    Raises ValueError for an unknown product or vendor.
+    """
+    index = build_mask_index(catalog)
+    rows = len(catalog['columns']['cost'])
+    mask = np.ones(rows, dtype=bool)
+    for name in set(contains) | set(excludes) | set(any_of):
+        if name not in index['products']:
+            raise ValueError('unknown product {}'.format(name))
+    for name in set(contains):
+        needed = list(contains).count(name)
+        if needed == 1:
+            mask &= index['products'][name]
+        else:
+            mask &= index['units'][:, PRODUCTS.index(name)] >= needed
+    for name in excludes:
+        mask &= ~index['products'][name]
+    if any_of:
+        either = np.zeros(rows, dtype=bool)
+        for name in any_of:
+            either |= index['products'][name]
+        mask &= either
+    if vendors is not None:
+        unknown = [vendor for vendor in vendors if vendor not in index['vendors']]
+        if unknown:
+            raise ValueError('unknown vendor(s) {}'.format(unknown))
+        either = np.zeros(rows, dtype=bool)
+        for vendor in vendors:
+            either |= index['vendors'][vendor]
+        mask &= either
+    for name, value in [('num_d', num_d), ('num_i', num_i)]:
+        if value is not None:
+            mask &= index[name].get(value, np.zeros(rows, dtype=bool))
+    costs = catalog['columns']['cost']
+    if min_cost is not None:
+        mask &= costs >= min_cost
+    if max_cost is not None:
+        mask &= costs <= max_cost
+    return mask
+
+def query_costs(catalog, **conditions):
+    # sorted costs of the scenarios that meet the conditions, ready for percentile_weak and compute_bins(..., is_sorted=True)
+    return np.sort(catalog['columns']['cost'][query_mask(catalog, **conditions)])
+
+def query_rows(catalog, **conditions):
+    # catalog rows (indices) of the scenarios that meet the conditions
+    return np.flatnonzero(query_mask(catalog, **conditions))
+
+def parse_condition(spec, conditions):
+    """
+    Adds one condition given as text to the keyword arguments of query_mask:
+        contains:Device_E,Device_E | excludes:Instrument_C | any:Device_E,Device_F | vendor:V2,V3 | num_d:2 | num_i:1 | cost:min:max
+    (either bound of cost may be left empty).
+    """
+    name, _, value = spec.partition(':')
+    if name not in CONDITION_NAMES:
+        raise ValueError('unknown condition {} (use {})'.format(name, ', '.join(CONDITION_NAMES)))
+    values = [part.strip() for part in value.split(',') if part.strip()]
+    if name in ('contains', 'excludes'):
+        conditions[name] = list(conditions.get(name, ())) + values
+    elif name == 'any':
+        conditions['any_of'] = list(conditions.get('any_of', ())) + values
+    elif name == 'vendor':
+        conditions['vendors'] = values
+    elif name in ('num_d', 'num_i'):
+        conditions[name] = int(value)
+    else:
+        low, _, high = value.partition(':')
+        conditions['min_cost'] = float(low) if low else None
+        conditions['max_cost'] = float(high) if high else None
+    return conditions
+
+def main():
+    parser = argparse.ArgumentParser(description='Select catalog scenarios by products, vendors, unit counts and cost, and rank a cost among them.')
+    parser.add_argument('--where', action='append', default=[], help="condition such as contains:Device_E, excludes:Instrument_C, any:Device_E,Device_F, vendor:V2,V3, num_d:2, num_i:1 or cost:0:2000000; repeat to combine")
+    parser.add_argument('--score', type=float, default=None, help='cost to give the percentile and histogram bins of, among the selected scenarios')
+    args = parser.parse_args()
+    conditions = {}
+    for spec in args.where:
+        parse_condition(spec, conditions)
+    costs = query_costs(load_catalog(), **conditions)
+    print('{} matching scenarios'.format(len(costs)))
+    if len(costs):
+        print('cost min {} / median {} / max {}'.format(costs[0], np.median(costs), costs[-1]))
+    if args.score is not None and len(costs):
+        bins = compute_bins(costs, args.score, is_sorted=True)
+        print('percentile of {}: {}'.format(args.score, int(percentile_weak(costs, args.score))))
+        print(json.dumps({name: value.tolist() if isinstance(value, np.ndarray) else value for name, value in bins.items()}, default=float))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Local HTTP scoring service with a warm in-memory catalog.
+
+Usage:
+    python scoring_service.py [--host 127.0.0.1] [--port 8765]
+
+The catalog and its cost index are loaded once, when the service starts, and kept in memory. Each request then only prices one
+scenario and runs four binary searches, so answers take well under a millisecond instead of a cold start per call. The catalog
+files are still checked (os.stat) on every request, and the index is rebuilt if a vendor .csv has changed.
+
+Endpoints (all answers are JSON):
+    GET /health - {"status": "ok", "scenarios": number of catalog scenarios}
+    POST /score - body {"vendor": "V2", "devices": [...], "instruments": [...], "bins": true}
+        answers the user_input_cost price, num_d, num_i, the four data_report percentiles and, unless "bins" is false,
+        the histogram bins of hist_1 to hist_4 (see histogram_bins.compute_bins; null where no catalog scenario is comparable)
+    GET /score?vendor=V2&devices=Device_C&instruments=Instrument_D;Instrument_D&bins=0 - the same, products separated by ';'
+    POST /score/batch - body {"scenarios": [...]}: a list of scenarios, answered as a list, without bins
+As in get_variables, V1 devices always follow the V1 instrument bundles. Invalid scenarios are answered with status 400 and an "error".
+"""
+
+import argparse
+import asyncio
+import json
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from batch_scoring import split_products
+from cost_index import get_cost_index, lookup_costs, report_percentiles
+from forecast_core import scenario_products
+from histogram_bins import compute_bins
+from pricing_rules import price_scenarios
+from scenario_catalog import load_catalog
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+MAX_BODY = 1 << 20 # largest request body accepted, in bytes
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+def bins_json(costs, sum_cost):
+    # histogram bins of costs as JSON-ready values, or None when there are no costs to compare with
+    bins = compute_bins(costs, sum_cost, is_sorted=True)
+    if bins is None:
+        return None
+    return {name: value.tolist() if isinstance(value, np.ndarray) else float(value) if isinstance(value, np.floating) else value for name, value in bins.items()}
+
+def score_scenario(index, vendor, devices, instruments, with_bins=True):
+    """
+    input- cost index, vendor, lists of device and instrument names, and whether to add the histogram bins
+    output- dictionary with vendor, devices, instruments, num_d, num_i, cost, percentiles (and bins)
+    Raises ValueError if the scenario cannot be priced.
+    """
+    devices, instruments = scenario_products(vendor, devices, instruments)
+    num_d = len(devices)
+    num_i = len(instruments)
+    width = max(3, num_d, num_i)
+    sum_cost = float(price_scenarios([vendor], [devices + ['0'] * (width - num_d)], [instruments + ['0'] * (width - num_i)])[0])
+    percentiles = report_percentiles(index, sum_cost, vendor, num_d, num_i)
+    result = {'vendor': vendor,
+    'devices': devices,
+    'instruments': instruments,
+    'num_d': num_d,
+    'num_i': num_i,
+    'cost': sum_cost,
+    'percentiles': [None if np.isnan(percentile) else int(percentile) for percentile in percentiles]} # whole percentiles, as printed by data_report
+    if with_bins:
+        result['bins'] = {'hist_1': bins_json(lookup_costs(index), sum_cost),
+        'hist_2': bins_json(lookup_costs(index, vendor), sum_cost),
+        'hist_3': bins_json(lookup_costs(index, None, num_d, num_i), sum_cost),
+        'hist_4': bins_json(lookup_costs(index, vendor, num_d, num_i), sum_cost)}
+    return result
+
+def parse_scenario(fields):
+    # vendor, devices and instruments of a JSON object or of query parameters
+    if not isinstance(fields, dict):
+        raise ValueError('a scenario must be a JSON object')
+    with_bins = fields.get('bins', True)
+    if isinstance(with_bins, str):
+        with_bins = with_bins.lower() not in ('0', 'false', 'no')
+    return str(fields.get('vendor', '')).strip(), split_products(fields.get('devices')), split_products(fields.get('instruments')), bool(with_bins)
+
+def handle(method, target, body):
+    """
+    Answers one request.
+
+    Returns:
+        (int) status - HTTP status code
+        (dict or list) answer - JSON answer
+    """
+    url = urlsplit(target)
+    index = get_cost_index(load_catalog()) # memoized; only rebuilt when a vendor .csv has changed
+    if url.path == '/health':
+        return 200, {'status': 'ok', 'scenarios': len(lookup_costs(index))}
+    if url.path == '/score':
+        if method == 'GET':
+            fields = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        elif method == 'POST':
+            fields = json.loads(body or b'{}')
+        else:
+            return 405, {'error': 'use GET or POST'}
+        return 200, score_scenario(index, *parse_scenario(fields))
+    if url.path == '/score/batch':
+        if method != 'POST':
+            return 405, {'error': 'use POST'}
+        fields = json.loads(body or b'{}')
+        if not isinstance(fields, dict) or not isinstance(fields.get('scenarios', []), list):
+            raise ValueError('the body must be a JSON object with a list of scenarios')
+        scenarios = fields.get('scenarios', [])
+        answers = []
+        for fields in scenarios:
+            try:
+                vendor, devices, instruments, _ = parse_scenario(fields)
+                answers.append(score_scenario(index, vendor, devices, instruments, with_bins=False))
+            except ValueError as error:
+                answers.append({'error': str(error)})
+        return 200, answers
+    return 404, {'error': 'unknown path ' + url.path}
+
+async def serve_connection(reader, writer):
+    # answers the requests of one connection until the client closes it (HTTP/1.1 keep-alive)
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, target, version = request_line.decode('latin-1').split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length', 0))
+            if length > MAX_BODY:
+                status, answer = 413, {'error': 'request body too large'}
+                body = None
+            else:
+                body = await reader.readexactly(length) if length else b''
+                try:
+                    status, answer = handle(method, target, body)
+                except ValueError as error: # includes malformed JSON
+                    status, answer = 400, {'error': str(error)}
+                except Exception as error:
+                    status, answer = 500, {'error': repr(error)}
+            payload = json.dumps(answer).encode()
+            keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close' and body is not None
+            writer.write('HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: {}\r\n\r\n'.format(
+            status, STATUS_TEXT[status], len(payload), 'keep-alive' if keep_alive else 'close').encode('latin-1') + payload)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ValueError, asyncio.IncompleteReadError, ConnectionError): # malformed request line or client gone
+        pass
+    finally:
+        writer.close()
+
+async def run_server(host=DEFAULT_HOST, port=DEFAULT_PORT):
+    get_cost_index(load_catalog()) # warm the catalog and the index before the first request
+    server = await asyncio.start_server(serve_connection, host, port)
+    print('Scoring service listening on http://{}:{}'.format(host, port))
+    async with server:
+        await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve scenario prices, percentiles and histogram bins over local HTTP.')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_server(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
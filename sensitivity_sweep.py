@@ -0,0 +1,135 @@
+"""
+Vectorized sensitivity sweeps of the catalog costs over a grid of prices and V1 discount rates.
+
+A parameter is one price (price:Device_E) or V1 discount rate (discount1:Instrument_A, discount2:Instrument_C), swept over evenly spaced
+values. The grid is every combination of the swept values. For every grid point sweep() reprices the whole catalog and the given
+scenario, and computes the scenario's four data_report percentiles.
+
+Costs are linear in the prices (see pricing_rules.tier_counts), so the costs of a chunk of grid points are one (grid x scenarios)
+matrix product, and the four percentiles are one more: the (grid x scenarios) matrix of "costs at most the scenario cost"
+times the (scenarios x 4) matrix of which scenarios each percentile compares against. Catalog costs move by the change of their
+linear cost, so at the current prices the sweep reproduces the catalog exactly.
+
+Usage:
+    python sensitivity_sweep.py surface.csv V3 --devices Device_E --instruments Instrument_E \\
+        --sweep price:Instrument_E=900000:1000000:101 --sweep discount1:Instrument_A=0.90:1.00:21 [--matrix costs.npy]
+
+writes one row per grid point: the swept values, the scenario cost and percentile1 to percentile4 (.csv or .json).
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from batch_scoring import write_results
+from cost_index import scenario_code
+from forecast_core import parse_scenario
+from price_simulation import scenario_costs
+from pricing_rules import DISCOUNT1_RATES, PRODUCTS, catalog_tier_counts, price_vector, rate_vectors, tier_counts
+from scenario_catalog import load_catalog
+
+PARAMETER_KINDS = ['price', 'discount1', 'discount2']
+DEFAULT_CHUNK_CELLS = 1 << 24 # grid points x scenarios priced per chunk
+COST_TOLERANCE = 1e-6 # USD; repriced costs carry floating-point noise, so a scenario equal to the probed one still counts as 'at most'
+
+def parse_parameter(spec):
+    """
+    input- 'kind:product=start:stop:num', e.g. 'price:Instrument_E=900000:1000000:101'
+    output- (kind, product, np.ndarray of num evenly spaced values from start to stop)
+    """
+    name, _, values = spec.partition('=')
+    kind, _, product = name.partition(':')
+    if kind not in PARAMETER_KINDS:
+        raise ValueError('unknown parameter kind {} (use {})'.format(kind, ', '.join(PARAMETER_KINDS)))
+    if product not in PRODUCTS:
+        raise ValueError('no price for product {}'.format(product))
+    if kind != 'price' and product not in DISCOUNT1_RATES:
+        raise ValueError('{} has no V1 discount'.format(product))
+    start, stop, num = values.split(':')
+    return kind, product, np.linspace(float(start), float(stop), int(num))
+
+def grid_points(parameters):
+    # every combination of the swept values: shape (number of grid points, number of parameters)
+    mesh = np.meshgrid(*[values for kind, product, values in parameters], indexing='ij')
+    return np.column_stack([axis.ravel() for axis in mesh])
+
+def grid_pricing(parameters, points):
+    """
+    Prices and V1 discount rates at every grid point, as arrays over PRODUCTS:
+        (np.ndarray) prices, rates1, rates2 - each of shape (number of grid points, len(PRODUCTS))
+    Parameters that are not swept keep their current value.
+    """
+    arrays = {'price': price_vector(), 'discount1': rate_vectors()[0], 'discount2': rate_vectors()[1]}
+    arrays = {kind: np.repeat(values[None, :], len(points), axis=0) for kind, values in arrays.items()}
+    for column, (kind, product, values) in enumerate(parameters):
+        arrays[kind][:, PRODUCTS.index(product)] = points[:, column]
+    return arrays['price'], arrays['discount1'], arrays['discount2']
+
+def comparison_masks(catalog, vendor, num_d, num_i):
+    # (scenarios x 4) matrix: which catalog scenarios percentile1 to percentile4 compare against
+    columns = catalog['columns']
+    start, stop = catalog['vendor_slices'][vendor]
+    in_vendor = np.zeros(len(columns['cost']), dtype=bool)
+    in_vendor[start:stop] = True
+    same_code = columns['i_d'] == scenario_code(num_d, num_i)
+    return np.column_stack([np.ones(len(in_vendor), dtype=bool), in_vendor, same_code, in_vendor & same_code]).astype(np.float32)
+
+def sweep(catalog, parameters, vendor, devices, instruments, chunk_cells=DEFAULT_CHUNK_CELLS, keep_costs=False):
+    """
+    input- scenario catalog, parameters from parse_parameter, the scenario (vendor, device and instrument names),
+           grid points x scenarios priced per chunk, and whether to keep the whole catalog cost matrix
+    output- dictionary with
+        'points' - (grid points x parameters) swept values
+        'cost' - cost of the scenario at every grid point
+        'percentiles' - (grid points x 4) percentile1 to percentile4 of the scenario (nan where no scenario is comparable)
+        'catalog_costs' - (grid points x catalog scenarios) costs, only if keep_costs
+    """
+    points = grid_points(parameters)
+    prices, rates1, rates2 = grid_pricing(parameters, points)
+    tiers = catalog_tier_counts(catalog).astype(np.float64)
+    base = scenario_costs(tiers, price_vector()[None, :], *[rates[None, :] for rates in rate_vectors()])[0]
+    drift = catalog['columns']['cost'] - base # costs that do not follow the current prices exactly (rounding in the .csv) keep their difference
+    width = max(3, len(devices), len(instruments))
+    scenario_tiers = tier_counts([vendor], [devices + ['0'] * (width - len(devices))], [instruments + ['0'] * (width - len(instruments))]).astype(np.float64)
+    masks = comparison_masks(catalog, vendor, len(devices), len(instruments))
+    sizes = masks.sum(axis=0, dtype=np.float64)
+    cost = scenario_costs(scenario_tiers, prices, rates1, rates2)[:, 0]
+    percentiles = np.empty((len(points), 4))
+    catalog_costs = np.empty((len(points), len(drift))) if keep_costs else None
+    chunk = max(1, chunk_cells // max(len(drift), 1))
+    for start in range(0, len(points), chunk):
+        stop = min(start + chunk, len(points))
+        costs = scenario_costs(tiers, prices[start:stop], rates1[start:stop], rates2[start:stop]) + drift
+        at_most = (costs <= cost[start:stop, None] + COST_TOLERANCE).astype(np.float32) # float32 counts are exact up to 2^24 scenarios
+        percentiles[start:stop] = (at_most @ masks).astype(np.float64) * (100.0 / np.where(sizes > 0, sizes, np.nan))
+        if keep_costs:
+            catalog_costs[start:stop] = costs
+    result = {'points': points, 'cost': cost, 'percentiles': percentiles}
+    if keep_costs:
+        result['catalog_costs'] = catalog_costs
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep prices and V1 discount rates over a grid and export the cost and percentile surface of a scenario.')
+    parser.add_argument('out', help='.csv or .json file to write the surface to')
+    parser.add_argument('vendor', choices=['V1', 'V2', 'V3', 'V4'])
+    parser.add_argument('--devices', default='', help='comma-separated devices of the scenario (ignored for V1)')
+    parser.add_argument('--instruments', default='', help='comma-separated instruments of the scenario')
+    parser.add_argument('--sweep', action='append', required=True, help="swept parameter 'kind:product=start:stop:num' (kind: price, discount1 or discount2); repeat for a multi-dimensional grid")
+    parser.add_argument('--matrix', default=None, help='.npy file to save the (grid points x catalog scenarios) cost matrix to')
+    args = parser.parse_args()
+    parameters = [parse_parameter(spec) for spec in args.sweep]
+    devices, instruments = parse_scenario(parser, args.vendor, args.devices, args.instruments)
+    result = sweep(load_catalog(), parameters, args.vendor, devices, instruments, keep_costs=args.matrix is not None)
+    surface = pd.DataFrame(result['points'], columns=['{}:{}'.format(kind, product) for kind, product, values in parameters])
+    surface['cost'] = result['cost']
+    for column in range(4):
+        surface['percentile' + str(column + 1)] = result['percentiles'][:, column]
+    write_results(surface, args.out)
+    if args.matrix:
+        np.save(args.matrix, result['catalog_costs'])
+    print('Swept {} grid points into {}'.format(len(surface), args.out))
+
+if __name__ == "__main__":
+    main()
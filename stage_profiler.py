@@ -0,0 +1,153 @@
+"""
+Opt-in per-stage instrumentation of the forecast pipeline.
+
+Every stage that main() runs is wrapped in a stage() block. While profiling is off (the default) a stage() block only checks one
+module variable. After enable(), every block records:
+    name - stage name, e.g. 'user_input_cost' or 'hist_3'
+    scenario - number of the scenario (loop of main()) the stage belongs to, see new_scenario()
+    wall - wall time in seconds (time.perf_counter)
+    cpu - CPU time of the process in seconds (time.process_time)
+    peak_bytes - highest memory traced by tracemalloc while the stage ran (including its nested stages), above the memory allocated at its start
+    allocated_bytes - memory still allocated at the end of the stage, minus the memory allocated at its start
+    start, depth - start time relative to enable() and nesting depth, used for the Chrome trace
+The records can be written as JSON (write_json), as a Chrome trace for chrome://tracing or Perfetto (write_chrome_trace),
+and summarized per stage (summary_table).
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+_PROFILE = None # state of the running profile, None while profiling is off
+
+def enable(trace_memory=True):
+    # starts a new profile; trace_memory=False skips tracemalloc, which slows down allocation-heavy stages
+    global _PROFILE
+    started = _PROFILE is not None and _PROFILE['started_tracing'] # a profile restarted by enable() keeps the tracing it started
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        started = True
+    _PROFILE = {'records': [], 'stack': [], 'scenario': 0, 'origin': time.perf_counter(), 'trace_memory': trace_memory and tracemalloc.is_tracing(),
+    'started_tracing': started}
+
+def disable():
+    # stops profiling and returns the records
+    global _PROFILE
+    profile = _PROFILE
+    _PROFILE = None
+    if profile is None:
+        return []
+    if profile['started_tracing']: # tracing started by someone else (python -X tracemalloc, a test harness) keeps running
+        tracemalloc.stop()
+    return profile['records']
+
+def is_enabled():
+    return _PROFILE is not None
+
+def new_scenario():
+    # stages recorded from now on belong to the next scenario
+    if _PROFILE is not None:
+        _PROFILE['scenario'] += 1
+
+def records():
+    # records of the running profile
+    return [] if _PROFILE is None else _PROFILE['records']
+
+@contextlib.contextmanager
+def stage(name):
+    """
+    Records the wall time, CPU time and memory of the block it wraps, as stage name.
+    Stages may be nested; tracemalloc has a single peak counter, so the peak of an enclosing stage is carried across its nested stages.
+    """
+    profile = _PROFILE
+    if profile is None:
+        yield
+        return
+    trace_memory = profile['trace_memory']
+    stack = profile['stack']
+    current = 0
+    if trace_memory:
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+        tracemalloc.reset_peak()
+    frame = {'peak': current}
+    stack.append(frame)
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - start
+        cpu = time.process_time() - cpu_start
+        stack.pop()
+        peak_bytes = None
+        allocated_bytes = None
+        if trace_memory:
+            end, peak = tracemalloc.get_traced_memory()
+            peak = max(frame['peak'], peak)
+            peak_bytes = peak - current
+            allocated_bytes = end - current
+            if stack:
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+        profile['records'].append({'name': name,
+        'scenario': profile['scenario'],
+        'wall': wall,
+        'cpu': cpu,
+        'peak_bytes': peak_bytes,
+        'allocated_bytes': allocated_bytes,
+        'start': start - profile['origin'],
+        'depth': len(stack)})
+
+def write_json(path, stage_records=None):
+    # writes the records as a JSON list
+    with open(path, 'w') as f:
+        json.dump(records() if stage_records is None else stage_records, f, indent=1)
+
+def write_chrome_trace(path, stage_records=None):
+    # writes the records in the Chrome trace event format: one complete ('X') event per stage, times in microseconds
+    stage_records = records() if stage_records is None else stage_records
+    events = [{'name': record['name'],
+    'cat': 'scenario {}'.format(record['scenario']),
+    'ph': 'X',
+    'ts': record['start'] * 1e6,
+    'dur': record['wall'] * 1e6,
+    'pid': os.getpid(),
+    'tid': threading.get_ident(),
+    'args': {name: record[name] for name in ['scenario', 'cpu', 'peak_bytes', 'allocated_bytes']}} for record in stage_records]
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+def summary_table(stage_records=None):
+    """
+    Returns a text table with one line per stage name, in order of first appearance:
+    number of calls, total and mean wall time, total CPU time and highest peak memory.
+    """
+    stage_records = records() if stage_records is None else stage_records
+    stages = {}
+    for record in stage_records:
+        total = stages.setdefault(record['name'], {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'peak_bytes': None})
+        total['calls'] += 1
+        total['wall'] += record['wall']
+        total['cpu'] += record['cpu']
+        if record['peak_bytes'] is not None:
+            total['peak_bytes'] = max(total['peak_bytes'] or 0, record['peak_bytes'])
+    first_start = {}
+    for record in stage_records:
+        first_start.setdefault(record['name'], record['start'])
+    lines = ['{:<20} {:>6} {:>12} {:>12} {:>12} {:>12}'.format('stage', 'calls', 'wall (s)', 'mean (s)', 'cpu (s)', 'peak (MB)')]
+    for name in sorted(stages, key=lambda name: first_start[name]):
+        total = stages[name]
+        peak = '-' if total['peak_bytes'] is None else '{:.2f}'.format(total['peak_bytes'] / 2 ** 20)
+        lines.append('{:<20} {:>6} {:>12.6f} {:>12.6f} {:>12.6f} {:>12}'.format(name, total['calls'], total['wall'], total['wall'] / total['calls'], total['cpu'], peak))
+    return '\n'.join(lines)
+
+def write_profile(path, fmt='json'):
+    # writes the running profile to path as 'json' or 'chrome' trace
+    if fmt == 'chrome':
+        write_chrome_trace(path)
+    else:
+        write_json(path)
@@ -0,0 +1,12 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT) # the modules live at the top of the repository
+
+@pytest.fixture(autouse=True)
+def repository_folder(monkeypatch):
+    # the vendor .csv files are opened by relative path, as when the scripts are run from the repository folder
+    monkeypatch.chdir(ROOT)
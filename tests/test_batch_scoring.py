@@ -0,0 +1,22 @@
+import json
+
+import numpy as np
+
+from batch_scoring import read_scenarios, score_scenarios
+from cost_index import get_cost_index
+from scenario_catalog import load_catalog
+
+def test_only_unpriceable_rows_are_kept_with_their_error(tmp_path):
+    path = tmp_path / 'scenarios.csv'
+    path.write_text('vendor,devices,instruments\nV5,Device_C,Instrument_D\n')
+    results = score_scenarios(read_scenarios(str(path)), get_cost_index(load_catalog()))
+    assert results['error'].tolist() == ['unknown vendor']
+    assert np.isnan(results['cost'][0])
+    assert results['percentile1'].isna().all()
+
+def test_empty_json_gives_an_empty_table(tmp_path):
+    path = tmp_path / 'scenarios.json'
+    path.write_text(json.dumps([]))
+    results = score_scenarios(read_scenarios(str(path)), get_cost_index(load_catalog()))
+    assert len(results) == 0
+    assert 'error' in results.columns
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+from cash_flow import add_cash_flow_columns, scenario_npv
+from forecast_core import user_input_cost
+from scenario_catalog import load_catalog
+
+def test_catalog_npv_equals_scenario_npv():
+    catalog = add_cash_flow_columns(load_catalog())
+    columns = catalog['columns']
+    for row in range(len(columns['cost'])):
+        slots = [columns[name][row] for name in ['D1', 'D2', 'D3', 'I1', 'I2', 'I3']]
+        assert columns['npv'][row] == pytest.approx(scenario_npv(*slots, columns['vendor'][row], columns['cost'][row]), abs=1e-6)
+
+def test_v2_catalog_row_is_priced_with_the_v2_instrument():
+    catalog = add_cash_flow_columns(load_catalog())
+    columns = catalog['columns']
+    start, stop = catalog['vendor_slices']['V2']
+    row = start + np.flatnonzero((columns['i_d'][start:stop] == '1_1') & (columns['I1'][start:stop] != '0') & (columns['D1'][start:stop] == 'Device_C'))[0]
+    sum_cost = user_input_cost('Device_C', '0', '0', 'Instrument_D', '0', '0', 'V2')
+    assert columns['cost'][row] == sum_cost
+    assert columns['npv'][row] == pytest.approx(scenario_npv('Device_C', '0', '0', 'Instrument_D', '0', '0', 'V2', sum_cost))
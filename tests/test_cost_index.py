@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+
+from cost_index import percentile_weak
+from scenario_catalog import load_catalog
+
+stats = pytest.importorskip('scipy.stats')
+
+def test_percentile_weak_matches_scipy():
+    costs = np.sort(load_catalog()['columns']['cost'])
+    scores = np.concatenate([costs[::7], [0, costs[0], costs[-1], costs[-1] + 1, (costs[10] + costs[11]) / 2]])
+    expected = [stats.percentileofscore(costs, score, kind='weak') for score in scores]
+    assert np.allclose(percentile_weak(costs, scores), expected)
+    assert all(percentile_weak(costs, score) == pytest.approx(value) for score, value in zip(scores[:20], expected[:20]))
+
+def test_percentile_weak_of_no_costs_is_nan():
+    assert np.isnan(stats.percentileofscore([], 1000000, kind='weak'))
+    assert np.isnan(percentile_weak(np.empty(0), 1000000))
@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+from cost_index import build_cost_index, percentile_weak
+from exact_distribution import TICKS_PER_USD, build_distributions, exact_percentile
+from pricing_rules import generate_catalog
+
+@pytest.mark.parametrize('max_units', [3, 4])
+def test_distributions_match_the_generated_catalog(max_units):
+    index = build_cost_index(generate_catalog(max_units))
+    distributions = build_distributions(max_units)
+    assert set(distributions) == set(index)
+    for key, costs in index.items():
+        ticks, cumulative = distributions[key]
+        costs = np.round(costs * TICKS_PER_USD) / TICKS_PER_USD # summing the slots in another order can move a catalog cost by 1e-9 USD
+        assert cumulative[-1] == len(costs)
+        assert np.array_equal(ticks, np.unique(np.round(costs * TICKS_PER_USD)).astype(np.int64))
+        scores = np.concatenate((costs, costs - 0.5, [costs[0] - 1, costs[-1] + 1]))
+        assert np.allclose([exact_percentile(distributions[key], score) for score in scores.tolist()], percentile_weak(costs, scores))
@@ -0,0 +1,14 @@
+import pytest
+
+from forecast_core import scenario_products
+
+def test_v1_devices_follow_the_bundles():
+    assert scenario_products('V1', ['Device_H'], ['Instrument_A', 'Instrument_C']) == (['Device_A', 'Device_B'], ['Instrument_A', 'Instrument_C'])
+
+def test_products_must_be_offered_by_the_vendor():
+    with pytest.raises(ValueError, match='unknown vendor V7'):
+        scenario_products('V7', [], ['Instrument_A'])
+    with pytest.raises(ValueError, match='not offered by V1: Instrument_Z'):
+        scenario_products('V1', [], ['Instrument_Z'])
+    with pytest.raises(ValueError, match='not offered by V2: Device_A'):
+        scenario_products('V2', ['Device_A'], ['Instrument_D'])
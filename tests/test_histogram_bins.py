@@ -0,0 +1,59 @@
+import math
+
+import numpy as np
+import pytest
+
+from histogram_bins import compute_bins
+from scenario_catalog import load_catalog
+
+def original_bins(sum_cost, cost_list):
+    # bins of hist_1 to hist_4 as RFI_Expense_Forecast.py drew them before compute_bins: (num_bins, bin_size, edges, highlighted count)
+    cost_list = sorted(cost_list)
+    cost_list_min = cost_list[0]
+    cost_list_max = cost_list[-1]
+    span = cost_list_max - cost_list_min
+    num_bins = int(span * (len(cost_list) ** (1/3)) / np.std(cost_list, ddof=1) / 3.49) # stats.tstd is the ddof=1 standard deviation
+    if num_bins <= 4:
+        num_bins = 5
+    bin_size = span / num_bins
+    if sum_cost == cost_list_max:
+        lower_bound_bin = sum_cost - bin_size
+        upper_bound_bin = sum_cost
+    elif sum_cost == cost_list_min:
+        lower_bound_bin = sum_cost
+        upper_bound_bin = sum_cost + bin_size
+    else:
+        lower_bound_bin = (math.trunc((sum_cost - cost_list_min) / bin_size) * bin_size) + cost_list_min
+        upper_bound_bin = lower_bound_bin + bin_size
+    count = len([i for i in cost_list if i > lower_bound_bin and i <= upper_bound_bin])
+    num_bins_lower = round((lower_bound_bin - cost_list_min) / bin_size)
+    num_bins_upper = round((cost_list_max - upper_bound_bin) / bin_size)
+    a = [cost_list_min + (bin_size * n) for n in range(0, num_bins_lower + 1)] if sum_cost >= cost_list_min + bin_size else [lower_bound_bin]
+    f = [upper_bound_bin + (bin_size * n) for n in range(0, num_bins_upper + 1)] if sum_cost <= cost_list_max - bin_size else [upper_bound_bin]
+    return num_bins, bin_size, a + f, count
+
+def distributions():
+    catalog = load_catalog()
+    costs = catalog['columns']['cost']
+    start, stop = catalog['vendor_slices']['V3']
+    yield costs # hist_1: all scenarios
+    yield costs[start:stop] # hist_2: one vendor
+    yield costs[catalog['columns']['i_d'] == '2_2'] # hist_3: one unit count
+    yield costs[start:stop][catalog['columns']['i_d'][start:stop] == '2_2'] # hist_4: one vendor and unit count
+
+@pytest.mark.parametrize('costs', list(distributions()), ids=['hist_1', 'hist_2', 'hist_3', 'hist_4'])
+def test_bins_reproduce_the_original_histograms(costs):
+    sorted_costs = np.sort(costs)
+    for sum_cost in [sorted_costs[0], sorted_costs[len(sorted_costs) // 3], np.median(sorted_costs), sorted_costs[-2], sorted_costs[-1]]:
+        num_bins, bin_size, edges, count = original_bins(sum_cost, costs.tolist())
+        bins = compute_bins(costs, sum_cost)
+        assert bins['num_bins'] == num_bins
+        assert bins['bin_size'] == pytest.approx(bin_size)
+        assert np.allclose(bins['edges'], edges)
+        dropped = np.sum(costs == sum_cost) if sum_cost == sorted_costs[0] else 0 # the original bins left out costs equal to the lowest edge
+        assert bins['highlight_count'] == count + dropped
+        assert bins['counts'].sum() == len(costs)
+
+def test_no_costs_give_no_bins():
+    assert compute_bins([], 1000000) is None
+    assert compute_bins(np.empty(0), 1000000, is_sorted=True, weights=np.empty(0)) is None
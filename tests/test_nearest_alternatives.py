@@ -0,0 +1,14 @@
+from nearest_alternatives import print_alternatives
+from report_cache import cached_report
+from scenario_catalog import clear_catalog, load_catalog
+
+def test_npv_alternatives_after_a_report_cache_hit(tmp_path, capsys):
+    cache_dir = str(tmp_path / 'cache')
+    first = cached_report('V2', ['Device_C'], ['Instrument_D'], 'npv', cache_dir, charts=False)
+    clear_catalog() # a new session: the catalog is loaded again, without the NPV column of the first report
+    report = cached_report('V2', ['Device_C'], ['Instrument_D'], 'npv', cache_dir, charts=False)
+    assert not first['cached'] and report['cached']
+    assert 'npv' not in load_catalog()['columns']
+    print_alternatives(load_catalog(), report['cost'], 'V2', 1, 1, cost_column='npv')
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith('6. ') and lines[1].startswith('   V')
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from plan_optimizer import best_plans
+from pricing_rules import generate_catalog
+
+def test_unknown_vendor_or_product_is_rejected():
+    with pytest.raises(ValueError, match='unknown vendor'):
+        best_plans(vendors=['V9'])
+    with pytest.raises(ValueError, match='unknown product Instrument_Q'):
+        best_plans(exclude=['Instrument_Q'])
+
+REQUIREMENTS = [{},
+{'min_devices': 2, 'min_instruments': 2},
+{'min_devices': 1, 'min_instruments': 1, 'require_any': ['Instrument_B', 'Device_E']},
+{'min_instruments': 3, 'exclude': ['Instrument_A']},
+{'min_devices': 2, 'vendors': ['V2', 'V3']},
+{'min_devices': 1, 'max_devices': 2, 'max_instruments': 1, 'vendors': ['V1', 'V4'], 'exclude': ['Device_G']}]
+
+def brute_force_costs(catalog, min_devices=0, min_instruments=0, max_devices=None, max_instruments=None, vendors=None, require_any=(), exclude=()):
+    # costs of every catalog scenario meeting the requirement
+    columns = catalog['columns']
+    slots = np.column_stack([columns[name] for name in ['D1', 'D2', 'D3', 'I1', 'I2', 'I3']])
+    num_d = (slots[:, :3] != '0').sum(axis=1)
+    num_i = (slots[:, 3:] != '0').sum(axis=1)
+    mask = (num_d >= min_devices) & (num_i >= min_instruments)
+    if max_devices is not None:
+        mask &= num_d <= max_devices
+    if max_instruments is not None:
+        mask &= num_i <= max_instruments
+    if vendors is not None:
+        mask &= np.isin(columns['vendor'], vendors)
+    if require_any:
+        mask &= np.isin(slots, require_any).any(axis=1)
+    if exclude:
+        mask &= ~np.isin(slots, exclude).any(axis=1)
+    return columns['cost'][mask]
+
+@pytest.mark.parametrize('requirement', REQUIREMENTS)
+def test_cheapest_plan_is_the_brute_force_minimum(requirement):
+    requirement = dict({'max_devices': 3, 'max_instruments': 3}, **requirement) # the catalog holds at most 3 units of each category
+    costs = brute_force_costs(generate_catalog(3), **requirement)
+    plans = best_plans(5, **requirement)
+    assert plans[0]['cost'] == pytest.approx(costs.min())
+    assert all(plan['cost'] >= costs.min() - 1e-6 for plan in plans)
+    assert [plan['cost'] for plan in plans] == sorted(plan['cost'] for plan in plans)
+
+def test_top_plans_are_the_cheapest_distinct_scenarios():
+    catalog = generate_catalog(3, vendors=['V2', 'V3', 'V4']) # V1 costs depend on the instrument order, the other vendors' do not
+    cheapest = np.unique(np.round(brute_force_costs(catalog, min_devices=1, min_instruments=1), 2))[:10]
+    plans = best_plans(10, min_devices=1, min_instruments=1, max_devices=3, max_instruments=3, vendors=['V2', 'V3', 'V4'])
+    assert np.allclose([plan['cost'] for plan in plans], cheapest)
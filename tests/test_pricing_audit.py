@@ -0,0 +1,13 @@
+from pricing_audit import audit_catalog, is_mismatch
+
+def test_rounding_drift_is_not_a_mismatch():
+    found = audit_catalog()
+    broken = is_mismatch(found['problems'])
+    assert set(found['vendor'][broken]) == {'V4'}
+    assert (found['difference'][broken] == -440424).all()
+    assert (found['problems'][~broken] == 'rounding drift').all()
+    assert abs(found['difference'][~broken]).max() < 10
+
+def test_fixed_tolerance_counts_drift_as_cost():
+    found = audit_catalog(tolerance=0.01)
+    assert is_mismatch(found['problems']).sum() > 400
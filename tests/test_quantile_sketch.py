@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from cost_index import percentile_weak
+from quantile_sketch import merge_sketches, new_sketch, sketch_percentile, sketch_size, update_sketch
+
+def random_costs(n, seed):
+    # scenario-like costs: a few tied price points plus a continuous spread
+    rng = np.random.default_rng(seed)
+    return np.concatenate((rng.choice([1003691.0, 1155594.0, 2576200.5], n // 4), rng.lognormal(14, 0.5, n - n // 4)))
+
+def largest_error(sketch, costs):
+    # largest difference in percentile points between the sketch and the exact percentile, over every cost and between costs
+    sorted_costs = np.sort(costs)
+    scores = np.concatenate((sorted_costs, (sorted_costs[1:] + sorted_costs[:-1]) / 2))
+    return np.abs(sketch_percentile(sketch, scores) - percentile_weak(sorted_costs, scores)).max()
+
+@pytest.mark.parametrize('epsilon', [0.01, 0.05])
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_rank_error_stays_within_epsilon(epsilon, seed):
+    costs = random_costs(200000, seed)
+    sketch = new_sketch(sketch_size(epsilon), seed)
+    for chunk in np.array_split(costs, 37):
+        update_sketch(sketch, chunk)
+    assert sketch['n'] == len(costs)
+    assert largest_error(sketch, costs) <= epsilon * 100
+
+def test_merged_sketches_stay_within_epsilon():
+    epsilon = 0.01
+    parts = [random_costs(50000, seed) for seed in range(4)]
+    sketches = [update_sketch(new_sketch(sketch_size(epsilon), seed), part) for seed, part in enumerate(parts)]
+    merged = sketches[0]
+    for sketch in sketches[1:]:
+        merged = merge_sketches(merged, sketch)
+    assert largest_error(merged, np.concatenate(parts)) <= epsilon * 100
+
+def test_sketch_below_capacity_is_exact():
+    costs = random_costs(100, 0)
+    sketch = update_sketch(new_sketch(sketch_size(0.01)), costs)
+    assert largest_error(sketch, costs) == 0
@@ -0,0 +1,16 @@
+import os
+
+from scenario_catalog import clear_catalog, load_catalog
+
+def test_cache_sees_a_rewrite_with_the_same_size_and_modification_time(tmp_path):
+    path = tmp_path / 'v9.csv'
+    header = 'vendor,I1,I2,I3,D1,D2,D3,i_d,cost\n'
+    path.write_text(header + 'V9,0,0,0,Device_C,0,0,0_1,680128\n')
+    stat = os.stat(path)
+    assert load_catalog({'V9': str(path)})['columns']['cost'].tolist() == [680128.0]
+    path.write_text(header + 'V9,0,0,0,Device_D,0,0,0_1,151903\n') # same size
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    clear_catalog()
+    catalog = load_catalog({'V9': str(path)})
+    assert catalog['columns']['D1'].tolist() == ['Device_D']
+    assert catalog['columns']['cost'].tolist() == [151903.0]
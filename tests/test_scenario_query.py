@@ -0,0 +1,16 @@
+import numpy as np
+
+from scenario_catalog import load_catalog
+from scenario_query import query_mask
+
+def test_v2_instrument_is_found_under_its_own_name():
+    catalog = load_catalog()
+    start, stop = catalog['vendor_slices']['V2']
+    with_instrument = np.zeros(len(catalog['columns']['cost']), dtype=bool)
+    with_instrument[start:stop] = ~np.char.startswith(catalog['columns']['i_d'][start:stop], '0_') # 'i_d' codes are '#instruments_#devices'
+    assert np.array_equal(query_mask(catalog, contains=['Instrument_D']), with_instrument)
+
+def test_excluding_a_v1_instrument_keeps_every_v2_scenario():
+    catalog = load_catalog()
+    start, stop = catalog['vendor_slices']['V2']
+    assert query_mask(catalog, excludes=['Instrument_C'], vendors=['V2']).sum() == stop - start